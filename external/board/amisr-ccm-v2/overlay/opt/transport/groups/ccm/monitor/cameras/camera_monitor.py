@@ -21,6 +21,9 @@
 #                   reboot state.
 #               Check if camera is online
 #
+#   2026-10-16  Todd Valentic
+#               Poll the device state every schedule.rate (needs_poll)
+#
 ##################################################################
 
 import sys
@@ -53,6 +56,11 @@ class CameraMonitor(DataMonitorComponent):
 
         return state == "on"
 
+    def needs_poll(self):
+        """Device state changes can only be seen by polling"""
+
+        return bool(self.needed_resources) or DataMonitorComponent.needs_poll(self)
+
     def startup(self):
         """Request resource at startup"""
         self.set_resources(self.needed_resources)
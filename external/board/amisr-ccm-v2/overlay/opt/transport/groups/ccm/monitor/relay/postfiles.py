@@ -25,15 +25,39 @@
 #               Updated to transport3 / python3
 #               Abort if station hasn't been set ("unknown")
 #
+#   2026-10-16  Todd Valentic
+#               Replace find subprocess with an in-process scanner
+#                   (FileIndex) that remembers the files already seen
+#                   (path, mtime, size) in <name>.index. The timestamp
+#                   file only applies to files not in the index.
+#               Optionally watch for changes with inotify (watchdog)
+#                   and only rescan when something changed.
+#               Compress the next files in worker threads while the
+#                   current one is posted.
+#               Precompile and cache filename time parsing.
+#               Add post.delay (was fixed at 2s)
+#               Restore remove_files after a successful post
+#               Wait for prefetched compression before cleaning up
+#               Mark files skipped by max_files as seen
+#               Only rewrite the index when entries are stale or the
+#                   journal has grown, and never after a failed scan
+#               Keep the index cutoff in step with the timestamp file
+#               Always scan on the first poll when watching
+#
 ############################################################################
 
 import bz2
+import collections
+import concurrent.futures
 import datetime
+import fnmatch
+import functools
 import os
 import pathlib
 import re
-import subprocess
+import shutil
 import sys
+import threading
 import time
 import uuid
 
@@ -44,6 +68,149 @@ from datatransport import NewsPoster
 from datatransport import ConfigComponent
 from datatransport.utilities import PatternTemplate, remove_file, size_desc
 
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# Standard format - 20190802-200555C00SEQ01.ntf
+# Log format - hs-07-20190803-165804.log
+# VMTI format - vmti_08-02-2019_UTC20-04-55_0000_00.4607
+
+TIME_FORMATS = [
+    (re.compile(r"\d{8}.\d{6}"), "%Y%m%d-%H%M%S"),
+    (re.compile(r"\d{2}-\d{2}-\d{4}_UTC\d{2}-\d{2}-\d{2}"), "%m-%d-%Y-UTC%H-%M-%S"),
+]
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_filename_time(filename):
+    """Parse timestamp from filename, None if no match"""
+
+    for regex, timefmt in TIME_FORMATS:
+        match = regex.search(filename)
+        if not match:
+            continue
+        try:
+            timestr = match.group(0).replace("_", "-")
+            timestamp = datetime.datetime.strptime(timestr, timefmt)
+            return timestamp.replace(tzinfo=pytz.utc)
+        except ValueError:
+            pass
+
+    return None
+
+
+def compile_patterns(patterns):
+    """Combine shell patterns into one regex"""
+
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+class ChangeHandler(FileSystemEventHandler):
+    """Flag file system changes"""
+
+    def __init__(self, changed):
+        FileSystemEventHandler.__init__(self)
+        self.changed = changed
+
+    def on_any_event(self, _event):
+        """Any change needs a rescan"""
+        self.changed.set()
+
+
+class FileIndex:
+    """Files already seen, kept in a journal file"""
+
+    # Rewrite the journal once it has this many more lines than entries
+
+    MAX_JOURNAL_SLACK = 1000
+
+    # Files not in the index are new if they are newer than cutoff. It
+    # follows the timestamp file, so unindexed files older than the last
+    # post are skipped the same way before and after a restart.
+
+    def __init__(self, filename, cutoff):
+        self.filename = filename
+        self.cutoff = cutoff
+        self.entries = {}
+        self.lines = 0
+
+        self.load()
+
+        self.journal = self.filename.open("a", encoding="utf-8")
+
+    def load(self):
+        """Read the journal"""
+
+        if not self.filename.exists():
+            return
+
+        with self.filename.open(encoding="utf-8") as journal:
+            for line in journal:
+                self.lines += 1
+                try:
+                    path, mtime, size = line.rstrip("\n").rsplit("\t", 2)
+                    self.entries[path] = (float(mtime), int(size))
+                except ValueError:
+                    continue
+
+    def is_new(self, path, mtime, size):
+        """File has not been seen or has changed"""
+
+        if path in self.entries:
+            return self.entries[path] != (mtime, size)
+
+        return mtime > self.cutoff
+
+    def mark(self, path, mtime, size):
+        """Record file as seen"""
+
+        self.mark_many([(path, mtime, size)])
+
+    def mark_many(self, files):
+        """Record (path, mtime, size) files as seen"""
+
+        for path, mtime, size in files:
+            self.entries[path] = (mtime, size)
+            self.journal.write(f"{path}\t{mtime}\t{size}\n")
+            self.lines += 1
+
+        self.journal.flush()
+
+    def forget(self, path):
+        """Drop file from the index (dropped from the journal on compact)"""
+
+        self.entries.pop(path, None)
+
+    def compact(self, current):
+        """Drop entries for files that no longer exist. The journal is
+        only rewritten if entries were dropped or it has grown too long.
+        """
+
+        stale = [path for path in self.entries if path not in current]
+
+        for path in stale:
+            del self.entries[path]
+
+        slack = self.lines - len(self.entries)
+
+        if not stale and slack < self.MAX_JOURNAL_SLACK:
+            return
+
+        tmpname = self.filename.with_name(f".{self.filename.name}.tmp")
+
+        with tmpname.open("w", encoding="utf-8") as output:
+            for path, (mtime, size) in self.entries.items():
+                output.write(f"{path}\t{mtime}\t{size}\n")
+
+        self.journal.close()
+        tmpname.replace(self.filename)
+        self.journal = self.filename.open("a", encoding="utf-8")
+        self.lines = len(self.entries)
+
 
 class FileGroup(ConfigComponent):
     """File Group"""
@@ -66,6 +233,14 @@ class FileGroup(ConfigComponent):
         self.max_files = self.config.get_int("max_files")
         self.enable_parse_time = self.config.get_boolean("parse_time", True)
         self.enable_serial_num = self.config.get_boolean("add_serialnum", False)
+        self.post_delay = self.config.get_timedelta("post.delay", "2s")
+        self.compress_workers = self.config.get_int("compress.workers", 2)
+        self.lookahead = self.config.get_int("compress.lookahead", 4)
+        self.watch = self.config.get_boolean("watch", False)
+        self.rescan_rate = self.config.get_timedelta("rescan.rate", "1h")
+
+        self.match_paths_regex = compile_patterns(self.match_paths)
+        self.match_names_regex = compile_patterns(self.match_names)
 
         self.replace_path = PatternTemplate("path", "/")
 
@@ -83,33 +258,43 @@ class FileGroup(ConfigComponent):
         if self.start_current:
             os.utime(self.time_filename, None)
 
+        cutoff = os.path.getmtime(self.time_filename)
+        self.index = FileIndex(pathlib.Path(f"{self.name}.index"), cutoff)
+        self.current = {}
+        self.scan_time = None
+
+        self.changed = threading.Event()
+        self.observer = None
+
+        if self.watch:
+            self.start_watch()
+
         self.log.info("Watching for files in %s", self.start_path)
         self.log.info("match paths %s", " ".join(self.match_paths))
         self.log.info("match names %s", " ".join(self.match_names))
 
-    def parse_time(self, filename):
-        """Parse timestamp from filename"""
+    def start_watch(self):
+        """Watch start path for changes"""
 
-        # Standard format - 20190802-200555C00SEQ01.ntf
-        # Log format - hs-07-20190803-165804.log
-        # VMTI format - vmti_08-02-2019_UTC20-04-55_0000_00.4607
+        if Observer is None:
+            self.log.warn("watchdog not available, using periodic scans")
+            return
 
-        regexs = [
-            (r"\d{8}.\d{6}", "%Y%m%d-%H%M%S"),
-            (r"\d{2}-\d{2}-\d{4}_UTC\d{2}-\d{2}-\d{2}", "%m-%d-%Y-UTC%H-%M-%S"),
-        ]
+        if not self.start_path.exists():
+            self.log.warn("Cannot watch missing path %s", self.start_path)
+            return
 
-        timestamp = None
+        self.observer = Observer()
+        self.observer.schedule(
+            ChangeHandler(self.changed), str(self.start_path), recursive=True
+        )
+        self.observer.daemon = True
+        self.observer.start()
 
-        for regex, timefmt in regexs:
-            try:
-                timestr = re.findall(regex, filename)[0]
-                timestr = timestr.replace("_", "-")
-                timestamp = datetime.datetime.strptime(timestr, timefmt)
-                timestamp = timestamp.replace(tzinfo=pytz.utc)
-                break
-            except Exception: # pylint: disable=broad-exception-caught
-                pass
+    def parse_time(self, filename):
+        """Parse timestamp from filename"""
+
+        timestamp = parse_filename_time(filename)
 
         if timestamp is None:
             self.log.warn("Unable to parse timestamp from filename: %s", filename)
@@ -148,57 +333,110 @@ class FileGroup(ConfigComponent):
 
         self.log.info('post done')
 
-        self.wait(2)
+        self.wait(self.post_delay)
 
-    def process_file(self, pathname):
-        """Process file"""
+    def compress_file(self, pathname):
+        """Compress file, return the compressed name"""
 
-        self.log.info("Processing %s", pathname)
+        zipname = pathlib.Path(pathname.name + ".bz2")
 
-        bzipext = ".bz2"
-        is_compressed = pathname.suffix == bzipext
-        zipname = pathlib.Path(pathname.name+bzipext)
+        self.log.debug("  - compressing file %s", pathname)
 
-        if self.compress and not is_compressed:
-            self.log.debug("  - compressing file")
-            data = pathname.read_bytes()
-            zipname.write_bytes(bz2.compress(data))
+        with pathname.open("rb") as src, bz2.open(zipname, "wb") as output:
+            shutil.copyfileobj(src, output)
 
-            orgsize = os.path.getsize(pathname)
-            zipsize = os.path.getsize(zipname)
+        orgsize = os.path.getsize(pathname)
+        zipsize = os.path.getsize(zipname)
 
-            if orgsize > 0:
-                zippct = (zipsize / float(orgsize)) * 100
-            else:
-                zippct = 0
+        if orgsize > 0:
+            zippct = (zipsize / float(orgsize)) * 100
+        else:
+            zippct = 0
+
+        self.log.info(
+            "  - %s: %s -> %s (%d%%)",
+            pathname.name, size_desc(orgsize), size_desc(zipsize), zippct
+        )
 
-            self.log.info(
-                "  - %s -> %s (%d%%)", 
-                size_desc(orgsize), size_desc(zipsize), zippct
-            )
+        return zipname
 
-            postfile = zipname
+    def needs_compress(self, pathname):
+        """File should be compressed before posting"""
 
-        else:
-            postfile = pathname
+        return self.compress and pathname.suffix != ".bz2"
+
+    def process_file(self, pathname, postfile=None):
+        """Process file"""
 
-        self.post(postfile)
+        self.log.info("Processing %s", pathname)
 
-        # Cleanup files
+        if postfile is None:
+            if self.needs_compress(pathname):
+                postfile = self.compress_file(pathname)
+            else:
+                postfile = pathname
 
-        remove_file(zipname)
+        try:
+            self.post(postfile)
+        finally:
+            if postfile != pathname:
+                remove_file(postfile)
 
         if self.remove_files:
             remove_file(pathname)
 
-    def join_list(self, name, parts):
-        """Create an or-ed parameter list"""
+    def scan(self):
+        """Walk start path. Returns {path: (mtime, size)} of matching
+        files and the number of directories that could not be read.
+        """
 
-        result = [f'-{name} "{part}"' for part in parts]
-        result = " -o ".join(result)
-        result = f"\\( {result} \\)" 
+        results = {}
+        errors = 0
+        dirs = [str(self.start_path)]
 
-        return result
+        while dirs:
+            path = dirs.pop()
+
+            try:
+                self.scan_dir(path, results, dirs)
+            except OSError as e:
+                self.log.error("Problem scanning %s: %s", path, e)
+                errors += 1
+
+        return results, errors
+
+    def scan_dir(self, path, results, dirs):
+        """Add matching files in path to results, subdirectories to dirs"""
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    if entry.name.startswith("."):
+                        continue
+                    if not self.match_names_regex.match(entry.name):
+                        continue
+                    if not self.match_paths_regex.match(entry.path):
+                        continue
+                    info = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                results[entry.path] = (info.st_mtime, info.st_size)
+
+    def needs_scan(self):
+        """Check if the tree needs to be walked"""
+
+        if not self.observer or self.scan_time is None:
+            return True
+
+        if self.changed.is_set():
+            return True
+
+        return time.monotonic() - self.scan_time >= self.rescan_rate.total_seconds()
 
     def find_files(self):
         """Search for files to post"""
@@ -206,35 +444,18 @@ class FileGroup(ConfigComponent):
         if not self.start_path.exists():
             return []
 
-        names = self.join_list("name", self.match_names)
-        paths = self.join_list("path", self.match_paths)
-
-        cmd = (
-            f"find {self.start_path} -newer {self.time_filename} "
-            f"-type f {paths} {names} -print" 
-        )
-
-        self.log.debug("cmd=%s", cmd)
-
-        status, output = subprocess.getstatusoutput(cmd)
-
-        if status != 0:
-            self.log.error('Problem finding files:')
-            self.log.error('cmd=%s', cmd)
-            self.log.error('status=%s', status)
-            self.log.error('output=%s', output)
-            return []
-
-        self.log.debug("status=%s", status)
-        self.log.debug("output='%s'", output)
-
-        filelist = []
-
-        for line in output.split('\n'):
-            filename = pathlib.Path(line)
-            if not filename.name or filename.name.startswith("."):
-                continue
-            filelist.append(filename)
+        if self.needs_scan():
+            self.changed.clear()
+            self.scan_time = time.monotonic()
+            self.current, errors = self.scan()
+            if not errors:
+                self.index.compact(self.current)
+
+        filelist = [
+            pathlib.Path(path)
+            for path, (mtime, size) in self.current.items()
+            if self.index.is_new(path, mtime, size)
+        ]
 
         filelist.sort()
 
@@ -243,9 +464,15 @@ class FileGroup(ConfigComponent):
             filelist = filelist[0:-1]
 
         if self.max_files:
-            # keep only the last N files
+            # keep only the last N files, the others are never posted
+            skipped = filelist[:-self.max_files]
+
             if self.remove_files:
-                remove_file(filelist[:-self.max_files])
+                remove_file(skipped)
+            else:
+                self.index.mark_many(
+                    (str(path), *self.current[str(path)]) for path in skipped
+                )
 
             filelist = filelist[-self.max_files :]
 
@@ -257,14 +484,64 @@ class FileGroup(ConfigComponent):
         filenames = self.find_files()
         self.log.debug("Polling - found %d new files.", len(filenames))
 
-        for filename in filenames:
-            if not self.is_running():
-                break
+        if not filenames:
+            return
+
+        workers = self.compress_workers if self.compress else 0
+
+        with concurrent.futures.ThreadPoolExecutor(max(workers, 1)) as executor:
+            self.process_files(executor if workers else None, filenames)
+
+    def process_files(self, executor, filenames):
+        """Post files, compressing the next ones in the background"""
+
+        pending = collections.deque()
+        inflight = set()
+        queue = collections.deque(filenames)
+
+        def prefetch():
+            while executor and queue and len(pending) < self.lookahead:
+                filename = queue[0]
+                if filename.name in inflight or not self.needs_compress(filename):
+                    break
+                queue.popleft()
+                inflight.add(filename.name)
+                future = executor.submit(self.compress_file, filename)
+                pending.append((filename, future))
+
+        try:
+            while (pending or queue) and self.is_running():
+                prefetch()
+
+                if pending:
+                    filename, future = pending.popleft()
+                    inflight.discard(filename.name)
+                else:
+                    filename, future = queue.popleft(), None
+
+                mtime, size = self.current[str(filename)]
 
-            timestamp = os.path.getmtime(filename)
-            self.process_file(filename)
-            os.utime(self.time_filename, (timestamp, timestamp))
+                try:
+                    postfile = future.result() if future else None
+                except OSError as e:
+                    self.log.error("Problem compressing %s: %s", filename, e)
+                    continue
+
+                self.process_file(filename, postfile)
+                os.utime(self.time_filename, (mtime, mtime))
+                self.index.cutoff = mtime
+
+                if self.remove_files:
+                    self.current.pop(str(filename), None)
+                    self.index.forget(str(filename))
+                else:
+                    self.index.mark(str(filename), mtime, size)
 
+        finally:
+            for filename, future in pending:
+                if not future.cancel():
+                    concurrent.futures.wait([future])
+                remove_file(filename.name + ".bz2")
 
 class PostFiles(ProcessClient):
     """Post Files Process Client"""
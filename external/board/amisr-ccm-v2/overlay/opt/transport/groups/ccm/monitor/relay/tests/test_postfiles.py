@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+import datetime
+import logging
+import os
+import threading
+
+from postfiles import FileGroup, FileIndex, compile_patterns
+
+
+class ScanGroup(FileGroup):
+    """Only the state used by find_files() and process_files()"""
+
+    # pylint: disable=super-init-not-called
+
+    def __init__(self, path, observer=None):
+        self.log = logging.getLogger("test_postfiles")
+        self.start_path = path / "data"
+        self.match_names_regex = compile_patterns(["*"])
+        self.match_paths_regex = compile_patterns(["*"])
+        self.include_last = True
+        self.max_files = None
+        self.remove_files = False
+        self.compress = False
+        self.lookahead = 4
+        self.rescan_rate = datetime.timedelta(hours=1)
+        self.time_filename = path / "test.timestamp"
+        self.changed = threading.Event()
+        self.observer = observer
+        self.current = {}
+        self.scan_time = None
+        self.posted = []
+
+        if not self.time_filename.exists():
+            self.time_filename.write_text("0", encoding="utf-8")
+            os.utime(self.time_filename, (0, 0))
+
+        cutoff = os.path.getmtime(self.time_filename)
+        self.index = FileIndex(path / "test.index", cutoff)
+
+    def is_running(self):
+        return True
+
+    def process_file(self, pathname, postfile=None):
+        self.posted.append(pathname.name)
+
+    def post_all(self):
+        """Post everything find_files() returns"""
+
+        self.process_files(None, self.find_files())
+
+
+def make_file(path, name, mtime):
+    """Create a file with the given mtime"""
+
+    path.mkdir(parents=True, exist_ok=True)
+
+    filename = path / name
+    filename.write_text(name, encoding="utf-8")
+    os.utime(filename, (mtime, mtime))
+
+    return filename
+
+
+def test_journal_replay(tmp_path):
+    """A new index replays the journal left by the last one"""
+
+    filename = tmp_path / "test.index"
+
+    index = FileIndex(filename, 0)
+    index.mark("/data/a", 100.5, 10)
+    index.mark_many([("/data/b", 200.0, 20), ("/data/c", 300.0, 30)])
+    index.mark("/data/a", 150.0, 15)
+    index.forget("/data/c")
+
+    with filename.open("a", encoding="utf-8") as journal:
+        journal.write("partial line\n")
+
+    restarted = FileIndex(filename, 0)
+
+    # forget() only takes effect on disk after a compact
+
+    assert restarted.entries == {
+        "/data/a": (150.0, 15),
+        "/data/b": (200.0, 20),
+        "/data/c": (300.0, 30),
+    }
+    assert restarted.lines == 5
+    assert not restarted.is_new("/data/a", 150.0, 15)
+    assert restarted.is_new("/data/a", 150.0, 16)
+
+    # Compact drops files that are gone and rewrites the journal
+
+    restarted.compact({"/data/a": (150.0, 15)})
+
+    assert restarted.lines == 1
+    assert FileIndex(filename, 0).entries == {"/data/a": (150.0, 15)}
+
+
+def test_startup_cutoff(tmp_path):
+    """Unindexed files older than the timestamp file are skipped"""
+
+    data = tmp_path / "data"
+
+    make_file(data, "old", 100)
+    make_file(data, "new", 300)
+
+    make_file(tmp_path, "test.timestamp", 200)
+
+    group = ScanGroup(tmp_path)
+
+    assert group.index.cutoff == 200
+    assert [path.name for path in group.find_files()] == ["new"]
+
+    group.post_all()
+
+    assert group.posted == ["new"]
+    assert os.path.getmtime(group.time_filename) == 300
+    assert group.index.cutoff == 300
+
+    # A late file older than the last post is skipped, as it would be
+    # after a restart. A changed file that is already indexed is posted.
+
+    make_file(data, "late", 250)
+    make_file(data, "new", 400)
+
+    group.post_all()
+
+    assert group.posted == ["new", "new"]
+
+    make_file(data, "later", 350)
+
+    restarted = ScanGroup(tmp_path)
+
+    assert restarted.index.cutoff == 400
+    assert [path.name for path in restarted.find_files()] == []
+
+
+def test_rescan_without_watch(tmp_path):
+    """Without an observer every poll scans, with one only on changes"""
+
+    data = tmp_path / "data"
+    make_file(data, "a", 100)
+
+    group = ScanGroup(tmp_path)
+
+    assert group.needs_scan()
+    assert [path.name for path in group.find_files()] == ["a"]
+
+    make_file(data, "b", 200)
+
+    assert group.needs_scan()
+    assert [path.name for path in group.find_files()] == ["a", "b"]
+
+    # With a watcher, new files are only seen after a change event
+
+    watched = ScanGroup(tmp_path, observer=object())
+
+    assert [path.name for path in watched.find_files()] == ["a", "b"]
+
+    make_file(data, "c", 300)
+
+    assert not watched.needs_scan()
+    assert [path.name for path in watched.find_files()] == ["a", "b"]
+
+    watched.changed.set()
+
+    assert [path.name for path in watched.find_files()] == ["a", "b", "c"]
+    assert not watched.changed.is_set()
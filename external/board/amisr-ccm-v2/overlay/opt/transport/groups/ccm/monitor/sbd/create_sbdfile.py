@@ -11,10 +11,15 @@
 #   2023-07-09  Todd Valentic
 #               Updated to python3
 #
+#   2026-10-16  Todd Valentic
+#               Size parts to fill the MT payload limit (--max-size)
+#               Use zlib or bz2, whichever is smaller
+#               Fix flags, message type and CRC32 packing
+#               Use --sernum if given
+#
 ##########################################################################
 
 import argparse
-import bz2
 import sys
 import struct
 import time
@@ -22,13 +27,22 @@ import zlib
 
 from pathlib import Path
 
-from sbd_types import MessageType, FileFlags
+from sbd_types import MessageType, FileFlags, Codec
+from sbd_pack import compress_smallest
+
+# MT payloads are limited to 270 bytes for 960X SBD modems
+
+MAX_MESSAGE_SIZE = 270
+
+HEADER_FMT = "!2BI2B"
+HEADER_LEN = struct.calcsize(HEADER_FMT)
 
 
 def chunk(buffer, n):
     """Split buffer"""
 
-    return [buffer[k : k + n] for k in range(0, len(buffer), n)]
+    view = memoryview(buffer)
+    return [view[k : k + n] for k in range(0, len(buffer), n)]
 
 # pylint: disable=too-many-locals
 
@@ -48,37 +62,42 @@ def create_message(args):
 
     flags = 0
     if args.execute:
-        flags |= FileFlags.EXECUTE
+        flags |= FileFlags.EXECUTE.value
     if args.remove:
-        flags |= FileFlags.REMOVE
+        flags |= FileFlags.REMOVE.value
+
+    codec, contents = compress_smallest(contents)
 
-    compressed_contents = bz2.compress(contents)
-    if len(compressed_contents) < len(contents):
-        flags |= FileFlags.COMPRESSED
-        contents = compressed_contents
+    if codec == Codec.ZLIB:
+        flags |= FileFlags.COMPRESSED.value | FileFlags.ZLIB.value
+    elif codec == Codec.BZ2:
+        flags |= FileFlags.COMPRESSED.value
 
     destname = args.filename or args.input_name
     destname = destname.encode('ascii') 
 
-    meta_fmt = f"!BiB{len(destname)}s"
+    meta_fmt = f"!BIB{len(destname)}s"
     meta = struct.pack(meta_fmt, flags, crc32, len(destname), destname)
 
     contents = meta + contents
 
-    # MT payloads are limited to 270 bytes for 960X SBD modems
-    # Split into 250-byte blocks (to leave room for header)
+    # Fill each part up to the payload limit, leaving room for header
+
+    blocks = chunk(contents, args.max_size - HEADER_LEN)
 
-    blocks = chunk(contents, 250)
-    time.sleep(1)  # Ensure we have a new timestamp
-    sernum = int(time.time())
+    if args.sernum:
+        sernum = int(args.sernum)
+    else:
+        time.sleep(1)  # Ensure we have a new timestamp
+        sernum = int(time.time())
 
     total_blocks = len(blocks)
-    msg_type = MesssageType.FILE_UPLOAD 
+    msg_type = MessageType.FILE_UPLOAD.value
     msg_version = 0
 
     for index, block in enumerate(blocks):
         header = struct.pack(
-            "!2BI2B", msg_type, msg_version, sernum, index, total_blocks
+            HEADER_FMT, msg_type, msg_version, sernum, index, total_blocks
         )
 
         output_name = args.output or input_path.stem
@@ -89,9 +108,10 @@ def create_message(args):
     print(f"Total parts: {total_blocks}")
     print(f"Payload len: {contents_len}")
     print(f"CRC32:       {crc32}")
-    print(f"Execute?     {bool(flags & FileFlags.EXECUTE)}")
-    print(f"Compressed?  {bool(flags & FileFlags.COMPRESSED)}")
-    print(f"Remove?      {bool(flags & FileFlags.REMOVE)}")
+    print(f"Codec:       {codec.name.lower()}")
+    print(f"Execute?     {bool(flags & FileFlags.EXECUTE.value)}")
+    print(f"Compressed?  {bool(flags & FileFlags.COMPRESSED.value)}")
+    print(f"Remove?      {bool(flags & FileFlags.REMOVE.value)}")
 
     return 0
 
@@ -106,6 +126,13 @@ def main():
     parser.add_argument("-f", "--filename", help="Embedded filename")
     parser.add_argument("-o", "--output", help="Output filename")
     parser.add_argument("-s", "--sernum", help="Serial number")
+    parser.add_argument(
+        "-m",
+        "--max-size",
+        type=int,
+        default=MAX_MESSAGE_SIZE,
+        help=f"Message size limit (default {MAX_MESSAGE_SIZE})",
+    )
 
     parser.add_argument("input_name")
 
@@ -25,6 +25,12 @@
 #   2023-06-16  Todd Valentic
 #               Updated for transport3 / python3
 #
+#   2026-10-16  Todd Valentic
+#               Optionally pack files from several sources into each
+#                   MO message (pack.enabled), filled up to
+#                   pack.max_size in priority order. See sbd_pack.
+#               Fix modem method names and message encoding
+#
 ##########################################################################
 
 import glob
@@ -36,6 +42,8 @@ from datatransport import ConfigComponent, NewsPoster
 
 import modem
 
+from sbd_pack import MessagePacker, MAX_MESSAGE_SIZE
+
 
 class Source(ConfigComponent):
     """Data Source"""
@@ -105,6 +113,10 @@ class SBDMonitor(DataMonitor):
 
         self.sources = sources
 
+        self.pack_enabled = self.config.get_boolean("pack.enabled", False)
+        max_size = self.config.get_int("pack.max_size", MAX_MESSAGE_SIZE)
+        self.packer = MessagePacker(max_size)
+
     def find_filenames(self):
         """Find data files"""
 
@@ -115,28 +127,58 @@ class SBDMonitor(DataMonitor):
 
         return filenames
 
-    def buffer_data(self, filename):
-        """Write filename payload to modem"""
+    def get_source(self, filename):
+        """Return the source for filename"""
 
         basename = os.path.basename(filename)
         srcname = basename.split("-", 1)[0]
-        source = self.sources[srcname]
+
+        return self.sources[srcname]
+
+    def buffer_data(self, filename):
+        """Write filename payload to modem"""
+
+        source = self.get_source(filename)
 
         with open(filename, "rb") as f:
-            data = chr(source.code) + f.read()
+            data = bytes([source.code]) + f.read()
+
+        self.buffer_message(data)
+
+    def buffer_message(self, data):
+        """Write message to modem"""
 
         self.log.info("MO message queued (%d bytes)", len(data))
-        self.modem.writeMessage(data)
+        self.modem.write_message(data)
+
+    def make_messages(self, filenames):
+        """Return list of (message, filenames) to send"""
+
+        if not self.pack_enabled:
+            return [(None, [filename]) for filename in filenames]
+
+        items = []
+
+        for filename in filenames:
+            with open(filename, "rb") as f:
+                items.append((self.get_source(filename).code, f.read(), filename))
+
+        messages, oversize = self.packer.pack(items)
+
+        for filename in oversize:
+            self.log.warning("Too big to pack, sending alone: %s", filename)
+
+        return messages + [(None, [filename]) for filename in oversize]
 
     def exchange_data(self):
         """Send message, check for inbound"""
 
-        inbound_messages = self.modem.exchangeSBD()
+        inbound_messages = self.modem.exchange_sbd()
 
         for msg in inbound_messages:
             with open("msg.sbd", "wb") as f:
                 f.write(msg)
-            self.newsPoster.post("msg.sbd")
+            self.news_poller.post("msg.sbd")
 
     def wait_for_signal(self):
         """Wait until sufficient signal strength"""
@@ -174,16 +216,22 @@ class SBDMonitor(DataMonitor):
         if filenames:
             self.log.info("Found %d files queued for transfer", len(filenames))
 
-            for index, filename in enumerate(filenames):
+            messages = self.make_messages(filenames)
+
+            for index, (message, msg_filenames) in enumerate(messages):
                 self.log.info(
                     "Send %d of %d: %s",
                     index + 1,
-                    len(filenames),
-                    os.path.basename(filename),
+                    len(messages),
+                    " ".join(os.path.basename(name) for name in msg_filenames),
                 )
-                self.buffer_data(filename)
+                if message is None:
+                    self.buffer_data(msg_filenames[0])
+                else:
+                    self.buffer_message(message)
                 self.exchange_data()
-                os.remove(filename)
+                for filename in msg_filenames:
+                    os.remove(filename)
                 self.log.info("  All messages sent")
 
         else:
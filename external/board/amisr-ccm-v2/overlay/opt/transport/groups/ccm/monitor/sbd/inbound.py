@@ -14,6 +14,11 @@
 #   2023-07-11  Todd Valentic
 #               Initial implementation. Based on HBR SBD.
 #
+#   2026-10-16  Todd Valentic
+#               Keep one file handler so upload parts are collected
+#                   in memory. Add spool.* parameters.
+#               Fix message type dispatch
+#
 ####################################################################@@@@@@
 
 import sys
@@ -38,6 +43,16 @@ class SBDInboundMonitor(ProcessClient):
 
         self.path_file_ack = self.config.get_path("path.file_ack")
 
+        max_age = self.config.get_timedelta("spool.max_age", "1d")
+
+        self.file_handler = SBDFileHandler(
+            self.log,
+            spool_path=self.config.get_path("spool.path", "spool"),
+            max_transfers=self.config.get_int("spool.max_transfers", 16),
+            max_bytes=self.config.get_int("spool.max_bytes", 1000000),
+            max_age=max_age.total_seconds(),
+        )
+
     def process_shell_command(self, _payload):
         """Process SHELL_COMMAND messages"""
 
@@ -55,7 +70,7 @@ class SBDInboundMonitor(ProcessClient):
 
         self.log.info(" - File upload")
 
-        ack = SBDFileHandler(self.log).process(payload)
+        ack = self.file_handler.process(payload)
 
         if ack:
             filename = Path(self.now().strftime(self.path_file_ack))
@@ -68,13 +83,13 @@ class SBDInboundMonitor(ProcessClient):
     def process_message(self, data):
         """Dispatch SBD message corresponding handler"""
 
-        msgtype = ord(data[0])
+        msgtype = data[0]
         payload = data[1:]
 
         handlers = {
-            MessageType.CCM_COMMAND: self.process_ccm_command,
-            MessageType.SHELL_COMMAND: self.process_shell_command,
-            MessageType.FILE_UPLOAD: self.process_file_upload,
+            MessageType.CCM_COMMAND.value: self.process_ccm_command,
+            MessageType.SHELL_COMMAND.value: self.process_shell_command,
+            MessageType.FILE_UPLOAD.value: self.process_file_upload,
         }
 
         if msgtype in handlers:
@@ -16,12 +16,21 @@
 #   2023-07-10  Todd Valentic
 #               Updated for transport3 / python3
 #
+#   2026-10-16  Todd Valentic
+#               Reassemble parts in memory (Reassembler). Each part is
+#                   also appended to a spool file so an upload can be
+#                   finished after a restart. Spooled uploads are
+#                   limited by count, size and age.
+#               Fix joining bytes, flag checks and ack timestamp
+#               Support zlib compressed uploads (ZLIB flag)
+#               CRC32 is unsigned
+#               Spool files start with the upload start time
+#               Restart an upload if its serial number is reused
+#
 ##########################################################################
 
 import bz2
 import subprocess
-import json
-import glob
 import os
 import struct
 import sys
@@ -34,20 +43,188 @@ from datatransport.utilities import remove_file
 
 from sbd_types import FileFlags
 
+# Spool files hold the start time followed by the parts
+
+SPOOL_FMT = "!d"
+SPOOL_LEN = struct.calcsize(SPOOL_FMT)
+
+PART_FMT = "!BBH"
+PART_LEN = struct.calcsize(PART_FMT)
+
 
 def make_ack(sernum, contents_ok, process_ok, result_code):
     """Create ACK message"""
     fmt = "!BIIBBB"
     ver = 1
-    timestamp = time.time()
+    timestamp = int(time.time())
     return struct.pack(fmt, ver, timestamp, sernum, contents_ok, process_ok, result_code)
 
 
+class Transfer:
+    """Parts received for one upload"""
+
+    def __init__(self, total, spool_filename, start_time):
+        self.total = total
+        self.spool_filename = spool_filename
+        self.start_time = start_time
+        self.parts = {}
+        self.size = 0
+
+    def add(self, part, data):
+        """Store a part, replacing any earlier copy"""
+
+        self.size += len(data) - len(self.parts.get(part, b""))
+        self.parts[part] = data
+
+    def is_complete(self):
+        """All parts received"""
+
+        return len(self.parts) == self.total
+
+    def join(self):
+        """Return the joined parts"""
+
+        return b"".join(self.parts[part] for part in range(self.total))
+
+
+class Reassembler:
+    """Collect upload parts"""
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self, log, spool_path=".", max_transfers=16, max_bytes=1000000, max_age=86400
+    ):
+        self.log = log
+        self.spool_path = Path(spool_path)
+        self.max_transfers = max_transfers
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.transfers = {}
+
+        self.spool_path.mkdir(parents=True, exist_ok=True)
+        self.load()
+
+    def spool_filename(self, sernum):
+        """Spool file for an upload"""
+
+        return self.spool_path / f"{sernum}.parts"
+
+    def load(self):
+        """Reload spooled parts"""
+
+        for filename in sorted(self.spool_path.glob("*.parts")):
+            try:
+                sernum = int(filename.stem)
+                transfer = self.load_spool(filename)
+            except (ValueError, OSError, struct.error) as e:
+                self.log.error("Problem loading %s: %s", filename, e)
+                remove_file(filename)
+                continue
+
+            if transfer.parts:
+                self.transfers[sernum] = transfer
+                self.log.info("Loaded %d parts for %s", len(transfer.parts), sernum)
+            else:
+                remove_file(filename)
+
+    def load_spool(self, filename):
+        """Read a spool file. A partly written last part is dropped"""
+
+        buffer = memoryview(filename.read_bytes())
+
+        (start_time,) = struct.unpack_from(SPOOL_FMT, buffer)
+        offset = SPOOL_LEN
+        transfer = None
+
+        while offset + PART_LEN <= len(buffer):
+            part, total, length = struct.unpack_from(PART_FMT, buffer, offset)
+            offset += PART_LEN
+
+            if transfer is None:
+                transfer = Transfer(total, filename, start_time)
+
+            if total != transfer.total or part >= total:
+                raise ValueError(f"Invalid part {part} of {total}")
+
+            if offset + length > len(buffer):
+                self.log.warning("Truncated part %d in %s", part, filename)
+                break
+
+            transfer.add(part, bytes(buffer[offset : offset + length]))
+            offset += length
+
+        return transfer or Transfer(0, filename, start_time)
+
+    def discard(self, sernum):
+        """Drop an upload"""
+
+        transfer = self.transfers.pop(sernum)
+        remove_file(transfer.spool_filename)
+
+    def prune(self, now):
+        """Enforce the age, count and size limits"""
+
+        for sernum, transfer in list(self.transfers.items()):
+            if now - transfer.start_time > self.max_age:
+                self.log.info("Discarding stale upload %s", sernum)
+                self.discard(sernum)
+
+        def total_bytes():
+            return sum(transfer.size for transfer in self.transfers.values())
+
+        while self.transfers and (
+            len(self.transfers) > self.max_transfers or total_bytes() > self.max_bytes
+        ):
+            sernum = min(self.transfers, key=lambda k: self.transfers[k].start_time)
+            self.log.info("Discarding oldest upload %s", sernum)
+            self.discard(sernum)
+
+    def add(self, sernum, part, total, data):
+        """Add a part. Returns the joined contents when complete"""
+
+        now = time.time()
+
+        if part >= total:
+            self.log.error("Invalid part %d of %d for %s", part, total, sernum)
+            return None
+
+        if sernum in self.transfers and self.transfers[sernum].total != total:
+            self.log.info("Restarting upload %s", sernum)
+            self.discard(sernum)
+
+        if sernum not in self.transfers:
+            filename = self.spool_filename(sernum)
+            remove_file(filename)
+            self.transfers[sernum] = Transfer(total, filename, now)
+
+        transfer = self.transfers[sernum]
+        transfer.add(part, data)
+
+        if transfer.is_complete():
+            contents = transfer.join()
+            self.discard(sernum)
+            return contents
+
+        with transfer.spool_filename.open("ab") as output:
+            if output.tell() == 0:
+                output.write(struct.pack(SPOOL_FMT, transfer.start_time))
+            output.write(struct.pack(PART_FMT, part, total, len(data)))
+            output.write(data)
+            output.flush()
+            os.fsync(output.fileno())
+
+        self.prune(now)
+
+        return None
+
+
 class SBDFileHandler:
     """Handle SBD File messages"""
 
-    def __init__(self, log):
+    def __init__(self, log, **kw):
         self.log = log
+        self.reassembler = Reassembler(log, **kw)
 
     def process_contents(self, meta, contents):
         """Save, remove or execute file contents"""
@@ -63,7 +240,7 @@ class SBDFileHandler:
             destfile.flush()
             os.fsync(destfile.fileno())
 
-        if meta["flags"] & FileFlags.EXECUTE:
+        if meta["flags"] & FileFlags.EXECUTE.value:
             filename.chmod(0o775)
             cmd = filename.absolute()
             status, output = subprocess.getstatusoutput(cmd)
@@ -74,7 +251,7 @@ class SBDFileHandler:
             self.log.info("  - file executed, result status %d", status)
             self.log.info("  - output: %s", output)
 
-        if meta["flags"] & FileFlags.REMOVE:
+        if meta["flags"] & FileFlags.REMOVE.value:
             self.log.info("  - remove %s", filename)
             filename.unlink()
 
@@ -98,85 +275,62 @@ class SBDFileHandler:
 
         _version, sernum, part, total = struct.unpack_from(header_fmt, payload)
 
-        payload = payload[header_len:]
-
-        meta_filename = Path(f"{sernum}.meta")
+        contents = self.reassembler.add(sernum, part, total, payload[header_len:])
 
-        if part == 0:
-            meta_fmt = "!BiB"
-            meta_len = struct.calcsize(meta_fmt)
+        if contents is None:
+            return None
 
-            flags, crc32, filename_len = struct.unpack_from(meta_fmt, payload)
+        meta_fmt = "!BIB"
+        meta_len = struct.calcsize(meta_fmt)
 
-            filename_fmt = f"!{filename_len}s"
-            filename = struct.unpack_from(filename_fmt, payload, offset=meta_len)[0]
+        flags, crc32, filename_len = struct.unpack_from(meta_fmt, contents)
 
-            payload = payload[meta_len + filename_len :]
+        filename_fmt = f"!{filename_len}s"
+        filename = struct.unpack_from(filename_fmt, contents, offset=meta_len)[0]
 
-            meta = {"flags": flags, "crc32": crc32, "filename": filename}
+        contents = contents[meta_len + filename_len :]
 
-            meta_filename.write_text(json.dumps(meta), encoding='utf-8')
+        meta = {"flags": flags, "crc32": crc32, "filename": filename.decode("ascii")}
 
-            # Remove any older parts from previous try (if any)
-            remove_file(glob.glob(f"{sernum}-*.part"))
+        self.log.info("New file: %s", meta["filename"])
+        self.log.info("  - serial num: %s", sernum)
+        self.log.info("  - parts: %s", total)
+        self.log.info("  - flags: 0x%x", meta["flags"])
+        self.log.info("  - len: %d", len(contents))
 
-        part_filename = Path("f{sernum}-%{part:03d}-{total}.part")
-        part_filename.write_bytes(payload)
-
-        # Do we have all of the parts?
-
-        parts = glob.glob(f"{sernum}-*.part")
-
-        if len(parts) == total:
-            meta = dict(json.loads(meta_filename.read_text('utf-8')))
-
-            self.log.info("New file: %s", meta_filename)
-            self.log.info("  - serial num: %s", sernum)
-            self.log.info("  - parts: %s", total)
-            self.log.info("  - flags: 0x%x", meta["flags"])
-
-            contents = ""
-
-            for filepart in sorted(parts):
-                contents += Path(filepart).read_bytes()
-
-            self.log.info("  - len: %d", len(contents))
-
-            if meta["flags"] & FileFlags.COMPRESSED:
-                self.log.info("  - uncompressing")
-                try:
+        if meta["flags"] & FileFlags.COMPRESSED.value:
+            self.log.info("  - uncompressing")
+            try:
+                if meta["flags"] & FileFlags.ZLIB.value:
+                    contents = zlib.decompress(contents, -15)
+                else:
                     contents = bz2.decompress(contents)
-                except:
-                    self.log.error("  - failed to uncompress")
-                    contents = ""
-
-            if zlib.crc32(contents) != meta["crc32"]:
-                self.log.error(
-                    "  - checksum mismatch. expected %s, got %s",
-                    meta["crc32"], zlib.crc32(contents)
-                )
-                contents = ""
-
-            process_ok = False
-            result_code = 0
-
-            if contents:
-                try:
-                    result_code = self.process_contents(meta, contents)
-                    process_ok = True
-                except:
-                    self.log.exception("Failed to process contents")
-                    process_ok = False
-
-            remove_file(parts)
-            meta_filename.unlink()
-
-            contents_ok = len(contents) > 0
-            ack = make_ack(sernum, contents_ok, process_ok, result_code)
-
-            return ack
-
-        return None
+            except:
+                self.log.error("  - failed to uncompress")
+                contents = b""
+
+        if zlib.crc32(contents) != meta["crc32"]:
+            self.log.error(
+                "  - checksum mismatch. expected %s, got %s",
+                meta["crc32"], zlib.crc32(contents)
+            )
+            contents = b""
+
+        process_ok = False
+        result_code = 0
+
+        if contents:
+            try:
+                result_code = self.process_contents(meta, contents)
+                process_ok = True
+            except:
+                self.log.exception("Failed to process contents")
+                process_ok = False
+
+        contents_ok = len(contents) > 0
+        ack = make_ack(sernum, contents_ok, process_ok, result_code)
+
+        return ack
 
 def test():
     """Testing"""
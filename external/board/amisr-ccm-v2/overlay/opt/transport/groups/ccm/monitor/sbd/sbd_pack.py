@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""SBD Message Packing"""
+
+##########################################################################
+#
+#   Pack several small records into one SBD message
+#
+#   Packed message format:
+#
+#       byte 0      PACKED_CODE (0xFF)
+#       byte 1      version (high nibble), codec (low nibble)
+#       body        records, compressed with codec
+#
+#   Each record in the body is:
+#
+#       code        1 byte, source code
+#       length      2 bytes, network order
+#       data        length bytes
+#
+#   The codec is whichever of none, zlib (raw deflate, no header) or
+#   bz2 gives the smallest body.
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation
+#               Track the message size as records are added instead
+#                   of packing the whole message for each record
+#
+##########################################################################
+
+import bz2
+import struct
+import zlib
+
+from sbd_types import Codec, PACKED_CODE
+
+VERSION = 0
+
+HEADER_FMT = "!BB"
+HEADER_LEN = struct.calcsize(HEADER_FMT)
+
+RECORD_FMT = "!BH"
+RECORD_LEN = struct.calcsize(RECORD_FMT)
+
+# Payload limit for MO messages on 9603 modems
+
+MAX_MESSAGE_SIZE = 340
+
+
+def compress(data, codec):
+    """Compress data with codec"""
+
+    if codec == Codec.ZLIB:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+
+    if codec == Codec.BZ2:
+        return bz2.compress(data)
+
+    return data
+
+
+def decompress(data, codec):
+    """Decompress data with codec"""
+
+    if codec == Codec.ZLIB:
+        return zlib.decompress(data, -15)
+
+    if codec == Codec.BZ2:
+        return bz2.decompress(data)
+
+    return data
+
+
+def compress_smallest(data, codecs=(Codec.ZLIB, Codec.BZ2)):
+    """Return (codec, output) giving the smallest output"""
+
+    best_codec, best = Codec.NONE, data
+
+    for codec in codecs:
+        output = compress(data, codec)
+        if len(output) < len(best):
+            best_codec, best = codec, output
+
+    return best_codec, best
+
+
+def encode_records(records):
+    """Frame (code, data) records"""
+
+    parts = []
+
+    for code, data in records:
+        parts.append(struct.pack(RECORD_FMT, code, len(data)))
+        parts.append(data)
+
+    return b"".join(parts)
+
+
+def decode_records(body):
+    """Split body into (code, data) records"""
+
+    view = memoryview(body)
+    offset = 0
+    records = []
+
+    while offset < len(view):
+        code, length = struct.unpack_from(RECORD_FMT, view, offset)
+        offset += RECORD_LEN
+        records.append((code, bytes(view[offset : offset + length])))
+        offset += length
+
+    return records
+
+
+def pack_message(records, codecs=(Codec.ZLIB, Codec.BZ2)):
+    """Create a packed message from (code, data) records"""
+
+    codec, body = compress_smallest(encode_records(records), codecs)
+    header = struct.pack(HEADER_FMT, PACKED_CODE, (VERSION << 4) | codec.value)
+
+    return header + body
+
+
+def unpack_message(message):
+    """Return (code, data) records in a packed message"""
+
+    marker, info = struct.unpack_from(HEADER_FMT, message)
+
+    if marker != PACKED_CODE:
+        raise ValueError("Not a packed message")
+
+    if info >> 4 != VERSION:
+        raise ValueError(f"Unknown packed message version: {info >> 4}")
+
+    body = decompress(message[HEADER_LEN:], Codec(info & 0x0F))
+
+    return decode_records(body)
+
+
+class MessageBuilder:
+    """Records for one message, with a running size estimate.
+
+    The estimate is the smaller of the raw body and a zlib stream that
+    is fed each record as it is added, so a record is only compressed
+    once. The final message uses the smallest codec, which is never
+    larger than the estimate.
+    """
+
+    def __init__(self, max_size, codecs=(Codec.ZLIB, Codec.BZ2)):
+        self.max_size = max_size
+        self.codecs = codecs
+        self.records = []
+        self.raw_len = 0
+        self.compressor = None
+        self.chunks = []
+        self.zlib_len = 0
+
+        if Codec.ZLIB in codecs:
+            self.compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+
+    def add(self, code, data):
+        """Add a record if it fits. Returns True if added"""
+
+        record = encode_records([(code, data)])
+        size = self.raw_len + len(record)
+
+        if self.compressor and HEADER_LEN + size > self.max_size:
+            trial = self.compressor.copy()
+            size = self.zlib_len + len(trial.compress(record)) + len(trial.flush())
+
+        if HEADER_LEN + size > self.max_size:
+            return False
+
+        if self.compressor:
+            chunk = self.compressor.compress(record)
+            self.chunks.append(chunk)
+            self.zlib_len += len(chunk)
+
+        self.records.append((code, data))
+        self.raw_len += len(record)
+
+        return True
+
+    def message(self):
+        """Return the packed message"""
+
+        message = pack_message(self.records, self.codecs)
+
+        if self.compressor:
+            body = b"".join(self.chunks) + self.compressor.copy().flush()
+            if HEADER_LEN + len(body) < len(message):
+                header = struct.pack(
+                    HEADER_FMT, PACKED_CODE, (VERSION << 4) | Codec.ZLIB.value
+                )
+                message = header + body
+
+        return message
+
+
+class MessagePacker:
+    """Fill messages with records up to the size limit"""
+
+    def __init__(self, max_size=MAX_MESSAGE_SIZE, codecs=(Codec.ZLIB, Codec.BZ2)):
+        self.max_size = max_size
+        self.codecs = codecs
+
+    def fits(self, records):
+        """Return the packed message if records fit, otherwise None"""
+
+        message = pack_message(records, self.codecs)
+
+        if len(message) <= self.max_size:
+            return message
+
+        return None
+
+    def pack(self, items):
+        """Pack items into messages.
+
+        Items are (code, data, key) in priority order. Each message is
+        filled first-fit, so higher priority items go out first and
+        small items fill the remaining space.
+
+        Returns a list of (message, keys) and a list of keys for items
+        too big to fit in a message by themselves.
+        """
+
+        messages = []
+        oversize = []
+        remaining = []
+
+        for code, data, key in items:
+            if MessageBuilder(self.max_size, self.codecs).add(code, data):
+                remaining.append((code, data, key))
+            else:
+                oversize.append(key)
+
+        while remaining:
+            builder = MessageBuilder(self.max_size, self.codecs)
+            keys = []
+            skipped = []
+
+            for code, data, key in remaining:
+                if builder.add(code, data):
+                    keys.append(key)
+                else:
+                    skipped.append((code, data, key))
+
+            messages.append((builder.message(), keys))
+            remaining = skipped
+
+        return messages, oversize
@@ -8,6 +8,9 @@
 #   2023-07-11  Todd Valentic
 #               Initial implementation
 #
+#   2026-10-16  Todd Valentic
+#               Add ZLIB file flag, Codec and PACKED_CODE
+#
 ##########################################################################
 
 from enum import Enum
@@ -26,3 +29,17 @@ class FileFlags(Enum):
     EXECUTE = 0x01
     COMPRESSED = 0x02
     REMOVE = 0x04
+    ZLIB = 0x08
+
+
+class Codec(Enum):
+    """Compression used in packed messages"""
+
+    NONE = 0
+    ZLIB = 1
+    BZ2 = 2
+
+
+# First byte of a packed MO message. Other values are source codes.
+
+PACKED_CODE = 0xFF
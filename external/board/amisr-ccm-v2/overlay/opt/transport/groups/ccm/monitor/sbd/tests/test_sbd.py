@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import random
+import struct
+import zlib
+
+from sbd_filehandler import SBDFileHandler, SPOOL_FMT
+from sbd_pack import MessagePacker, compress, unpack_message
+from sbd_types import Codec, FileFlags, MessageType, PACKED_CODE
+
+HEADER_FMT = "!2BI2B"
+HEADER_LEN = struct.calcsize(HEADER_FMT)
+
+log = logging.getLogger("test_sbd")
+
+
+def make_items(count, seed=1):
+    """Telemetry like records, some compressible and some not"""
+
+    rng = random.Random(seed)
+    items = []
+
+    for index in range(count):
+        if index % 3:
+            data = f"temp={20 + index % 5} volts=12.{index % 9}".encode("ascii")
+        else:
+            data = rng.randbytes(rng.randint(5, 60))
+        items.append((index % 7, data, index))
+
+    return items
+
+
+def make_parts(sernum, filename, contents, part_size=100):
+    """FILE_UPLOAD payloads (without the message type byte)"""
+
+    flags = FileFlags.COMPRESSED.value | FileFlags.ZLIB.value
+    body = compress(contents, Codec.ZLIB)
+    destname = str(filename).encode("ascii")
+
+    meta = struct.pack(
+        f"!BIB{len(destname)}s", flags, zlib.crc32(contents), len(destname), destname
+    )
+    data = meta + body
+    blocks = [data[k : k + part_size] for k in range(0, len(data), part_size)]
+
+    return [
+        struct.pack(HEADER_FMT, MessageType.FILE_UPLOAD.value, 0, sernum, index,
+                    len(blocks))[1:] + block
+        for index, block in enumerate(blocks)
+    ]
+
+
+def test_pack_round_trip():
+    """Packed messages stay under the limit and hold every record once"""
+
+    items = make_items(200)
+    packer = MessagePacker(max_size=340)
+
+    messages, oversize = packer.pack(items + [(1, os.urandom(400), "big")])
+
+    assert oversize == ["big"]
+
+    seen = {}
+
+    for message, keys in messages:
+        assert len(message) <= 340
+        assert message[0] == PACKED_CODE
+        assert message[1] >> 4 == 0
+        records = unpack_message(message)
+        assert len(records) == len(keys)
+        for (code, data), key in zip(records, keys):
+            seen[key] = (code, data)
+
+    assert seen == {key: (code, data) for code, data, key in items}
+    assert any(message[1] & 0x0F == Codec.ZLIB.value for message, _ in messages)
+
+
+def test_pack_no_compression():
+    """Without codecs the body is the raw records"""
+
+    items = make_items(20)
+    messages, _oversize = MessagePacker(max_size=340, codecs=()).pack(items)
+
+    for message, keys in messages:
+        assert message[1] & 0x0F == Codec.NONE.value
+        assert [data for _code, data in unpack_message(message)] == [
+            items[key][1] for key in keys
+        ]
+
+
+def test_reassembly_restart(tmp_path):
+    """Parts spooled before a restart are combined with later parts"""
+
+    spool = tmp_path / "spool"
+    destname = tmp_path / "out" / "file.txt"
+    contents = os.urandom(500)
+    parts = make_parts(1234, destname, contents)
+
+    assert len(parts) > 3
+
+    handler = SBDFileHandler(log, spool_path=spool)
+
+    for payload in parts[:2]:
+        assert handler.process(payload) is None
+
+    start_time = handler.reassembler.transfers[1234].start_time
+
+    # New handler, as after a restart
+
+    handler = SBDFileHandler(log, spool_path=spool)
+    transfer = handler.reassembler.transfers[1234]
+
+    assert sorted(transfer.parts) == [0, 1]
+    assert transfer.start_time == start_time
+
+    for payload in parts[2:-1]:
+        assert handler.process(payload) is None
+
+    ack = handler.process(parts[-1])
+
+    _ver, _timestamp, sernum, contents_ok, process_ok, _result = struct.unpack(
+        "!BIIBBB", ack
+    )
+
+    assert (sernum, contents_ok, process_ok) == (1234, 1, 1)
+    assert destname.read_bytes() == contents
+    assert not list(spool.glob("*.parts"))
+
+
+def test_reused_sernum(tmp_path):
+    """A new total for a known serial number restarts the upload"""
+
+    destname = tmp_path / "file.txt"
+    handler = SBDFileHandler(log, spool_path=tmp_path / "spool")
+
+    old_parts = make_parts(55, destname, os.urandom(800))
+    new_contents = os.urandom(300)
+    new_parts = make_parts(55, destname, new_contents)
+
+    assert len(old_parts) != len(new_parts)
+
+    handler.process(old_parts[0])
+
+    for payload in new_parts[1:]:
+        handler.process(payload)
+
+    assert handler.process(new_parts[0]) is not None
+    assert destname.read_bytes() == new_contents
+
+
+def test_corrupt_spool(tmp_path):
+    """Bad spool files are removed, truncated parts are dropped"""
+
+    spool = tmp_path / "spool"
+    spool.mkdir()
+
+    header = struct.pack(SPOOL_FMT, 1000.0)
+
+    (spool / "1.parts").write_bytes(b"\x01\x02")
+    (spool / "2.parts").write_bytes(header + struct.pack("!BBH", 5, 3, 2) + b"ab")
+    (spool / "3.parts").write_bytes(
+        header
+        + struct.pack("!BBH", 0, 3, 2) + b"ab"
+        + struct.pack("!BBH", 1, 3, 10) + b"cd"
+    )
+    (spool / "bad.parts").write_bytes(header)
+
+    handler = SBDFileHandler(log, spool_path=spool)
+    transfers = handler.reassembler.transfers
+
+    assert list(transfers) == [3]
+    assert transfers[3].parts == {0: b"ab"}
+    assert transfers[3].start_time == 1000.0
+    assert sorted(path.name for path in spool.iterdir()) == ["3.parts"]
@@ -16,6 +16,9 @@
 #               going_off_to_on() handler isn't called and the resource
 #               manager then doesn't know we want it on.
 #
+#   2026-10-16  Todd Valentic
+#               Poll the device state every schedule.rate (needs_poll)
+#
 ##########################################################################
 
 import enum
@@ -109,6 +112,11 @@ class UplinkMonitor(DataMonitor):
         self.on = self.get_state("device", self.device) == "on"
         return self.on
 
+    def needs_poll(self):
+        """Device state changes can only be seen by polling"""
+
+        return True
+
     def power_cycle(self):
         """Power cycle uplink device"""
 
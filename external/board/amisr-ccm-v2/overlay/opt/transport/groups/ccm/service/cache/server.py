@@ -34,74 +34,496 @@
 #               Disable event integration. Too much load when messages
 #                   are big and high rate.
 #
+#   2026-10-16  Todd Valentic
+#               Enable event integration again. Changes are queued and
+#                   coalesced by key (EventPublisher), then sent in one
+#                   notify_many call from a background thread. Only keys
+#                   with registered observers are sent.
+#               Reload the event list as soon as the registered events
+#                   change (event get_generation)
+#
+#   2026-10-16  Todd Valentic
+#               Add get_many, put_many and merge
+#               Version entries. get_changes returns the entries changed
+#                   since a version (optionally limited to some keys).
+#               Expire entries from a heap instead of scanning timeouts
+#               Optionally save a snapshot (snapshot.path) periodically
+#                   and reload it at startup.
+#               Serialize access from the server and callback threads
+#               Start a new epoch after loading a snapshot so mirrors
+#                   refresh everything. merge builds a new value instead
+#                   of changing the stored one.
+#               Time RPC calls (get_stats)
+#               Keep removed key records for removed.retention or up to
+#                   removed.max. Older clients get a full resync.
+#               Catch all snapshot errors, fsync the snapshot file.
+#               Split out register_functions and setup_cache so the
+#                   benchmarks can run the cache without a transport
+#                   process (bench/fake_services.py)
+#
 ##########################################################################
 
+import collections
+import datetime
+import heapq
+import os
 import sys
 import threading
+import time
+import uuid
+import xmlrpc.client
 
 from datatransport import ProcessClient
-from datatransport import XMLRPCServer
 from datatransport import Directory
+from datatransport import AccessMixin
+
+from instrument import InstrumentedServer
+
+# Versions must fit in an XML-RPC int
+
+MAX_VERSION = 2**31 - 1
+
+
+class EventPublisher(threading.Thread, AccessMixin):
+    """Send cache changes to the event service"""
+
+    def __init__(self, parent):
+        threading.Thread.__init__(self, daemon=True)
+        AccessMixin.__init__(self, parent)
+
+        self.directory = Directory(self)
+
+        self.max_pending = self.config.get_int("event.max_pending", 1000)
+
+        self.pending = collections.OrderedDict()
+        self.condition = threading.Condition()
+
+        self.events = set()
+        self.generation = None
+
+    def put(self, key, value):
+        """Queue a change, replacing any pending one for key"""
+
+        with self.condition:
+            if key not in self.pending and len(self.pending) >= self.max_pending:
+                self.pending.popitem(last=False)
+            self.pending[key] = value
+            self.condition.notify()
+
+    def get_changes(self):
+        """Wait for and remove all pending changes"""
+
+        with self.condition:
+            while not self.pending and self.is_running():
+                self.condition.wait(timeout=1)
+
+            changes = list(self.pending.items())
+            self.pending.clear()
+
+        return changes
+
+    def refresh_events(self, event):
+        """Update the list of events that have observers"""
+
+        generation = event.get_generation()
+
+        if generation == self.generation:
+            return
+
+        self.events = set(event.list_events())
+        self.generation = generation
+
+    def run(self):
+        """Main thread"""
+
+        event = self.directory.connect("event")
+
+        while self.is_running():
+            changes = self.get_changes()
+
+            try:
+                self.refresh_events(event)
+                notifications = [
+                    [key, value] for key, value in changes if key in self.events
+                ]
+                if notifications:
+                    event.notify_many(notifications)
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.log.exception("Problem sending events")
+                self.wait(1)
+
 
 class Server(ProcessClient):
     """Cache Service"""
 
+    # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-public-methods
+
     def __init__(self, args):
         ProcessClient.__init__(self, args)
 
-        self.xmlserver = XMLRPCServer(self, callback=self.expire)
+        self.xmlserver = InstrumentedServer(self, callback=self.periodic)
         self.directory = Directory(self)
 
-        self.xmlserver.register_function(self.get_value, "get")
-        self.xmlserver.register_function(self.get_value_default, "get_or_default")
-        self.xmlserver.register_function(self.get_age, "get_age")
-        self.xmlserver.register_function(self.put_value, "put")
-        self.xmlserver.register_function(self.list)
-        self.xmlserver.register_function(self.lookup)
-        self.xmlserver.register_function(self.clear_value, "clear")
-        self.xmlserver.register_function(self.set_timeout, "set_timeout")
-        self.xmlserver.register_function(self.get_timeout, "get_timeout")
-        self.xmlserver.register_function(self.clear_timeout, "clear_timeout")
+        self.register_functions(self.xmlserver)
+
+        self.setup_cache()
 
-        self.event = self.directory.connect("event")
+    def register_functions(self, xmlserver):
+        """Register the service methods with xmlserver"""
+
+        xmlserver.register_function(self.get_value, "get")
+        xmlserver.register_function(self.get_value_default, "get_or_default")
+        xmlserver.register_function(self.get_many)
+        xmlserver.register_function(self.get_age, "get_age")
+        xmlserver.register_function(self.put_value, "put")
+        xmlserver.register_function(self.put_many)
+        xmlserver.register_function(self.merge_value, "merge")
+        xmlserver.register_function(self.get_version)
+        xmlserver.register_function(self.get_changes)
+        xmlserver.register_function(self.list)
+        xmlserver.register_function(self.lookup)
+        xmlserver.register_function(self.clear_value, "clear")
+        xmlserver.register_function(self.set_timeout, "set_timeout")
+        xmlserver.register_function(self.get_timeout, "get_timeout")
+        xmlserver.register_function(self.clear_timeout, "clear_timeout")
+
+    def setup_cache(self):
+        """Set up the cache from config. Loads the snapshot if set"""
+
+        self.snapshot_path = self.config.get_path("snapshot.path")
+        self.snapshot_rate = self.config.get_timedelta("snapshot.rate", "1m")
+        self.snapshot_rate = self.snapshot_rate.total_seconds()
+
+        self.removed_max = self.config.get_int("removed.max", 1000)
+        self.removed_retention = self.config.get_timedelta("removed.retention", "1h")
+        self.removed_retention = self.removed_retention.total_seconds()
+
+        self.snapshot_time = time.monotonic()
+        self.snapshot_version = None
+
+        self.lock = threading.RLock()
 
         self.cache = {}
         self.timestamp = {}
         self.timeouts = {}
 
+        # Versions in update order. Includes removed keys.
+
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.versions = collections.OrderedDict()
+        self.removed = collections.OrderedDict()
+
+        # Changes at or below this version are no longer all recorded
+
+        self.trimmed_version = 0
+
+        # Heap of (expire time, key), one per key with a timeout
+
+        self.expiry = []
+        self.scheduled = {}
+
+        if self.snapshot_path:
+            self.load_snapshot()
+
+        self.event = None
+
+        if self.config.get_boolean("event.enable", True):
+            self.event = EventPublisher(self)
+            self.event.start()
+
+    # Versions ###########################################################
+
+    def bump_version(self, key):
+        """Assign a new version to key"""
+
+        if self.version >= MAX_VERSION:
+            self.renumber()
+
+        self.version += 1
+        self.versions[key] = self.version
+        self.versions.move_to_end(key)
+
+    def renumber(self):
+        """Restart version numbers. Clients will see a new epoch"""
+
+        self.log.info("Renumbering versions")
+
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.trimmed_version = 0
+
+        for key in self.versions:
+            self.version += 1
+            self.versions[key] = self.version
+
+    def trim_removed(self):
+        """Forget removed keys past the retention window or count"""
+
+        cutoff = time.monotonic() - self.removed_retention
+
+        with self.lock:
+            while self.removed:
+                key, removed_time = next(iter(self.removed.items()))
+                if len(self.removed) <= self.removed_max and removed_time > cutoff:
+                    break
+                del self.removed[key]
+                self.trimmed_version = max(self.trimmed_version, self.versions.pop(key))
+
+    def get_version(self):
+        """Return the current epoch and version"""
+
+        with self.lock:
+            return {"epoch": self.epoch, "version": self.version}
+
+    def get_changes(self, version=0, epoch="", keys=None):
+        """Entries changed since version.
+
+        A different epoch (the cache restarted or was renumbered) or a
+        version older than the removed key records returns all entries
+        with full set. Returns epoch, version, full, values and removed
+        keys.
+        """
+
+        with self.lock:
+            full = (
+                epoch != self.epoch
+                or version > self.version
+                or version < self.trimmed_version
+            )
+
+            if full:
+                version = 0
+
+            if keys is not None:
+                keys = set(keys)
+
+            values = {}
+            removed = []
+
+            for key, key_version in reversed(self.versions.items()):
+                if key_version <= version:
+                    break
+                if keys is not None and key not in keys:
+                    continue
+                if key in self.removed:
+                    removed.append(key)
+                else:
+                    values[key] = self.cache[key]
+
+            return {
+                "epoch": self.epoch,
+                "version": self.version,
+                "full": full,
+                "values": values,
+                "removed": removed,
+            }
+
+    # Expiration #########################################################
+
+    def periodic(self):
+        """Run from the server loop"""
+
+        self.expire()
+        self.trim_removed()
+
+        if self.snapshot_path:
+            self.check_snapshot()
+
+    def schedule_expire(self, key):
+        """Make sure key has an entry in the expiry heap"""
+
+        if key not in self.timeouts or key not in self.timestamp:
+            return
+
+        expire_time = self.timestamp[key] + datetime.timedelta(
+            seconds=self.timeouts[key]
+        )
+
+        # Existing entries are rechecked when they come due
+
+        if key in self.scheduled and self.scheduled[key] <= expire_time:
+            return
+
+        self.scheduled[key] = expire_time
+        heapq.heappush(self.expiry, (expire_time, key))
+
     def expire(self):
         """Expire entries with a timeout"""
 
-        for key, timeout in self.timeouts.items():
-            if key in self.cache:
-                if self.get_age(key) > timeout:
+        with self.lock:
+            now = self.now()
+
+            while self.expiry and self.expiry[0][0] <= now:
+                expire_time, key = heapq.heappop(self.expiry)
+
+                if self.scheduled.get(key) != expire_time:
+                    continue
+
+                del self.scheduled[key]
+
+                if key not in self.cache or key not in self.timeouts:
+                    continue
+
+                if self.get_age(key) > self.timeouts[key]:
                     self.clear_value(key)
+                else:
+                    self.schedule_expire(key)
 
     def set_timeout(self, key, secs):
         """Set timeout for an entry"""
-    
-        self.timeouts[key] = secs
+
+        with self.lock:
+            self.timeouts[key] = secs
+            self.scheduled.pop(key, None)
+            self.schedule_expire(key)
 
     def clear_timeout(self, key):
         """Remove timeout for an entry"""
 
-        if key in self.timeouts:
-            del self.timeouts[key]
+        with self.lock:
+            if key in self.timeouts:
+                del self.timeouts[key]
+            self.scheduled.pop(key, None)
 
     def get_timeout(self, key):
         """Return the timeout for an entry"""
 
         return self.timeouts.get(key)
 
+    # Snapshots ##########################################################
+
+    def check_snapshot(self):
+        """Save a snapshot if due and something changed"""
+
+        if time.monotonic() - self.snapshot_time < self.snapshot_rate:
+            return
+
+        self.snapshot_time = time.monotonic()
+
+        if self.snapshot_version == (self.epoch, self.version):
+            return
+
+        try:
+            self.save_snapshot()
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.log.exception("Failed to save snapshot")
+
+    def save_snapshot(self):
+        """Write cache contents to snapshot.path"""
+
+        with self.lock:
+            entries = [
+                [key, self.cache[key], self.timestamp[key].timestamp(), version]
+                for key, version in self.versions.items()
+                if key not in self.removed
+            ]
+            snapshot = {
+                "epoch": self.epoch,
+                "version": self.version,
+                "entries": entries,
+                "timeouts": dict(self.timeouts),
+            }
+            snapshot_version = (self.epoch, self.version)
+
+        output = xmlrpc.client.dumps((snapshot,), allow_none=True)
+
+        path = self.snapshot_path
+        tmpname = path.with_name(f".{path.name}.tmp")
+
+        with tmpname.open("w", encoding="utf-8") as snapshot_file:
+            snapshot_file.write(output)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+
+        tmpname.replace(path)
+
+        self.snapshot_version = snapshot_version
+
+        self.log.debug("Saved snapshot: %d entries", len(entries))
+
+    def load_snapshot(self):
+        """Load cache contents from snapshot.path"""
+
+        path = self.snapshot_path
+
+        if not path.exists():
+            return
+
+        try:
+            params, _method = xmlrpc.client.loads(path.read_text(encoding="utf-8"))
+            snapshot = params[0]
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.log.exception("Failed to load snapshot %s", path)
+            return
+
+        # Keep our new epoch. Changes made after the snapshot was saved
+        # are lost, so clients need a full refresh.
+
+        self.version = snapshot["version"]
+        self.timeouts = snapshot["timeouts"]
+
+        for key, value, timestamp, version in snapshot["entries"]:
+            self.cache[key] = value
+            self.timestamp[key] = datetime.datetime.fromtimestamp(
+                timestamp, datetime.timezone.utc
+            )
+            self.versions[key] = version
+            self.schedule_expire(key)
+
+        self.snapshot_version = (self.epoch, self.version)
+
+        self.log.info("Loaded %d entries from %s", len(self.cache), path)
+
+    # Entries ############################################################
+
     def put_value(self, key, value):
         """Store entry into cache"""
 
         #self.log.debug("put %s %s", key, value)
-        self.cache[key] = value
-        self.timestamp[key] = self.now()
-        #self.event.notify(key, value)
+        with self.lock:
+            self.cache[key] = value
+            self.timestamp[key] = self.now()
+            self.removed.pop(key, None)
+            self.bump_version(key)
+            self.schedule_expire(key)
+        if self.event:
+            self.event.put(key, value)
+        return True
+
+    def put_many(self, values):
+        """Store multiple entries from a dict"""
+
+        for key, value in values.items():
+            self.put_value(key, value)
+
         return True
 
+    def merge_value(self, key, value):
+        """Merge dict value into an existing entry.
+
+        Returns False if there is no dict entry to merge into.
+        """
+
+        # Stored values can be shared with the snapshot and event
+        # threads, so build a merged copy rather than changing them
+
+        def merge(dest, src):
+            result = dict(dest)
+            for name, item in src.items():
+                if isinstance(item, dict) and isinstance(dest.get(name), dict):
+                    result[name] = merge(dest[name], item)
+                else:
+                    result[name] = item
+            return result
+
+        with self.lock:
+            current = self.cache.get(key)
+            if not isinstance(current, dict):
+                return False
+            return self.put_value(key, merge(current, value))
+
     def get_value(self, key):
         """Get an entry from the cache"""
 
@@ -115,6 +537,12 @@ class Server(ProcessClient):
 
         return default
 
+    def get_many(self, keys):
+        """Get entries for keys. Missing keys are left out"""
+
+        with self.lock:
+            return {key: self.cache[key] for key in keys if key in self.cache}
+
     def get_age(self, key):
         """Get the age of an entry"""
         age = self.now() - self.timestamp[key]
@@ -123,9 +551,13 @@ class Server(ProcessClient):
     def clear_value(self, key):
         """Remove an entry from the cache"""
 
-        if key in self.cache:
-            del self.cache[key]
-            del self.timestamp[key]
+        with self.lock:
+            if key in self.cache:
+                del self.cache[key]
+                del self.timestamp[key]
+                self.removed[key] = time.monotonic()
+                self.removed.move_to_end(key)
+                self.bump_version(key)
 
         return True
 
@@ -142,7 +574,14 @@ class Server(ProcessClient):
     def main(self):
         """Main application"""
 
-        self.xmlserver.main()
+        try:
+            self.xmlserver.main()
+        finally:
+            if self.snapshot_path:
+                try:
+                    self.save_snapshot()
+                except OSError:
+                    self.log.exception("Failed to save snapshot")
 
 
 if __name__ == "__main__":
@@ -20,12 +20,28 @@
 #               Update for transport 3 / python 3
 #               Only log no observers in debug
 #
+#   2026-10-16  Todd Valentic
+#               Fan out to each observer with its own queue and worker
+#                   thread (Observer) so a slow observer does not hold
+#                   up the others. The client proxy is reused.
+#               Pending events with the same name are coalesced, only
+#                   the latest arguments are sent. The queue is bounded,
+#                   the oldest events are dropped when full.
+#               Deliver pending events in batches with system.multicall
+#                   if the observer supports it.
+#               Add notify_many and get_stats
+#               Add get_generation, which changes whenever the
+#                   registered events change
+#
 ##########################################################################
 
+import collections
 import pathlib
-import queue
 import socket
 import sys
+import threading
+import time
+import uuid
 import xmlrpc.client
 
 from threading import Thread
@@ -39,37 +55,179 @@ socket.setdefaulttimeout(5)
 # pylint: disable=bare-except
 
 
-class WorkerThread(Thread, AccessMixin):
-    """Worker thread to senf event notifications"""
+class Observer(Thread, AccessMixin):
+    """Deliver events to a single observer"""
+
+    # pylint: disable=too-many-instance-attributes
 
-    def __init__(self, parent):
-        Thread.__init__(self)
+    def __init__(self, parent, url, method):
+        Thread.__init__(self, daemon=True)
         AccessMixin.__init__(self, parent)
 
-        self.queue = self.parent.queue
+        self.url = url
+        self.method = method
+
+        self.max_pending = parent.max_pending
+        self.batch_size = parent.batch_size
+        self.backoff_max = parent.backoff_max
+
+        self.pending = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.stopped = False
+
+        self.client = None
+        self.multicall = True
+        self.backoff = 0
+
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.latency_total = 0
+        self.latency_max = 0
+
+    def put(self, event, args):
+        """Queue an event, replacing any pending one with the same name"""
+
+        with self.condition:
+            if event in self.pending:
+                # Keep the original position and queue time
+                self.pending[event] = (args, self.pending[event][1])
+                self.coalesced += 1
+                return
+
+            if len(self.pending) >= self.max_pending:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+
+            self.pending[event] = (args, time.monotonic())
+            self.condition.notify()
+
+    def stop_worker(self):
+        """Stop the worker thread"""
+
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def get_batch(self):
+        """Wait for and remove the next batch of pending events"""
+
+        with self.condition:
+            while not self.pending and not self.stopped and self.is_running():
+                self.condition.wait(timeout=1)
+
+            batch = []
+
+            while self.pending and len(batch) < self.batch_size:
+                batch.append(self.pending.popitem(last=False))
+
+        return batch
+
+    def get_client(self):
+        """Return the (reused) client proxy"""
+
+        if self.client is None:
+            self.client = xmlrpc.client.ServerProxy(self.url, allow_none=True)
+
+        return self.client
+
+    def send(self, batch):
+        """Send a batch of events"""
+
+        client = self.get_client()
+
+        if self.multicall and len(batch) > 1:
+            multicall = xmlrpc.client.MultiCall(client)
+            for _event, (args, _queued) in batch:
+                getattr(multicall, self.method)(*args)
+            try:
+                results = multicall()
+            except xmlrpc.client.Fault as e:
+                if "system.multicall" not in e.faultString:
+                    raise
+                self.log.info("%s does not support multicall", self.url)
+                self.multicall = False
+            else:
+                for index, (event, _args) in enumerate(batch):
+                    try:
+                        results[index]  # pylint: disable=pointless-statement
+                    except xmlrpc.client.Fault as e:
+                        self.log.error("Problem notifying %s: %s", event, e)
+                        self.errors += 1
+                return
+
+        for _event, (args, _queued) in batch:
+            getattr(client, self.method)(*args)
+
+    def deliver(self, batch):
+        """Send a batch, track stats"""
+
+        try:
+            self.send(batch)
+        except:
+            self.log.exception(
+                "Problem notifying %s %s for %s",
+                self.url,
+                self.method,
+                [event for event, _ in batch],
+            )
+            self.client = None
+            self.errors += 1
+            self.dropped += len(batch)
+            self.backoff = min(max(self.backoff * 2, 1), self.backoff_max)
+            return
+
+        self.backoff = 0
+
+        now = time.monotonic()
+
+        for _event, (_args, queued) in batch:
+            latency = now - queued
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+        self.sent += len(batch)
 
     def run(self):
         """Main thread"""
 
-        self.log.info("Worker thread starting")
+        self.log.info("Observer %s %s starting", self.url, self.method)
 
-        while self.is_running():
-            try:
-                event, signature, args = self.queue.get(timeout=1)
-            except queue.Empty:
-                continue
+        while self.is_running() and not self.stopped:
+            if self.backoff:
+                # Let events coalesce while the observer is down
+                self.wait(self.backoff)
 
-            url, method = signature
+            batch = self.get_batch()
 
-            try:
-                client = xmlrpc.client.ServerProxy(url)
-                getattr(client, method)(*args)
-            except:
-                self.log.exception(
-                    "Problem notifying %s for %s (%s)", signature, event, args
-                )
+            if batch:
+                self.deliver(batch)
+
+        self.log.info("Observer %s %s exiting", self.url, self.method)
+
+    def get_stats(self):
+        """Return delivery statistics"""
 
-        self.log.info("Worker thread exiting")
+        with self.condition:
+            pending = len(self.pending)
+
+        if self.sent:
+            latency_avg = self.latency_total / self.sent
+        else:
+            latency_avg = 0
+
+        return {
+            "url": self.url,
+            "method": self.method,
+            "pending": pending,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "latency_avg": latency_avg,
+            "latency_max": self.latency_max,
+        }
 
 
 class Server(ProcessClient):
@@ -83,6 +241,9 @@ class Server(ProcessClient):
         self.xmlserver.register_function(self.register)
         self.xmlserver.register_function(self.unregister)
         self.xmlserver.register_function(self.notify)
+        self.xmlserver.register_function(self.notify_many)
+        self.xmlserver.register_function(self.get_stats)
+        self.xmlserver.register_function(self.get_generation)
 
         self.xmlserver.register_function(self.list_observerss)
         self.xmlserver.register_function(self.list_events)
@@ -92,13 +253,19 @@ class Server(ProcessClient):
 
         self.xmlserver.register_function(self.testport)
 
+        self.max_pending = self.config.get_int("observer.max_pending", 1000)
+        self.batch_size = self.config.get_int("observer.batch_size", 50)
+        self.backoff_max = self.config.get_timedelta("observer.backoff.max", "1m")
+        self.backoff_max = self.backoff_max.total_seconds()
+
         self.save_cache = pathlib.Path("event")
 
-        self.load_events()
+        self.observers = {}
+        self.lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.generation = 0
 
-        self.queue = queue.Queue()
-        self.thread = WorkerThread(self)
-        self.thread.start()
+        self.load_events()
 
     def load_events(self):
         """Load event list cache"""
@@ -130,6 +297,8 @@ class Server(ProcessClient):
         self.log.info("Removing event: %s", event)
 
         del self.events[event]
+        self.generation += 1
+        self.prune_observers()
         self.save_events()
 
     def register(self, event, url, method):
@@ -147,6 +316,23 @@ class Server(ProcessClient):
         signature = (url, method)
         if signature not in self.events[event]:
             self.events[event].append(signature)
+            self.generation += 1
+
+        with self.lock:
+            if signature not in self.observers:
+                observer = Observer(self, url, method)
+                observer.start()
+                self.observers[signature] = observer
+
+    def prune_observers(self):
+        """Stop observers that are not registered for any events"""
+
+        active = {sig for signatures in self.events.values() for sig in signatures}
+
+        with self.lock:
+            for signature in list(self.observers):
+                if signature not in active:
+                    self.observers.pop(signature).stop_worker()
 
     def unregister(self, event, url, method):
         """Unsubscribe from event"""
@@ -156,12 +342,14 @@ class Server(ProcessClient):
         if event in self.events:
             try:
                 self.events[event].remove(signature)
+                self.generation += 1
             except:
                 pass
 
             if self.events[event] == []:
                 del self.events[event]
 
+        self.prune_observers()
         self.save_events()
         return 1
 
@@ -183,13 +371,35 @@ class Server(ProcessClient):
             self.log.debug("  - no observers registered")
             return 1
 
-        self.log.info("Sending event %s", event)
+        self.log.debug("Sending event %s", event)
+
+        with self.lock:
+            for signature in self.events[event]:
+                self.observers[signature].put(event, args)
+
+        return 1
+
+    def notify_many(self, notifications):
+        """Send notifications, each a list of [event, args...]"""
 
-        for signature in self.events[event]:
-            self.queue.put((event, signature, args))
+        for event, *args in notifications:
+            self.notify(event, *args)
 
         return 1
 
+    def get_generation(self):
+        """Return a value that changes when the registered events change"""
+
+        return f"{self.epoch}.{self.generation}"
+
+    def get_stats(self):
+        """Delivery statistics for each observer"""
+
+        with self.lock:
+            observers = list(self.observers.values())
+
+        return [observer.get_stats() for observer in observers]
+
     def testport(self, msg):
         """Test receipt of event notification"""
 
@@ -203,7 +413,12 @@ class Server(ProcessClient):
 
         # Need to wait for worker threads
 
-        self.thread.join()
+        with self.lock:
+            observers = list(self.observers.values())
+
+        for observer in observers:
+            observer.stop_worker()
+            observer.join()
 
         self.log.info("Finished")
 
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import logging
+import xmlrpc.client
+
+from server import Observer
+
+NO_MULTICALL = 'method "system.multicall" is not supported'
+
+
+class Parent:
+    """Minimal event server for an Observer"""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, max_pending=1000, batch_size=50):
+        self.config = None
+        self.log = logging.getLogger("test_server")
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.backoff_max = 60
+
+    def abort(self, *_args):
+        """Not used"""
+
+    exit = stop = wait = now = abort
+
+    def is_running(self):
+        """Always running"""
+        return True
+
+    def is_stopped(self):
+        """Never stopped"""
+        return False
+
+
+class StubSystem:
+    """system.* methods of StubProxy"""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def multicall(self, calls):
+        """Run calls, faults are returned in place of the result"""
+
+        if not self.proxy.multicall:
+            raise xmlrpc.client.Fault(1, f"<class 'Exception'>:{NO_MULTICALL}")
+
+        self.proxy.multicalls += 1
+        results = []
+
+        for call in calls:
+            try:
+                results.append([self.proxy.call(call["methodName"], call["params"])])
+            except xmlrpc.client.Fault as e:
+                results.append({"faultCode": e.faultCode, "faultString": e.faultString})
+
+        return results
+
+
+class StubProxy:
+    """Records calls instead of sending them"""
+
+    def __init__(self, multicall=True, fail=()):
+        self.multicall = multicall
+        self.fail = fail
+        self.multicalls = 0
+        self.calls = []
+        self.system = StubSystem(self)
+
+    def __getattr__(self, method):
+        return lambda *args: self.call(method, args)
+
+    def call(self, method, args):
+        """Record a call, failing for args in self.fail"""
+
+        if args[0] in self.fail:
+            raise xmlrpc.client.Fault(2, f"{args[0]} failed")
+
+        self.calls.append((method, tuple(args)))
+        return 1
+
+
+def make_observer(proxy, **kw):
+    """Observer that sends to proxy"""
+
+    observer = Observer(Parent(**kw), "http://localhost:1", "update")
+    observer.client = proxy
+
+    return observer
+
+
+def test_coalescing():
+    """Pending events with the same name only send the latest args"""
+
+    proxy = StubProxy()
+    observer = make_observer(proxy)
+
+    observer.put("a", ("a", 1))
+    observer.put("b", ("b", 1))
+
+    queued = observer.pending["a"][1]
+
+    observer.put("a", ("a", 2))
+
+    assert list(observer.pending) == ["a", "b"]
+    assert observer.pending["a"] == (("a", 2), queued)
+    assert observer.coalesced == 1
+
+    observer.deliver(observer.get_batch())
+
+    assert proxy.calls == [("update", ("a", 2)), ("update", ("b", 1))]
+    assert observer.sent == 2
+    assert not observer.pending
+
+    # Once sent, the same event is queued again
+
+    observer.put("a", ("a", 3))
+
+    assert observer.coalesced == 1
+    assert list(observer.pending) == ["a"]
+
+
+def test_max_pending():
+    """The oldest events are dropped when the queue is full"""
+
+    observer = make_observer(StubProxy(), max_pending=3)
+
+    for index in range(5):
+        observer.put(f"e{index}", (index,))
+
+    assert list(observer.pending) == ["e2", "e3", "e4"]
+    assert observer.dropped == 2
+
+    # Replacing a pending event does not need room
+
+    observer.put("e2", (20,))
+
+    assert list(observer.pending) == ["e2", "e3", "e4"]
+    assert observer.dropped == 2
+    assert observer.get_stats()["pending"] == 3
+
+
+def test_multicall():
+    """Batches go out in one system.multicall, faults are per event"""
+
+    proxy = StubProxy(fail=["b"])
+    observer = make_observer(proxy, batch_size=2)
+
+    for event in "abc":
+        observer.put(event, (event,))
+
+    observer.deliver(observer.get_batch())
+
+    assert proxy.multicalls == 1
+    assert proxy.calls == [("update", ("a",))]
+    assert observer.errors == 1
+    assert list(observer.pending) == ["c"]
+
+    # A single event is sent directly
+
+    observer.deliver(observer.get_batch())
+
+    assert proxy.multicalls == 1
+    assert proxy.calls[-1] == ("update", ("c",))
+
+
+def test_multicall_fallback():
+    """Observers without system.multicall get one call per event"""
+
+    proxy = StubProxy(multicall=False)
+    observer = make_observer(proxy)
+
+    for event in "ab":
+        observer.put(event, (event,))
+
+    observer.deliver(observer.get_batch())
+
+    assert not observer.multicall
+    assert proxy.calls == [("update", ("a",)), ("update", ("b",))]
+    assert observer.sent == 2
+    assert observer.errors == 0
+
+    # Not tried again
+
+    proxy.multicall = True
+
+    for event in "cd":
+        observer.put(event, (event,))
+
+    observer.deliver(observer.get_batch())
+
+    assert proxy.multicalls == 0
+    assert len(proxy.calls) == 4
+
+
+def test_delivery_error():
+    """A failed batch is dropped, the client reset and backoff started"""
+
+    proxy = StubProxy(multicall=False, fail=["a"])
+    observer = make_observer(proxy)
+
+    observer.put("a", ("a",))
+    observer.deliver(observer.get_batch())
+
+    assert observer.client is None
+    assert observer.dropped == 1
+    assert observer.errors == 1
+    assert observer.backoff == 1
@@ -16,6 +16,11 @@
 #   2023-08-28  Todd Valentic
 #               Convert to use ModbusMeter base class
 #
+#   2026-10-16  Todd Valentic
+#               Remove access codes from kwargs before they are passed
+#                   on to the modbus client
+#               Replace decode() with make_unpacker()
+#
 ##########################################################################
 
 import asyncio
@@ -24,7 +29,7 @@ import datetime
 from dataclasses import dataclass
 from functools import partial
 
-from modbus_meter import ModbusMeter
+from modbus_meter import ModbusMeter, unpack_struct, unpack_string
 from genset_regmap import GensetRegisters
 from bitlib import set_bit, clear_bit, get_bit, get_normalized_bit, bcd_decode
 
@@ -47,10 +52,10 @@ class GensetMeter(ModbusMeter):
 
     def __init__(self, filename, host, **kwargs):
         registers = GensetRegisters(filename)
-        ModbusMeter.__init__(self, registers, host, **kwargs)
         self.access_code = int(kwargs.pop("access_code", 0))
         self.user_code = int(kwargs.pop("user_code", 0)) 
         self.pass_code = int(kwargs.pop("pass_code", self.access_code))
+        ModbusMeter.__init__(self, registers, host, **kwargs)
 
         cmdreg = partial(self.write_register_addr, MODBUSCMD) 
 
@@ -94,43 +99,45 @@ class GensetMeter(ModbusMeter):
         if rr.isError():
             raise IOError(f"Writing access code: {rr}")
 
-    def decode(self, decoder, reg):
-        """Decode raw register"""
+    def make_unpacker(self, reg):
+        """Return unpacker for raw register"""
+
+        order = self.byteorder
 
         if reg.type.startswith("Binary") and reg.words == 1:
-            value = decoder.decode_16bit_uint()
+            unpacker = unpack_struct(order + "H")
         elif reg.type.startswith("Binary") and reg.words == 2:
-            value = decoder.decode_32bit_uint()
+            unpacker = unpack_struct(order + "I")
         elif reg.type.startswith("Integer") and reg.words == 1:
-            value = decoder.decode_16bit_int()
+            unpacker = unpack_struct(order + "h")
         elif reg.type.startswith("Unsigned") and reg.words == 1:
-            value = decoder.decode_16bit_uint()
+            unpacker = unpack_struct(order + "H")
         elif reg.type.startswith("Unsigned") and reg.words == 2:
-            value = decoder.decode_32bit_uint()
+            unpacker = unpack_struct(order + "I")
         elif reg.type.startswith("Integer") and reg.words == 2:
-            value = decoder.decode_32bit_int()
+            unpacker = unpack_struct(order + "i")
         elif reg.type.startswith("List") and reg.words == 1:
-            value = decoder.decode_16bit_uint()
+            unpacker = unpack_struct(order + "H")
         elif reg.type.startswith("List") and reg.words == 2:
-            value = decoder.decode_32bit_uint()
+            unpacker = unpack_struct(order + "I")
         elif reg.type.startswith("String"):
-            value = decoder.decode_string(reg.words * 2).decode("utf-8").rstrip("\x00")
+            unpacker = unpack_string(reg.words * 2)
         elif reg.type.startswith("Timer"):
-            value = decoder.decode_64bit_int()
+            unpacker = unpack_struct(order + "q")
         elif reg.type.startswith("Char"):
-            value = decoder.decode_string(1).decode("utf-8")[0].rstrip("\x00")
+            unpacker = unpack_string(1)
         elif reg.type == 'Date':
-            value = decoder.decode_32bit_uint()
+            unpacker = unpack_struct(order + "I")
             #b = bcd_decode(decoder.decode_32bit_uint().to_bytes(4))
             #value = datetime.date(2000+b[2], b[1], b[0])
         elif reg.type == 'Time':
-            value = decoder.decode_32bit_uint()
+            unpacker = unpack_struct(order + "I")
             #b = bcd_decode(decoder.decode_32bit_uint().to_bytes(4))
             #value = datetime.time(b[0], b[1], b[2])
         else:
             raise ValueError(f"Unknown type: {reg.type}")
 
-        return value
+        return unpacker
 
     async def get_feeder_breaker(self, feeder_name):
         """Get feeder breaker state"""
@@ -19,6 +19,9 @@
 #   2021-06-29  Todd Valentic
 #               Initial implementation.
 #
+#   2026-10-16  Todd Valentic
+#               Fetch all sources with one get_many call
+#
 ##########################################################################
 
 import sys
@@ -45,16 +48,15 @@ class Server(ProcessClient):
     def best(self):
         """Return the best estimage from different sources"""
 
-        cache_entries = self.cache.list()
+        cache_entries = self.cache.get_many(self.sources)
 
-        entry = None
         result = None
 
         for source in self.sources:
             if source not in cache_entries:
                 continue
 
-            entry = self.cache.get(source)
+            entry = cache_entries[source]
 
             if source == "gps" and entry["mode"] < 2:
                 # no position fix
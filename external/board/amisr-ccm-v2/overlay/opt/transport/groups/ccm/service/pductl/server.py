@@ -37,6 +37,9 @@
 #   2023-10-12  Todd Valentic
 #               Add local caching
 #
+#   2026-10-16  Todd Valentic
+#               Time RPC calls (get_stats)
+#
 ##########################################################################
 
 import functools
@@ -45,9 +48,9 @@ import time
 
 from datatransport import ProcessClient
 from datatransport import Directory
-from datatransport import XMLRPCServer
 from datatransport import ConfigComponent
 
+from instrument import InstrumentedServer
 from state_cache import StateCache
 
 # pylint: disable=bare-except
@@ -297,7 +300,7 @@ class Server(ProcessClient):
     def __init__(self, args):
         ProcessClient.__init__(self, args)
 
-        self.xmlserver = XMLRPCServer(self, callback=self.idle)
+        self.xmlserver = InstrumentedServer(self, callback=self.idle)
         self.directory = Directory(self)
         self.service_name = self.config.get("service.name")
 
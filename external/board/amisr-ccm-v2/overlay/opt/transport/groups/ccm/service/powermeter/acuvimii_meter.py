@@ -13,9 +13,12 @@
 #   2023-08-28  Todd Valentic
 #               Convert to use ModbusMeter base class
 #
+#   2026-10-16  Todd Valentic
+#               Replace decode() with make_unpacker()
+#
 ##########################################################################
 
-from modbus_meter import ModbusMeter
+from modbus_meter import ModbusMeter, unpack_struct
 from acuvimii_regmap import AcuvimIIRegisters
 
 
@@ -28,18 +31,20 @@ class AcuvimII(ModbusMeter):
 
         self.add_control("pm_reset", self.write_register_addr, 0x1021, 0xA)
 
-    def decode(self, decoder, reg):
-        """Decode raw register"""
+    def make_unpacker(self, reg):
+        """Return unpacker for raw register"""
+
+        order = self.byteorder
 
         if reg.type == "word":
-            value = decoder.decode_16bit_uint()
+            unpacker = unpack_struct(order + "H")
         elif reg.type == "int":
-            value = decoder.decode_16bit_int()
+            unpacker = unpack_struct(order + "h")
         elif reg.type == "dword":
-            value = decoder.decode_32bit_uint()
+            unpacker = unpack_struct(order + "I")
         elif reg.type == "float":
-            value = decoder.decode_32bit_float()
+            unpacker = unpack_struct(order + "f")
         else:
             raise ValueError(f"Unknown type: {reg.type}")
 
-        return value
+        return unpacker
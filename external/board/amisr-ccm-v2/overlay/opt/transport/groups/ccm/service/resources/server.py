@@ -25,6 +25,9 @@
 #   2023-06-05  Todd Valentic
 #               Updated for transport3 / python3
 #
+#   2026-10-16  Todd Valentic
+#               Time RPC calls (get_stats)
+#
 ##########################################################################
 
 import functools
@@ -33,12 +36,13 @@ import sys
 import threading
 
 from datatransport import ProcessClient
-from datatransport import XMLRPCServer
 from datatransport import Directory
 from datatransport import AccessMixin
 from datatransport import ConfigComponent
 from datatransport.utilities import PatternTemplate
 
+from instrument import InstrumentedServer
+
 # pylint: disable=bare-except
 
 
@@ -253,7 +257,7 @@ class ResourceMonitor(ProcessClient):
         pollrate = self.config.get_rate("pollrate", 10)
         self.reconcile_lock = threading.Lock()
 
-        self.xmlserver = XMLRPCServer(self, callback=self.reconcile, timeout=pollrate)
+        self.xmlserver = InstrumentedServer(self, callback=self.reconcile, timeout=pollrate)
         self.connect = Directory(self)
 
         self.xmlserver.register_function(self.status)
@@ -13,9 +13,12 @@
 #   2023-08-25  Todd Valentic
 #               Convert to use ModbusMeter
 #
+#   2026-10-16  Todd Valentic
+#               Replace decode() with make_unpacker()
+#
 ##########################################################################
 
-from modbus_meter import ModbusMeter
+from modbus_meter import ModbusMeter, unpack_struct, unpack_string
 from victron_regmap import VictronRegisters
 
 
@@ -26,20 +29,22 @@ class Victron(ModbusMeter):
         registers = VictronRegisters(filename)
         ModbusMeter.__init__(self, registers, host, unit=unit, **kwargs)
 
-    def decode(self, decoder, reg):
-        """Decode raw register"""
+    def make_unpacker(self, reg):
+        """Return unpacker for raw register"""
+
+        order = self.byteorder
 
         if reg.type.startswith("string"):
-            value = str(decoder.decode_string(reg.words * 2), "utf-8")
+            unpacker = unpack_string(reg.words * 2, strip=None)
         elif reg.type == "uint16":
-            value = decoder.decode_16bit_uint()
+            unpacker = unpack_struct(order + "H")
         elif reg.type == "int16":
-            value = decoder.decode_16bit_int()
+            unpacker = unpack_struct(order + "h")
         elif reg.type == "uint32":
-            value = decoder.decode_32bit_uint()
+            unpacker = unpack_struct(order + "I")
         elif reg.type == "int32":
-            value = decoder.decode_32bit_int()
+            unpacker = unpack_struct(order + "i")
         else:
             raise ValueError(f"Unknown type: {reg.type}")
 
-        return value
+        return unpacker
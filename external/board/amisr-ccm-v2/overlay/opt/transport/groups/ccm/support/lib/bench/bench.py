@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""Offline Benchmarks"""
+
+##########################################################################
+#
+#   Offline benchmarks
+#
+#   Measures throughput and latency of the main processing paths
+#   against local stand-ins, so no hardware or running services are
+#   needed:
+#
+#       meters      poll the genset, Acuvim II and Victron meters
+#                   against a simulated modbus server (modbus_sim),
+#                   reading the groups set in the service configs
+#       schedule    schedule match and next transition
+#       postfiles   find, compress and post files (post is a no-op)
+#       output      OutputWriter appends and OutputCompressor
+#       cache       cache service get, get_many and CacheMirror
+#       location    location service and SolarCache lookups
+#       gps         gpsd reports from gps/fake.py (needs gpsd and a
+#                   NMEA log given with --gps-log)
+#
+#   Each benchmark records into instrument.Stats. Benchmarks whose
+#   modules cannot be imported are skipped. A benchmark that fails is
+#   reported and the rest still run.
+#
+#   Usage: bench.py [-n COUNT] [--json FILE] [benchmark ...]
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation
+#
+##########################################################################
+
+import argparse
+import asyncio
+import datetime
+import importlib
+import json
+import logging
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import xmlrpc.client
+
+HERE = pathlib.Path(__file__).resolve().parent
+LIBDIR = HERE.parent
+GROUPDIR = LIBDIR.parent.parent
+OPTDIR = GROUPDIR.parents[2]
+
+sys.path[:0] = [
+    str(HERE),
+    str(LIBDIR),
+    str(GROUPDIR / "service" / "genset"),
+    str(GROUPDIR / "service" / "powermeter"),
+    str(GROUPDIR / "service" / "victron"),
+    str(GROUPDIR / "monitor" / "relay"),
+]
+
+# pylint: disable=wrong-import-position
+
+from instrument import Stats
+from fake_services import FakeCache, FakeLocation
+
+utc = datetime.timezone.utc
+
+log = logging.getLogger("bench")
+
+SERVICEDIR = GROUPDIR / "service"
+
+METERS = [
+    (
+        "genset",
+        "genset_meter.MGM",
+        SERVICEDIR / "genset" / "20231019_G1.TXT",
+        {"access_code": 2747},
+    ),
+    (
+        "powermeter",
+        "acuvimii_meter.AcuvimII",
+        SERVICEDIR / "powermeter" / "rmap.json",
+        {},
+    ),
+    (
+        "victron",
+        "victron_meter.Victron",
+        SERVICEDIR / "victron" / "Field_list-Table_1.csv",
+        {},
+    ),
+]
+
+SCHEDULES = [
+    LIBDIR / "tests" / "demo.conf",
+    LIBDIR / "tests" / "year.conf",
+]
+
+
+class SkipBenchmark(Exception):
+    """Benchmark cannot run here"""
+
+
+def import_module(name):
+    """Import module or skip the benchmark"""
+
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise SkipBenchmark(f"{name}: {e}") from e
+
+
+#-------------------------------------------------------------------------
+# Meters
+#-------------------------------------------------------------------------
+
+
+def configured_groups(name):
+    """Groups read by the service, from its config file"""
+
+    sapphire_config = import_module("sapphire_config")
+
+    config = sapphire_config.Parser()
+    config.read(SERVICEDIR / name / f"{name}.conf")
+
+    return config["server"].get_list("meter.*.groups")
+
+
+async def poll_meter(args, stats, name, type_name, registermap, extra):
+    """Poll all groups in a meter register map"""
+
+    modbus_sim = import_module("modbus_sim")
+
+    module_name, class_name = type_name.rsplit(".", 1)
+    factory = getattr(import_module(module_name), class_name)
+
+    sim = modbus_sim.ModbusSimulator(latency=args.latency)
+    port = await sim.start()
+
+    meter = factory(
+        registermap,
+        "127.0.0.1",
+        port=port,
+        max_gap=args.max_gap,
+        **extra,
+    )
+
+    sim.load(meter.registers)
+
+    if args.all_groups:
+        groups = meter.list_groups()
+    else:
+        groups = configured_groups(name)
+
+    try:
+        for _ in range(args.count):
+            with stats.timer(f"meter.{name}"):
+                await meter.read_groups(groups)
+    finally:
+        meter.close()
+        await sim.stop()
+
+    log.info(
+        "%s: %d groups, %d modbus requests per poll",
+        name,
+        len(groups),
+        sim.requests // max(args.count, 1),
+    )
+
+
+def bench_meters(args, stats):
+    """Meter polling against the modbus simulator"""
+
+    skipped = []
+    failed = []
+
+    for name, type_name, registermap, extra in METERS:
+        try:
+            asyncio.run(poll_meter(args, stats, name, type_name, registermap, extra))
+        except SkipBenchmark as e:
+            log.warning("Skipping meter %s: %s", name, e)
+            skipped.append(f"{name} ({e})")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            log.info("Meter %s failed", name, exc_info=True)
+            failed.append(f"{name} ({type(e).__name__}: {e})")
+
+    if failed:
+        raise RuntimeError(", ".join(failed))
+
+    if len(skipped) == len(METERS):
+        raise SkipBenchmark(", ".join(skipped))
+
+
+#-------------------------------------------------------------------------
+# Schedules
+#-------------------------------------------------------------------------
+
+
+def bench_schedule(args, stats):
+    """Schedule lookups spread across a year"""
+
+    schedule = import_module("schedule")
+
+    manager = schedule.ScheduleManager(log)
+    manager.load([str(filename) for filename in SCHEDULES])
+
+    start = datetime.datetime(2026, 1, 1, tzinfo=utc)
+    step = datetime.timedelta(days=365) / max(args.count, 1)
+
+    for index in range(args.count):
+        now = start + index * step
+
+        with stats.timer("schedule.match"):
+            manager.match(now)
+
+        with stats.timer("schedule.next_transition"):
+            manager.next_transition(now)
+
+
+#-------------------------------------------------------------------------
+# Post files
+#-------------------------------------------------------------------------
+
+
+class BenchParent:
+    """Minimal parent for config components"""
+
+    def __init__(self, config):
+        self.config = config
+        self.log = log
+
+    def abort(self, *args):
+        """Abort"""
+
+        raise RuntimeError(*args)
+
+    def exit(self, *args):
+        """Exit"""
+
+        raise RuntimeError(*args)
+
+    def stop(self):
+        """Stop"""
+
+    def wait(self, _duration, **_kw):
+        """No delays in benchmarks"""
+
+        return True
+
+    def now(self):
+        """Current time"""
+
+        return datetime.datetime.now(utc)
+
+    def is_running(self):
+        """Always running"""
+
+        return True
+
+    def is_stopped(self):
+        """Never stopped"""
+
+        return False
+
+
+def make_files(path, count, size):
+    """Create timestamped data files"""
+
+    path.mkdir(parents=True, exist_ok=True)
+
+    start = datetime.datetime(2026, 1, 1)
+    line = b"0123456789 abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ\n"
+    data = line * (size // len(line) + 1)
+
+    for index in range(count):
+        timestamp = start + datetime.timedelta(minutes=index)
+        filename = path / timestamp.strftime("data-%Y%m%d-%H%M%S.dat")
+        filename.write_bytes(data[:size])
+
+
+def bench_postfiles(args, stats):
+    """File group scan, compress and post"""
+
+    postfiles = import_module("postfiles")
+    sapphire_config = import_module("sapphire_config")
+
+    class BenchFileGroup(postfiles.FileGroup):
+        """File group that records posts instead of sending them"""
+
+        def post(self, pathname):
+            """Time a post without sending"""
+
+            with stats.timer("postfiles.post"):
+                os.path.getsize(pathname)
+
+    olddir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+
+        try:
+            for compress in (False, True):
+                name = "compress" if compress else "plain"
+                datadir = pathlib.Path(tmpdir, name)
+                make_files(datadir, args.files, args.file_size)
+
+                config = sapphire_config.Parser()
+                config.add_section("postfiles")
+                section = config["postfiles"]
+                section["station"] = "bench"
+                section[f"filegroup.{name}.start.path"] = str(datadir)
+                section[f"filegroup.{name}.compress"] = str(compress)
+                section[f"filegroup.{name}.post.newsgroup.template"] = "bench"
+
+                group = BenchFileGroup(name, section, BenchParent(section))
+
+                with stats.timer(f"postfiles.{name}.initial"):
+                    group.process()
+
+                for _ in range(args.count):
+                    with stats.timer(f"postfiles.{name}.rescan"):
+                        group.process()
+        finally:
+            os.chdir(olddir)
+
+
+#-------------------------------------------------------------------------
+# Output files
+#-------------------------------------------------------------------------
+
+
+def write_record(output, timestamp, data):
+    """Record format used by the benchmark"""
+
+    output.write(f"{timestamp.timestamp():.3f} ".encode() + data + b"\n")
+
+
+def bench_output(args, stats):
+    """Data monitor output writing and compression"""
+
+    datawriter = import_module("datawriter")
+
+    record = b"x" * args.record_size
+    start = datetime.datetime(2026, 1, 1, tzinfo=utc)
+
+    for codec in datawriter.CODECS:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outputdir = pathlib.Path(tmpdir, "output")
+            outputdir.mkdir()
+
+            compressor = datawriter.OutputCompressor(log, outputdir, codec=codec)
+            writer = datawriter.OutputWriter(
+                log, write_record, compressor.add, sync_records=args.sync_records
+            )
+
+            for index in range(args.count * 10):
+                timestamp = start + datetime.timedelta(seconds=index)
+                filename = pathlib.Path(tmpdir, f"{index // args.records_per_file}.dat")
+
+                with stats.timer("output.append"):
+                    writer.append(filename, timestamp, record)
+
+                if compressor.pending:
+                    with stats.timer(f"output.compress.{codec}"):
+                        compressor.process()
+
+            writer.close()
+            compressor.stop()
+
+
+#-------------------------------------------------------------------------
+# Cache service
+#-------------------------------------------------------------------------
+
+
+def bench_cache(args, stats):
+    """Cache service access patterns"""
+
+    cache_mirror = import_module("cache_mirror")
+
+    try:
+        service = FakeCache().start()
+    except ImportError as e:
+        raise SkipBenchmark(f"cache service: {e}") from e
+
+    try:
+        cache = xmlrpc.client.ServerProxy(service.url, allow_none=True)
+        keys = [f"key.{index}" for index in range(args.keys)]
+        value = {"value": 1.0, "timestamp": time.time(), "units": "W"}
+
+        with stats.timer("cache.put_many"):
+            cache.put_many({key: value for key in keys})
+
+        mirror = cache_mirror.CacheMirror(cache)
+
+        for _ in range(args.count):
+            with stats.timer("cache.get_each"):
+                for key in keys:
+                    cache.get(key)
+
+            with stats.timer("cache.get_many"):
+                cache.get_many(keys)
+
+            with stats.timer("cache.mirror"):
+                mirror.get_many(keys)
+
+            cache.put(keys[0], value)
+    finally:
+        service.stop()
+
+
+#-------------------------------------------------------------------------
+# Location service and solar geometry
+#-------------------------------------------------------------------------
+
+
+def bench_location(args, stats):
+    """Location lookups and solar geometry"""
+
+    solar_cache = import_module("solar_cache")
+
+    service = FakeLocation().start()
+
+    try:
+        location = xmlrpc.client.ServerProxy(service.url, allow_none=True)
+        solar = solar_cache.SolarCache()
+
+        start = datetime.datetime(2026, 6, 1, tzinfo=utc)
+
+        for index in range(args.count):
+            now = start + datetime.timedelta(minutes=index)
+
+            with stats.timer("location.best"):
+                position = location.best()
+
+            solar.set_location(position["latitude"], position["longitude"])
+
+            with stats.timer("solar.altitude"):
+                solar.altitude(now)
+
+            with stats.timer("solar.transits"):
+                solar.transits(now)
+
+            with stats.timer("solar.next_crossing"):
+                solar.next_crossing(now, -6)
+    finally:
+        service.stop()
+
+
+#-------------------------------------------------------------------------
+# GPS
+#-------------------------------------------------------------------------
+
+
+def bench_gps(args, stats):
+    """gpsd reports from a fake GPS fed by a log file"""
+
+    if not args.gps_log:
+        raise SkipBenchmark("no --gps-log given")
+
+    sys.path.insert(0, str(OPTDIR / "ubxtool"))
+
+    fake = import_module("gps.fake")
+
+    last = [time.perf_counter()]
+
+    def reporter(_response):
+        """Record the time between reports"""
+
+        now = time.perf_counter()
+        stats.record("gps.report", now - last[0])
+        last[0] = now
+
+    try:
+        session = fake.TestSession()
+        session.reporter = reporter
+        session.spawn()
+    except (OSError, fake.TestError) as e:
+        raise SkipBenchmark(f"gpsd: {e}") from e
+
+    session.gps_add(args.gps_log, oneshot=True)
+    session.client_add('?WATCH={"enable":true,"json":true}\n')
+
+    with stats.timer("gps.session"):
+        session.run()
+
+
+#-------------------------------------------------------------------------
+# Runner
+#-------------------------------------------------------------------------
+
+BENCHMARKS = {
+    "meters": bench_meters,
+    "schedule": bench_schedule,
+    "postfiles": bench_postfiles,
+    "output": bench_output,
+    "cache": bench_cache,
+    "location": bench_location,
+    "gps": bench_gps,
+}
+
+
+def report(results):
+    """Print a summary table"""
+
+    print(f"{'name':32s} {'count':>7s} {'mean ms':>10s} {'max ms':>10s} {'ops/s':>10s}")
+
+    for name, timer in sorted(results["timers"].items()):
+        rate = timer["count"] / timer["total"] if timer["total"] else 0
+        print(
+            f"{name:32s} {timer['count']:7d} {timer['mean'] * 1000:10.3f} "
+            f"{timer['max'] * 1000:10.3f} {rate:10.1f}"
+        )
+
+    for name, reason in sorted(results["skipped"].items()):
+        print(f"{name:32s} skipped: {reason}")
+
+    for name, reason in sorted(results["failed"].items()):
+        print(f"{name:32s} failed: {reason}")
+
+
+def main():
+    """Run benchmarks"""
+
+    parser = argparse.ArgumentParser(description="Run offline benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=", ".join(BENCHMARKS))
+    parser.add_argument("-n", "--count", type=int, default=100)
+    parser.add_argument("--json", help="Also write results to file")
+    parser.add_argument("--latency", type=float, default=0, help="Modbus delay (s)")
+    parser.add_argument("--max-gap", type=int, default=0, help="Meter read.max_gap")
+    parser.add_argument("--all-groups", action="store_true", help="Poll all meter groups")
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--file-size", type=int, default=64 * 1024)
+    parser.add_argument("--record-size", type=int, default=200)
+    parser.add_argument("--records-per-file", type=int, default=100)
+    parser.add_argument("--sync-records", type=int, default=1)
+    parser.add_argument("--keys", type=int, default=50)
+    parser.add_argument("--gps-log", help="NMEA log for the gps benchmark")
+    parser.add_argument("-v", "--verbose", action="store_true")
+
+    args = parser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark: {name}")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    stats = Stats()
+    skipped = {}
+    failed = {}
+
+    for name in args.benchmarks or BENCHMARKS:
+        log.info("Running %s", name)
+        try:
+            BENCHMARKS[name](args, stats)
+        except SkipBenchmark as e:
+            skipped[name] = str(e)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            log.info("Benchmark %s failed", name, exc_info=True)
+            failed[name] = f"{type(e).__name__}: {e}"
+
+    results = stats.as_dict()
+    results["skipped"] = skipped
+    results["failed"] = failed
+
+    report(results)
+
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(results, indent=2), "utf-8")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
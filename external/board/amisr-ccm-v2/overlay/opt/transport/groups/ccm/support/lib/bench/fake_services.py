@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Local Service Stand-ins"""
+
+##########################################################################
+#
+#   Stand-ins for the cache and location services
+#
+#   Each runs an XML-RPC server on a local port in a background
+#   thread, with the same methods clients call on the real services.
+#
+#   FakeCache runs the cache service code (service/cache/server.py)
+#   without the transport process or event notifications.
+#   FakeLocation follows a track around a fixed point.
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation
+#               FakeCache uses the cache service code
+#
+##########################################################################
+
+import importlib.util
+import logging
+import math
+import pathlib
+import threading
+import time
+
+from xmlrpc.server import SimpleXMLRPCServer
+
+CACHE_SERVER = (
+    pathlib.Path(__file__).resolve().parents[3] / "service" / "cache" / "server.py"
+)
+
+log = logging.getLogger("bench")
+
+
+class FakeService:
+    """XML-RPC server in a background thread"""
+
+    def __init__(self):
+        self.server = SimpleXMLRPCServer(
+            ("127.0.0.1", 0), allow_none=True, logRequests=False
+        )
+        self.server.register_instance(self)
+        self.thread = None
+
+    @property
+    def url(self):
+        """Service URL"""
+
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving"""
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def load_cache_server():
+    """Import the cache service module"""
+
+    spec = importlib.util.spec_from_file_location("cache_server", CACHE_SERVER)
+
+    if spec is None:
+        raise ImportError(f"Cannot load {CACHE_SERVER}")
+
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+class FakeCache(FakeService):
+    """Cache service stand-in, running the cache service code"""
+
+    def __init__(self, options=""):
+        # pylint: disable=import-outside-toplevel
+        import sapphire_config
+
+        server_class = load_cache_server().Server
+
+        class CacheServer(server_class):
+            """Cache service without a transport process"""
+
+            # pylint: disable=super-init-not-called
+
+            def __init__(self, config):
+                self.config = config
+                self.log = log
+                self.setup_cache()
+
+        parser = sapphire_config.Parser()
+        parser.read_string(f"[cache]\nevent.enable: false\n{options}")
+
+        self.cache = CacheServer(parser["cache"])
+
+        FakeService.__init__(self)
+
+        self.cache.register_functions(self.server)
+
+
+class FakeLocation(FakeService):
+    """Location service stand-in"""
+
+    def __init__(self, latitude=67.0, longitude=-50.7, radius_km=10, period=3600):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        self.period = period
+        FakeService.__init__(self)
+
+    def best(self):
+        """Current position on a circular track"""
+
+        angle = 2 * math.pi * (time.time() % self.period) / self.period
+        dlat = self.radius_km / 111.0 * math.sin(angle)
+        dlon = (
+            self.radius_km
+            / (111.0 * math.cos(math.radians(self.latitude)))
+            * math.cos(angle)
+        )
+
+        return {
+            "src": "fake",
+            "latitude": self.latitude + dlat,
+            "longitude": self.longitude + dlon,
+        }
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Simulated Modbus TCP Server"""
+
+##########################################################################
+#
+#   Simulated Modbus TCP server
+#
+#   Serves holding registers for the addresses in a register map.
+#   Supports read holding registers (3), write single register (6)
+#   and write multiple registers (16). Register contents are filled
+#   with printable bytes so both numeric and string registers decode.
+#
+#   With strict set, reads that touch an address not in the map
+#   return an illegal address exception, like many real devices.
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation
+#
+##########################################################################
+
+import asyncio
+import random
+import struct
+
+MBAP_FMT = ">HHHB"
+MBAP_LEN = struct.calcsize(MBAP_FMT)
+
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+
+
+class ModbusSimulator:
+    """Modbus TCP server stand-in"""
+
+    def __init__(self, registermap=None, strict=False, latency=0, seed=0):
+        self.registers = [0] * 65536
+        self.valid = set()
+        self.strict = strict
+        self.latency = latency
+        self.requests = 0
+        self.server = None
+        self.clients = {}
+
+        if registermap:
+            self.load(registermap, seed)
+
+    def load(self, registermap, seed=0):
+        """Fill registers listed in the register map"""
+
+        rand = random.Random(seed)
+
+        for group in registermap.groups.groups.values():
+            for reg in group.registers:
+                for addr in range(reg.address, reg.address + reg.words):
+                    high = rand.randint(0x30, 0x7A)
+                    low = rand.randint(0x30, 0x7A)
+                    self.registers[addr] = (high << 8) | low
+                    self.valid.add(addr)
+
+    def check_range(self, addr, count):
+        """Address range can be accessed"""
+
+        if addr + count > len(self.registers):
+            return False
+
+        if not self.strict:
+            return True
+
+        return all(k in self.valid for k in range(addr, addr + count))
+
+    def handle_pdu(self, pdu):
+        """Process request PDU, return response PDU"""
+
+        func = pdu[0]
+
+        if func == 3:
+            addr, count = struct.unpack_from(">HH", pdu, 1)
+            if not self.check_range(addr, count):
+                return bytes([func | 0x80, ILLEGAL_ADDRESS])
+            values = self.registers[addr : addr + count]
+            return struct.pack(f">BB{count}H", func, count * 2, *values)
+
+        if func == 6:
+            addr, value = struct.unpack_from(">HH", pdu, 1)
+            self.registers[addr] = value
+            return pdu[:5]
+
+        if func == 16:
+            addr, count, _nbytes = struct.unpack_from(">HHB", pdu, 1)
+            values = struct.unpack_from(f">{count}H", pdu, 6)
+            self.registers[addr : addr + count] = values
+            return struct.pack(">BHH", func, addr, count)
+
+        return bytes([func | 0x80, ILLEGAL_FUNCTION])
+
+    async def handle_client(self, reader, writer):
+        """Serve one client connection"""
+
+        self.clients[writer] = asyncio.current_task()
+
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_LEN)
+                tid, proto, length, unit = struct.unpack(MBAP_FMT, header)
+                pdu = await reader.readexactly(length - 1)
+
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                self.requests += 1
+                response = self.handle_pdu(pdu)
+
+                writer.write(
+                    struct.pack(MBAP_FMT, tid, proto, len(response) + 1, unit)
+                    + response
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.clients[writer]
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start listening. Returns the port"""
+
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop listening and close client connections"""
+
+        self.server.close()
+
+        tasks = list(self.clients.values())
+
+        for writer in list(self.clients):
+            writer.close()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Local mirror of cache service entries"""
+
+##########################################################################
+#
+#   Local mirror of cache service entries
+#
+#   Keeps a local copy of the cache service entries a client reads.
+#   Each refresh asks for the entries changed since the last version
+#   seen (get_changes), so unchanged values are not sent again.
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation
+#               Drop the refreshed keys on a full resync
+#
+##########################################################################
+
+
+class CacheMirror:
+    """Cache service entries"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.values = {}
+        self.versions = {}
+        self.epoch = ""
+
+    def refresh(self, keys):
+        """Pull changes for keys from the cache service"""
+
+        keys = list(keys)
+
+        if not keys:
+            return
+
+        version = min(self.versions.get(key, 0) for key in keys)
+
+        changes = self.cache.get_changes(version, self.epoch, keys)
+
+        if changes["epoch"] != self.epoch:
+            # Cache restarted or renumbered, everything else is stale
+            self.values = {}
+            self.versions = {}
+            self.epoch = changes["epoch"]
+        elif changes.get("full"):
+            # Removed keys since our version are no longer all known
+            for key in keys:
+                self.values.pop(key, None)
+
+        self.values.update(changes["values"])
+
+        for key in changes["removed"]:
+            self.values.pop(key, None)
+
+        for key in keys:
+            self.versions[key] = changes["version"]
+
+    def get(self, key, default=None):
+        """Return the current value for key"""
+
+        self.refresh([key])
+
+        return self.values.get(key, default)
+
+    def get_many(self, keys):
+        """Return the current values for keys. Missing keys are left out"""
+
+        self.refresh(keys)
+
+        return {key: self.values[key] for key in keys if key in self.values}
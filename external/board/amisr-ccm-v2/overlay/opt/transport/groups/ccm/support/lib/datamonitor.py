@@ -115,13 +115,33 @@
 #   2026-03-25  Todd Valentic
 #               Catch all errors when getting status 
 #
+#   2026-10-16  Todd Valentic
+#               Use datawriter to keep the current output file open
+#                   and compress closed files from an in-memory list.
+#               Add output.sync.records, output.sync.interval,
+#                   output.compress.codec and output.compress.background
+#               Add get_step_wait() to sleep until the next sample,
+#                   schedule transition or window change. Add
+#                   schedule.max_wait (default 1h). Monitors that poll
+#                   for changes (needs_poll(): force flags, schedule
+#                   files or outside state) still wake every
+#                   schedule.rate.
+#               Read cache values through CacheMirror so only changed
+#                   entries are transferred. Add put_cache_many and
+#                   get_cache_many.
+#               Time the sample, save and compress phases. Write the
+#                   stats to stats.path and/or put them in the cache
+#                   (stats.cache) every stats.rate.
+#               Shared main() loop and next_state_change() for
+#                   get_step_wait(). next_state_change() is also
+#                   checked when off, since it can open the window.
+#               Location and solar window code moved to SolarMixin
+#
 ##########################################################################
 
-import bz2
 import datetime
 import functools
 import os
-import stat
 import subprocess
 import sys
 import time
@@ -136,6 +156,10 @@ import sapphire_config as sapphire
 
 import schedule
 
+from cache_mirror import CacheMirror
+from instrument import Stats, make_writer
+from datawriter import OutputWriter, OutputCompressor
+
 # pylint: disable=too-many-public-methods
 # pylint: disable=broad-exception-caught
 
@@ -162,8 +186,10 @@ class DataMonitorBase(Root):
         self.status_method = getattr(self.status_service, status_method)
 
         self.cache = self.directory.connect("cache")
+        self.cache_mirror = CacheMirror(self.cache)
         self.schedules = schedule.ScheduleManager(self.log)
         self.cur_schedule = None
+        self.next_sample_time = None
         self.on = False
         self._sample_time = None
 
@@ -171,15 +197,37 @@ class DataMonitorBase(Root):
         self.output_rate = self.config.get_timedelta("output.rate")
         self.output_path = self.config.get_path("output.path", "data-%Y%m%d-%H%M%S.dat")
         self.compress = self.config.get_boolean("output.compress", True)
+        self.compress_codec = self.config.get("output.compress.codec", "bz2")
+        self.compress_background = self.config.get_boolean(
+            "output.compress.background", False
+        )
+        self.sync_records = self.config.get_int("output.sync.records", 1)
+        self.sync_interval = self.config.get_timedelta("output.sync.interval")
         self.script_path = self.config.get("scripts")
         self.schedule_rate = self.config.get_rate("schedule.rate", 60)
         self.schedule_files = self.config.get_list("schedule.files")
+        self.schedule_max_wait = self.config.get_timedelta("schedule.max_wait", "1h")
         self.window_flag = self.config.get("force.flag.window")
         self.sample_flag = self.config.get("force.flag.sample")
 
         if self.output_rate:
             self.interval = self.output_rate.total_seconds()
 
+        if self.sync_interval is not None:
+            self.sync_interval = self.sync_interval.total_seconds()
+
+        self.output_writer = None
+        self.output_compressor = None
+
+        self.stats = Stats()
+
+        if self.config.get_boolean("stats.cache", False):
+            publish = self.publish_stats
+        else:
+            publish = None
+
+        self.stats_writer = make_writer(self, self.stats, publish)
+
         self.schedules.reload(self.schedule_files)
 
     # Resource management ################################################
@@ -264,17 +312,38 @@ class DataMonitorBase(Root):
             self.log.exception("Failed to set cache")
             return False
 
+    def put_cache_many(self, values):
+        """Put dict of values into cache"""
+
+        try:
+            return self.cache.put_many(values)
+        except Exception:
+            self.log.exception("Failed to set cache")
+            return False
+
     def get_cache(self, key):
         """Get value from cache"""
 
         try:
-            # server not configured for None yet
-            # return self.cache_service.get_or_default(key,None)
-            return self.cache.get(key)
+            value = self.cache_mirror.get(key)
         except Exception:
-            self.log.error("No cache value for %s", key)
+            self.log.exception("Failed to get cache")
             return None
 
+        if value is None:
+            self.log.error("No cache value for %s", key)
+
+        return value
+
+    def get_cache_many(self, keys):
+        """Get values from cache. Missing keys are left out"""
+
+        try:
+            return self.cache_mirror.get_many(keys)
+        except Exception:
+            self.log.exception("Failed to get cache")
+            return {}
+
     def list_cache(self):
         """List cache keys"""
 
@@ -457,6 +526,50 @@ class DataMonitorBase(Root):
                 self.going_on_to_off()
                 continue
 
+    def get_step_wait(self):
+        """Time to wait until the next scheduler step"""
+
+        if self.schedule_rate.at_start:
+            self.schedule_rate.at_start = False
+            return datetime.timedelta(0)
+
+        now = self.now()
+
+        # schedule.max_wait is only a safety cap. Changes that can only
+        # be seen by polling are checked every schedule.rate.
+
+        events = [now + self.schedule_max_wait, self.schedules.next_transition(now)]
+
+        if self.needs_poll():
+            events.append(now + self.schedule_rate.nexttime(now))
+
+        if self.cur_schedule:
+            events.append(self.cur_schedule.next_window_change(now))
+
+        if self.next_sample_time and self.next_sample_time > now:
+            events.append(self.next_sample_time)
+
+        events.append(self.next_state_change(now))
+
+        next_time = min(event for event in events if event)
+
+        return max(next_time - now, datetime.timedelta(0))
+
+    def needs_poll(self):
+        """Wake every schedule.rate to look for force flags and schedule
+        file changes. Child classes that depend on outside state (is_on(),
+        cache values) extend this.
+        """
+
+        return bool(self.window_flag or self.sample_flag or self.schedule_files)
+
+    def next_state_change(self, _now):
+        """Next time the sampling state may change (or None).
+        Filled in by child classes.
+        """
+
+        return None
+
     def get_data_time(self, data):
         """Can be filled in by child classes for a time derived by the data."""
         # pylint: disable=unused-argument
@@ -483,13 +596,24 @@ class DataMonitorBase(Root):
 
         try:
             self.set_sample_time(time.time())
-            data = self.sample()
+            with self.stats.timer("sample"):
+                data = self.sample()
             if data is not None and self.output_enabled:
-                self.save_data(self.get_sample_time(), data)
-                self.compress_files()
+                with self.stats.timer("save"):
+                    self.save_data(self.get_sample_time(), data)
+                with self.stats.timer("compress"):
+                    self.compress_files()
         except Exception:
             self.log.exception("Failed to collect data")
 
+        if self.stats_writer:
+            self.stats_writer.check()
+
+    def publish_stats(self, results):
+        """Put stats into the cache"""
+
+        self.put_cache(f"stats.{self.instrument}", results)
+
     def step(self):
         """Application generator loop"""
 
@@ -514,56 +638,78 @@ class DataMonitorBase(Root):
         except Exception:
             self.log.exception("Failed to shutdown")
 
-    def save_data(self, timestamp, buffer):
-        """Write data into current output file"""
+        try:
+            self.close_output()
+        except Exception:
+            self.log.exception("Failed to close output")
 
-        interval = self.get_interval(timestamp)
-        dt = datetime.datetime.utcfromtimestamp(interval)
-        localfile = Path(dt.strftime(str(self.output_path.name)))
+    def main(self):
+        """Main application loop"""
 
-        with localfile.open("ab") as output:
-            self.write(output, timestamp, buffer)
-            output.flush()
-            os.fsync(output.fileno())
+        for _step in self.step():
+            if not self.wait(self.get_step_wait()):
+                break
 
-        mode = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IWGRP | stat.S_IROTH
-        localfile.chmod(mode)
+    def open_output(self, localfile):
+        """Setup output writer and compressor"""
 
-        self.log.debug(str(localfile))
+        self.output_compressor = OutputCompressor(
+            self.log,
+            self.output_path.parent,
+            codec=self.compress_codec,
+            compress=self.compress,
+            background=self.compress_background,
+        )
 
-    def compress_files(self):
-        """Move and optionally compress output files to spool"""
+        self.output_writer = OutputWriter(
+            self.log,
+            self.write,
+            self.output_compressor.add,
+            sync_records=self.sync_records,
+            sync_interval=self.sync_interval,
+            single=not self.output_rate,
+        )
+
+        # Pick up files left over from a previous run. The current
+        # file is appended to and handled when it is closed.
 
         ext = self.output_path.suffix
         prefix = self.output_path.name.split("-")[0]
-        filenames = sorted(Path(".").glob(f"{prefix}*{ext}"))
 
-        if self.output_rate:
-            filenames = filenames[:-1]
+        for filename in sorted(Path(".").glob(f"{prefix}*{ext}")):
+            if filename != localfile:
+                self.output_compressor.add(filename)
 
-        for filename in filenames:
-            data = filename.read_bytes()
+    def close_output(self):
+        """Close the current output file and finish compression"""
 
-            outputname = self.output_path.parent / filename.name
+        if self.output_writer:
+            self.output_writer.close()
+            self.output_writer = None
 
-            if self.compress:
-                zdata = bz2.compress(data)
-                outputname = outputname.with_suffix(ext + ".bz2")
-                action = "compressing"
-            else:
-                zdata = data
-                action = "copying"
+        if self.output_compressor:
+            self.output_compressor.stop()
+            self.output_compressor = None
 
-            outputname.parent.mkdir(parents=True, exist_ok=True)
+    def save_data(self, timestamp, buffer):
+        """Write data into current output file"""
 
-            with outputname.open("wb") as output:
-                output.write(zdata)
-                output.flush()
-                os.fsync(output.fileno())
+        interval = self.get_interval(timestamp)
+        dt = datetime.datetime.utcfromtimestamp(interval)
+        localfile = Path(dt.strftime(str(self.output_path.name)))
 
-            self.log.info("%s %s: %d -> %d", action, filename, len(data), len(zdata))
+        if not self.output_writer:
+            self.open_output(localfile)
 
-            filename.unlink()
+        self.output_writer.append(localfile, timestamp, buffer)
+
+        self.log.debug(str(localfile))
+
+    def compress_files(self):
+        """Move and optionally compress closed output files to spool"""
+
+        if self.output_compressor:
+            self.output_compressor.process()
 
 
 class DataMonitorComponent(DataMonitorBase, ConfigComponent):
@@ -581,13 +727,6 @@ class DataMonitor(DataMonitorBase, ProcessClient):
         ProcessClient.__init__(self, argv)
         DataMonitorBase.__init__(self)
 
-    def main(self):
-        """Main application loop"""
-
-        for _step in self.step():
-            if not self.wait(self.schedule_rate):
-                break
-
 
 if __name__ == "__main__":
     DataMonitor(sys.argv).run()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Data Monitor Output"""
+
+##########################################################################
+#
+#   Output file handling for data monitors.
+#
+#   OutputWriter keeps the current interval file open and syncs it to
+#   disk according to a durability policy (every N records, every T
+#   seconds and always on rollover).
+#
+#   OutputCompressor moves closed files to the output directory,
+#   compressing them in chunks with a selectable codec. It can run
+#   in the caller (process) or in a background thread.
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation. Split out of DataMonitorBase
+#                   save_data() and compress_files().
+#               Retry files that fail to move (each process() call or
+#                   every RETRY_WAIT secs in the background worker).
+#               Options are keyword only
+#               Rename the zlib codec to gzip (it writes .gz files).
+#                   zlib is still accepted as an alias.
+#
+##########################################################################
+
+import bz2
+import collections
+import lzma
+import os
+import queue
+import stat
+import threading
+import time
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+
+RETRY_WAIT = 60
+
+FILE_MODE = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IWGRP | stat.S_IROTH
+
+CODECS = {
+    "bz2": (".bz2", bz2.BZ2Compressor),
+    "xz": (".xz", lzma.LZMACompressor),
+    "gzip": (".gz", lambda: zlib.compressobj(wbits=31)),
+}
+
+# Older names. zlib was the original name for gzip.
+
+CODEC_ALIASES = {
+    "zlib": "gzip",
+}
+
+
+class OutputWriter:
+    """Append records to the current interval file"""
+
+    # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self, log, write, on_close, *, sync_records=1, sync_interval=None, single=False
+    ):
+        self.log = log
+        self.write = write
+        self.on_close = on_close
+        self.sync_records = sync_records
+        self.sync_interval = sync_interval
+        self.single = single
+
+        self.filename = None
+        self.output = None
+        self.unsynced = 0
+        self.sync_time = 0
+
+    def open(self, filename):
+        """Open filename for appending"""
+
+        self.output = filename.open("ab")
+        self.filename = filename
+        self.unsynced = 0
+        self.sync_time = time.monotonic()
+
+        filename.chmod(FILE_MODE)
+
+    def sync(self):
+        """Flush current file to disk"""
+
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.unsynced = 0
+        self.sync_time = time.monotonic()
+
+    def needs_sync(self):
+        """Check the durability policy"""
+
+        if self.sync_records and self.unsynced >= self.sync_records:
+            return True
+
+        if self.sync_interval is not None:
+            return time.monotonic() - self.sync_time >= self.sync_interval
+
+        return False
+
+    def append(self, filename, timestamp, data):
+        """Write a record into filename"""
+
+        if filename != self.filename:
+            self.close()
+            self.open(filename)
+
+        self.write(self.output, timestamp, data)
+        self.output.flush()
+        self.unsynced += 1
+
+        if self.single:
+            self.close()
+        elif self.needs_sync():
+            self.sync()
+
+    def close(self):
+        """Sync and close the current file, pass it to on_close"""
+
+        if not self.output:
+            return
+
+        filename = self.filename
+
+        try:
+            self.sync()
+        finally:
+            self.output.close()
+            self.output = None
+            self.filename = None
+
+        self.on_close(filename)
+
+
+class OutputCompressor:
+    """Move closed files to the output directory"""
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self, log, output_dir, *, codec="bz2", compress=True, background=False
+    ):
+        self.log = log
+        self.output_dir = output_dir
+        self.compress = compress
+
+        codec = CODEC_ALIASES.get(codec, codec)
+
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+
+        self.suffix, self.compressor = CODECS[codec]
+
+        self.pending = collections.deque()
+        self.queue = None
+        self.worker = None
+
+        if background:
+            self.queue = queue.Queue()
+            self.worker = threading.Thread(target=self.run, daemon=True)
+            self.worker.start()
+
+    def add(self, filename):
+        """Add a closed file to be processed"""
+
+        if self.queue:
+            self.queue.put(filename)
+        elif filename not in self.pending:
+            self.pending.append(filename)
+
+    def try_move(self, filename, failed):
+        """Move file, add it to failed if there is a problem"""
+
+        try:
+            self.move(filename)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.log.exception("Failed to process %s", filename)
+            if filename not in failed:
+                failed.append(filename)
+
+    def retry(self, failed):
+        """Try the failed files again"""
+
+        for _ in range(len(failed)):
+            self.try_move(failed.popleft(), failed)
+
+    def process(self):
+        """Process pending files in the caller"""
+
+        self.retry(self.pending)
+
+    def run(self):
+        """Background worker"""
+
+        failed = collections.deque()
+
+        while True:
+            try:
+                filename = self.queue.get(timeout=RETRY_WAIT if failed else None)
+            except queue.Empty:
+                self.retry(failed)
+                continue
+
+            if filename is None:
+                self.retry(failed)
+                break
+
+            self.try_move(filename, failed)
+
+    def stop(self):
+        """Finish pending files and stop the worker"""
+
+        if self.worker:
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
+        else:
+            self.process()
+
+    def move(self, filename):
+        """Copy or compress file into the output directory"""
+
+        if not filename.exists():
+            return
+
+        outputname = self.output_dir / filename.name
+
+        if self.compress:
+            outputname = outputname.with_suffix(outputname.suffix + self.suffix)
+            compressor = self.compressor()
+            action = "compressing"
+        else:
+            compressor = None
+            action = "copying"
+
+        outputname.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a hidden name first so partial files are never seen
+
+        tmpname = outputname.with_name(f".{outputname.name}.tmp")
+
+        insize = 0
+        outsize = 0
+
+        with filename.open("rb") as src, tmpname.open("wb") as output:
+            while chunk := src.read(CHUNK_SIZE):
+                insize += len(chunk)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                outsize += len(chunk)
+                output.write(chunk)
+
+            if compressor:
+                chunk = compressor.flush()
+                outsize += len(chunk)
+                output.write(chunk)
+
+            output.flush()
+            os.fsync(output.fileno())
+
+        tmpname.replace(outputname)
+
+        self.log.info("%s %s: %d -> %d", action, filename, insize, outsize)
+
+        filename.unlink()
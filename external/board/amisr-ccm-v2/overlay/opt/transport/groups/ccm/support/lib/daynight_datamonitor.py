@@ -31,28 +31,39 @@
 #   2021-06-30  Todd Valentic
 #               Use location service
 #
+#   2026-10-16  Todd Valentic
+#               Wait until the next schedule event (get_step_wait)
+#               Add missing colon in main()
+#               Use SolarCache for solar angle and transit times.
+#                   The location is only requested every location.rate
+#                   and the tables are rebuilt when the position moves
+#                   more than location.threshold (km).
+#               Wake at the next day/night boundary (next_state_change)
+#               Main loop moved to DataMonitorBase
+#               Location lookups and the solar window check moved to
+#                   SolarMixin (in_solar_window) to share them with
+#                   SolarDataMonitor and NightDataMonitor
+#
 ##########################################################################
 
 import sys
-import ephem
 
 from datatransport import ProcessClient
 from datatransport import ConfigComponent
 
 from datamonitor import DataMonitorBase
+from solar_mixin import SolarMixin
 
 
-class DayNightDataMonitorBase(DataMonitorBase):
+class DayNightDataMonitorBase(SolarMixin, DataMonitorBase):
     """DayNight Data Monitor Base Class"""
 
     def __init__(self):
         DataMonitorBase.__init__(self)
+        SolarMixin.__init__(self)
 
-        self.report_missing_gps = True
         self.report_state = None
 
-        self.location = self.directory.connect("location")
-
     def when_on(self):
         """On handler"""
 
@@ -84,96 +95,15 @@ class DayNightDataMonitorBase(DataMonitorBase):
 
         DataMonitorBase.when_on(self)
 
-    def in_timespan(self, now, transit, window, repeat_days):
-        """Check if now is in time span"""
-
-        now = now.datetime()
-
-        transit_time = transit.datetime()
-        day_of_year = int(transit_time.strftime("%j"))
-
-        if repeat_days and day_of_year % repeat_days != 0:
-            return False
-
-        return transit_time - window / 2 <= now < transit_time + window / 2
-
     def sun_up(self):
         """Check if the sun is up"""
 
-        # pylint: disable=too-many-return-statements
-
-        location = self.location.best()
-
-        if not location:
-            if self.report_missing_gps:
-                self.report_missing_gps = False
-                self.log.info("No GPS or Iridium position data...")
-            return False
-
-        self.report_missing_gps = True
-
-        now = ephem.now()
-
-        station = ephem.Observer()
-        station.lat = str(location["latitude"])
-        station.long = str(location["longitude"])
-        station.date = now
-
-        self.log.debug("station: %s", station)
-
-        sun = ephem.Sun()
-        sun.compute(station)
-        solar_angle = float(sun.alt) * 180 / ephem.pi
+        return self.in_solar_window(self.now())
 
-        station.date = now
-        next_transit = station.next_transit(sun)
+    def next_state_change(self, now):
+        """Next time that sun_up() may change (or None)"""
 
-        station.date = now
-        prev_transit = station.previous_transit(sun)
-
-        self.log.debug("  prev transit: %s", prev_transit)
-        self.log.debug("  next transit: %s", next_transit)
-        self.log.debug("  sun angle: %s", solar_angle)
-
-        schedule = self.cur_schedule
-
-        self.log.debug("  checking if in prev min")
-        if self.in_timespan(now, prev_transit, schedule.window_min, schedule.repeat_days):
-            self.log.debug("    yes - turn on")
-            return True
-
-        self.log.debug("  checking if in next min")
-        if self.in_timespan(now, next_transit, schedule.window_min, schedule.repeat_days):
-            self.log.debug("    yes - turn on")
-            return True
-
-        if schedule.min_solar_angle is not None:
-            self.log.debug("  checking min solar angle")
-            if solar_angle < schedule.min_solar_angle:
-                self.log.debug("    sun too low - turn off")
-                return False
-
-        if schedule.max_solar_angle is not None:
-            if solar_angle >= schedule.max_solar_angle:
-                self.log.debug("    sun too high - turn off")
-                return False
-
-        if schedule.window_max is None:
-            return True
-
-        self.log.debug("  checking if in prev window")
-        if self.in_timespan(now, prev_transit, schedule.window_max, schedule.repeat_days):
-            self.log.debug("    yes - turn on")
-            return True
-
-        self.log.debug("  checking if in next window")
-        if self.in_timespan(now, next_transit, schedule.window_max, schedule.repeat_days):
-            self.log.debug("    yes - turn on")
-            return True
-
-        self.log.debug("  failed to match any criteria")
-
-        return False
+        return self.next_solar_change(now)
 
 
 class DayNightDataMonitorComponent(DayNightDataMonitorBase, ConfigComponent):
@@ -191,13 +121,6 @@ class DayNightDataMonitor(DayNightDataMonitorBase, ProcessClient):
         ProcessClient.__init__(self, argv)
         DayNightDataMonitorBase.__init__(self)
 
-    def main(self):
-        """Main application loop"""
-
-        for _step in self.step():
-            if not self.wait(self.schedule_rate)
-                break
-
 
 if __name__ == "__main__":
     DayNightDataMonitor(sys.argv).run()
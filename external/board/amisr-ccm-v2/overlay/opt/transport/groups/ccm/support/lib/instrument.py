@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Timing Instrumentation"""
+
+##########################################################################
+#
+#   Timing instrumentation
+#
+#   Stats keeps call counts and latency histograms by name. Use
+#   timer() around code sections or InstrumentedServer in place of
+#   XMLRPCServer to time every registered method. The results are
+#   available from the get_stats RPC and can be written to a JSON
+#   file periodically (stats.path, stats.rate).
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation
+#               Replace instrument_server() with InstrumentedServer,
+#                   which wraps functions as they are registered
+#                   instead of patching the dispatcher
+#
+##########################################################################
+
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+from datatransport import XMLRPCServer
+
+# Histogram bucket upper bounds (secs)
+
+BUCKETS = (
+    0.0001, 0.0002, 0.0005,
+    0.001, 0.002, 0.005,
+    0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5,
+    1, 2, 5,
+    10, 20, 50,
+)
+
+
+def bucket_label(index):
+    """Label for bucket index (upper bound in ms)"""
+
+    if index < len(BUCKETS):
+        return f"{BUCKETS[index] * 1000:g}ms"
+
+    return "inf"
+
+
+class Histogram:
+    """Latency histogram"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, secs, error=False):
+        """Record one call"""
+
+        self.count += 1
+        self.total += secs
+        self.max = max(self.max, secs)
+        self.buckets[bisect.bisect_left(BUCKETS, secs)] += 1
+
+        if error:
+            self.errors += 1
+
+    def as_dict(self):
+        """Summary, only non-empty buckets are included"""
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0,
+            "max": self.max,
+            "buckets": {
+                bucket_label(index): count
+                for index, count in enumerate(self.buckets)
+                if count
+            },
+        }
+
+
+class Stats:
+    """Histograms by name"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def record(self, name, secs, error=False):
+        """Record a call to name"""
+
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].add(secs, error)
+
+    def wrap(self, name, function):
+        """Return function timed under name"""
+
+        @functools.wraps(function)
+        def timed(*args, **kw):
+            with self.timer(name):
+                return function(*args, **kw)
+
+        return timed
+
+    @contextmanager
+    def timer(self, name):
+        """Time a code section"""
+
+        start = time.perf_counter()
+        error = True
+
+        try:
+            yield
+            error = False
+        finally:
+            self.record(name, time.perf_counter() - start, error)
+
+    def reset(self):
+        """Clear all histograms"""
+
+        with self.lock:
+            self.histograms = {}
+            self.start_time = time.time()
+
+        return True
+
+    def as_dict(self):
+        """Summary of all histograms"""
+
+        with self.lock:
+            timers = {name: hist.as_dict() for name, hist in self.histograms.items()}
+
+        return {
+            "start_time": self.start_time,
+            "elapsed": time.time() - self.start_time,
+            "timers": timers,
+        }
+
+
+class StatsWriter:
+    """Write stats to a file and/or pass them to publish periodically"""
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(self, stats, path, rate=60, log=None, publish=None):
+        self.stats = stats
+        self.path = path
+        self.rate = rate
+        self.log = log
+        self.publish = publish
+        self.write_time = time.monotonic()
+
+    def check(self):
+        """Write if due"""
+
+        if time.monotonic() - self.write_time < self.rate:
+            return
+
+        self.write_time = time.monotonic()
+
+        try:
+            self.write()
+        except OSError as e:
+            if self.log:
+                self.log.error("Failed to write stats: %s", e)
+
+    def write(self):
+        """Write stats as JSON"""
+
+        results = self.stats.as_dict()
+
+        if self.publish:
+            self.publish(results)
+
+        if not self.path:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmpname = self.path.with_name(f".{self.path.name}.tmp")
+        tmpname.write_text(json.dumps(results, indent=2), "utf-8")
+        os.replace(tmpname, self.path)
+
+
+def make_writer(parent, stats, publish=None):
+    """Return a StatsWriter if stats.path or publish is set"""
+
+    path = parent.config.get_path("stats.path")
+
+    if not path and not publish:
+        return None
+
+    rate = parent.config.get_timedelta("stats.rate", "1m")
+
+    return StatsWriter(stats, path, rate.total_seconds(), parent.log, publish)
+
+
+class InstrumentedServer(XMLRPCServer):
+    """XMLRPCServer that times every registered function. Adds
+    get_stats and reset_stats. The stats are written every stats.rate
+    from the server callback if stats.path is set.
+    """
+
+    def __init__(self, parent, *pos, callback=None, stats=None, **kw):
+        self.stats = stats or Stats()
+        self.stats_writer = make_writer(parent, self.stats)
+        self.idle_callback = callback
+
+        if self.stats_writer:
+            callback = self.periodic
+
+        XMLRPCServer.__init__(self, parent, *pos, callback=callback, **kw)
+
+        self.register_function(self.stats.as_dict, "get_stats")
+        self.register_function(self.stats.reset, "reset_stats")
+
+    def register_function(self, function=None, name=None):
+        """Register function, timed under its RPC name"""
+
+        if function is None:
+            return functools.partial(self.register_function, name=name)
+
+        if name is None:
+            name = function.__name__
+
+        XMLRPCServer.register_function(self, self.stats.wrap(name, function), name)
+
+        return function
+
+    def periodic(self):
+        """Server callback: run the caller's callback, then write stats"""
+
+        if self.idle_callback:
+            self.idle_callback()
+
+        self.stats_writer.check()
@@ -10,11 +10,22 @@
 #               Initial implementation.
 #               Extracted from individual meter regmaps
 #
+#   2026-10-16  Todd Valentic
+#               Add ReadPlanner to merge registers across groups and
+#                   paths into the fewest read requests. Small address
+#                   gaps can be bridged (max_gap). Plans are cached.
+#               Keep at most max_plans cached plans, least recently
+#                   used are dropped
+#
 ##########################################################################
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 import argparse
 
+MAX_BLOCK_WORDS = 125
+MAX_PLANS = 64
+
 
 class Register(ABC):
     """Individual register"""
@@ -71,7 +82,7 @@ class Group:
         self.name = name
         self.registers = []
         # self.max_block_words = 64
-        self.max_block_words = 125
+        self.max_block_words = MAX_BLOCK_WORDS
 
     def add(self, register):
         """Add a register to the group"""
@@ -126,6 +137,86 @@ class Group:
         return [register]
 
 
+class ReadBlock:
+    """Address range read in a single request"""
+
+    def __init__(self, register):
+        self.address = register.address
+        self.words = register.words
+        self.registers = [register]
+
+    @property
+    def end(self):
+        """Address after the last word in the block"""
+
+        return self.address + self.words
+
+    def add(self, register):
+        """Extend block to include register"""
+
+        self.registers.append(register)
+        self.words = max(self.end, register.address + register.words) - self.address
+
+    def offsets(self):
+        """Byte offset of each register in the response buffer"""
+
+        return [((reg.address - self.address) * 2, reg) for reg in self.registers]
+
+
+class ReadPlanner:
+    """Merge registers into the fewest read requests"""
+
+    def __init__(self, max_gap=0, max_block_words=MAX_BLOCK_WORDS, max_plans=MAX_PLANS):
+        self.max_gap = max_gap
+        self.max_block_words = max_block_words
+        self.max_plans = max_plans
+        self.plans = OrderedDict()
+
+    def set_max_gap(self, max_gap):
+        """Set the largest address gap bridged in a block"""
+
+        if max_gap != self.max_gap:
+            self.max_gap = max_gap
+            self.plans.clear()
+
+    def get_plan(self, key, find_registers):
+        """Return the cached plan for key, building it if needed"""
+
+        if key in self.plans:
+            self.plans.move_to_end(key)
+            return self.plans[key]
+
+        plan = self.plan(find_registers())
+        self.plans[key] = plan
+
+        if len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+
+        return plan
+
+    def plan(self, registers):
+        """Return a list of blocks covering registers"""
+
+        unique = {id(reg): reg for reg in registers}.values()
+        sorted_regs = sorted(unique, key=lambda x: (x.address, x.words))
+
+        blocks = []
+
+        for reg in sorted_regs:
+            if blocks:
+                block = blocks[-1]
+                end = max(block.end, reg.address + reg.words)
+                if (
+                    reg.address <= block.end + self.max_gap
+                    and end - block.address <= self.max_block_words
+                ):
+                    block.add(reg)
+                    continue
+            blocks.append(ReadBlock(reg))
+
+        return blocks
+
+
 class Groups:
     """Register Groups"""
 
@@ -149,6 +240,11 @@ class Groups:
 
         return self.groups[group_name].get_blocks()
 
+    def get_registers(self, group_name):
+        """Get registers in a group"""
+
+        return self.groups[group_name].registers
+
     def list_groups(self):
         """List group names"""
 
@@ -182,6 +278,7 @@ class RegisterMap(ABC):
         ABC.__init__(self)
 
         self.groups = Groups()
+        self.planner = ReadPlanner()
         self.load(filename)
 
     @abstractmethod
@@ -219,6 +316,27 @@ class RegisterMap(ABC):
 
         return self.get_register_block(path)[0]
 
+    def set_max_gap(self, max_gap):
+        """Set the largest unused address gap bridged when reading"""
+
+        self.planner.set_max_gap(max_gap)
+
+    def get_read_plan(self, group_names=(), paths=()):
+        """Return the read blocks covering groups and register paths"""
+
+        group_names = tuple(sorted(set(group_names)))
+        paths = tuple(sorted(set(paths)))
+
+        def find_registers():
+            registers = []
+            for group_name in group_names:
+                registers.extend(self.groups.get_registers(group_name))
+            for path in paths:
+                registers.append(self.get_register(path))
+            return registers
+
+        return self.planner.get_plan((group_names, paths), find_registers)
+
 
 def test(registermap):
     """Test application"""
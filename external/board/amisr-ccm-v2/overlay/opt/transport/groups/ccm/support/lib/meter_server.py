@@ -18,19 +18,44 @@
 #   2023-08-28  Todd Valentic
 #               Switch to async meter reading
 #
+#   2026-10-16  Todd Valentic
+#               Run a persistent event loop in a background thread
+#                   so meter connections can be kept open.
+#               Add idle.timeout and reconnect.backoff parameters
+#               Add read.max_gap parameter
+#               Merge partial updates into the cache entry instead of
+#                   putting the full state (was always put to "genset"
+#                   instead of the service name).
+#               Read the network list through CacheMirror
+#               Time RPC calls (get_stats)
+#               Add timeout and retries parameters for meters. Calls into
+#                   the event loop are cancelled after call.timeout
+#                   (derived from the meter timeouts if not set).
+#               retries must be at least 2. call.timeout defaults to
+#                   CALL_REQUESTS * retries * timeout.
+#
 ##########################################################################
 
 import asyncio
+import concurrent.futures
 import functools
 import importlib
 import sys
+import threading
 
-from datatransport import ProcessClient, ConfigComponent, Directory, XMLRPCServer
+from datatransport import ProcessClient, ConfigComponent, Directory
 
 from pymodbus.exceptions import ModbusException
 
+from cache_mirror import CacheMirror
+from instrument import InstrumentedServer
 from state_cache import StateCache
 
+# Default call.timeout, in meter requests. Each request can take up to
+# the meter's retries * timeout.
+
+CALL_REQUESTS = 10
+
 
 def valid_meter_name(func):
     """Decorator to ensure meter_name is valid"""
@@ -73,12 +98,39 @@ class Meter(ConfigComponent):
 
         kw = dict(entry.split("=") for entry in extra)
 
+        max_idle = self.config.get_timedelta("idle.timeout", "1m")
+        backoff_min = self.config.get_timedelta("reconnect.backoff.min", "1s")
+        backoff_max = self.config.get_timedelta("reconnect.backoff.max", "1m")
+        max_gap = self.config.get_int("read.max_gap", 0)
+        # pymodbus waits up to retries * timeout for a response on the
+        # same request, it is never resent. With fewer than 2 retries
+        # pymodbus 3.4.1 reports every read as failed.
+
+        timeout = self.config.get_timedelta("timeout", "3s")
+        retries = self.config.get_int("retries", 3)
+
+        if retries < 2:
+            self.abort(f"retries must be at least 2, got {retries}")
+
+        self.request_timeout = timeout.total_seconds() * retries
+
         module_name, class_name = self.config.get("type").rsplit(".", 1)
 
         module = importlib.import_module(module_name)
         factory = getattr(module, class_name)
 
-        self.meter = factory(self.registermap, self.host, port=port, **kw)
+        self.meter = factory(
+            self.registermap,
+            self.host,
+            port=port,
+            max_idle=max_idle.total_seconds(),
+            backoff_min=backoff_min.total_seconds(),
+            backoff_max=backoff_max.total_seconds(),
+            max_gap=max_gap,
+            timeout=timeout.total_seconds(),
+            retries=retries,
+            **kw,
+        )
 
         self.log.info("Connect to %s:%s", self.host, port)
 
@@ -136,8 +188,11 @@ class MeterService(ProcessClient):
 
         self.directory = Directory(self)
 
-        self.xmlserver = XMLRPCServer(self)
-        self.main = self.xmlserver.main
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+
+        self.xmlserver = InstrumentedServer(self, callback=self.close_idle_connections)
         self.service_name = self.config.get("service.name")
 
         self.xmlserver.register_function(self.get_state)
@@ -159,6 +214,7 @@ class MeterService(ProcessClient):
         self.xmlserver.register_function(self.write_register_addr)
 
         self.cache = self.directory.connect("cache")
+        self.cache_mirror = CacheMirror(self.cache)
         self.meters = self.config.get_components("meters", factory=Meter)
 
         cache_timeout = self.config.get_timedelta("cache.timeout", "5m")
@@ -167,6 +223,53 @@ class MeterService(ProcessClient):
 
         self.local_cache = StateCache()
 
+        call_timeout = self.config.get_timedelta("call.timeout")
+
+        if call_timeout:
+            self.call_timeout = call_timeout.total_seconds()
+        elif self.meters:
+            request_timeout = max(
+                meter.request_timeout for meter in self.meters.values()
+            )
+            self.call_timeout = request_timeout * CALL_REQUESTS
+        else:
+            self.call_timeout = None
+
+    def main(self):
+        """Main application"""
+
+        try:
+            self.xmlserver.main()
+        finally:
+            self.run_async(self.close_connections())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join()
+
+    def run_async(self, coro):
+        """Run coroutine in the service event loop and wait for the result"""
+
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+        try:
+            return future.result(timeout=self.call_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(
+                f"Meter call timed out after {self.call_timeout}s"
+            ) from None
+
+    def close_idle_connections(self):
+        """Close meter connections that have been idle"""
+
+        for meter in self.meters.values():
+            self.loop.call_soon_threadsafe(meter.connection.close_idle)
+
+    async def close_connections(self):
+        """Close all meter connections"""
+
+        for meter in self.meters.values():
+            meter.close()
+
     def log_cache(self, *args):
         """Log cache activity"""
 
@@ -218,7 +321,7 @@ class MeterService(ProcessClient):
     def read_register_path(self, meter_name, path):
         """Read register at meter path"""
 
-        return asyncio.run(self.meters[meter_name].read_register_path(path))
+        return self.run_async(self.meters[meter_name].read_register_path(path))
 
     @valid_meter_name
     def read_register_addr(self, meter_name, addr, num_words=1):
@@ -227,7 +330,7 @@ class MeterService(ProcessClient):
         addr = int(addr)
         num_words = int(num_words)
 
-        return asyncio.run(self.meters[meter_name].read_registers_addr(addr, num_words))
+        return self.run_async(self.meters[meter_name].read_registers_addr(addr, num_words))
 
     @valid_meter_name
     def write_register_path(self, meter_name, path, *values):
@@ -235,7 +338,7 @@ class MeterService(ProcessClient):
 
         values = [int(x) for x in values]
 
-        return asyncio.run(self.meters[meter_name].write_register_path(path, *values))
+        return self.run_async(self.meters[meter_name].write_register_path(path, *values))
 
     @valid_meter_name
     def write_register_addr(self, meter_name, addr, *values):
@@ -244,13 +347,13 @@ class MeterService(ProcessClient):
         addr = int(addr)
         values = [int(x) for x in values]
 
-        return asyncio.run(self.meters[meter_name].write_register_addr(addr, *values))
+        return self.run_async(self.meters[meter_name].write_register_addr(addr, *values))
 
     @valid_meter_name
     def read_group(self, meter_name, group_name):
         """Read registers in meter group"""
 
-        return asyncio.run(self.meters[meter_name].read_group(group_name))
+        return self.run_async(self.meters[meter_name].read_group(group_name))
 
     @valid_meter_name_or_all
     def control(self, meter_name, cmd):
@@ -263,7 +366,7 @@ class MeterService(ProcessClient):
 
         self.log.info("Control: %s %s", meter_name, cmd)
 
-        results = asyncio.run(self.run_meter_command(meters, "control", cmd))
+        results = self.run_async(self.run_meter_command(meters, "control", cmd))
 
         if meter_name == "all":
             return results 
@@ -322,7 +425,7 @@ class MeterService(ProcessClient):
             meter = self.meters[meter_name]
             meterpaths[meter] = pathlist
 
-        results = asyncio.run(self.read_meter_paths(meterpaths))
+        results = self.run_async(self.read_meter_paths(meterpaths))
 
         output = {}
 
@@ -332,7 +435,8 @@ class MeterService(ProcessClient):
                 output[meter_name] = values
 
         self.local_cache.update(state)
-        self.cache.put("genset", state)
+        if not self.cache.merge(self.service_name, {"meters": output}):
+            self.cache.put(self.service_name, state)
 
         self.log_cache("Update state cache %s", list(output))
 
@@ -369,7 +473,7 @@ class MeterService(ProcessClient):
     def get_online_meters(self):
         """Return list of meters that are online"""
 
-        hosts_online = self.cache.get_or_default("network", None)
+        hosts_online = self.cache_mirror.get("network")
 
         if not hosts_online:
             return None
@@ -402,7 +506,7 @@ class MeterService(ProcessClient):
 
         self.log_cache("Read new state")
 
-        readings = asyncio.run(self.read_meter_states(online_meters))
+        readings = self.run_async(self.read_meter_states(online_meters))
 
         for values in readings:
             state["meters"].update(values)
@@ -18,25 +18,220 @@
 #               Use context manager for connection
 #               Add virtual registers
 #
+#   2026-10-16  Todd Valentic
+#               Keep persistent connections (ModbusConnection). The
+#                   client is rebuilt if the event loop changes, on
+#                   errors or after being idle too long. Failed
+#                   connects back off. Requests are serialized.
+#               Read using the register map read plan. Decode each
+#                   response buffer in one pass using cached struct
+#                   unpackers (make_unpacker) instead of decode().
+#               Options after host are keyword only. Read helpers are
+#                   private.
+#               Close the client when the connection drops instead of
+#                   letting pymodbus reconnect in a tight loop
+#                   (ModbusClient). Also close it if a request is
+#                   cancelled part way through. Request timeouts raise
+#                   ModbusIOException (pymodbus raises CancelledError).
+#
 ##########################################################################
 
+import asyncio
+import struct
+import time
+
 from contextlib import asynccontextmanager
 from functools import partial
 
 from pymodbus.client import AsyncModbusTcpClient
-from pymodbus.payload import BinaryPayloadDecoder
+from pymodbus.exceptions import ModbusException, ModbusIOException
+
+
+def unpack_struct(fmt):
+    """Return unpacker for a single struct value"""
+
+    unpacker = struct.Struct(fmt)
+
+    def unpack(buffer, offset):
+        return unpacker.unpack_from(buffer, offset)[0]
+
+    return unpack
+
+
+def unpack_string(num_bytes, strip="\x00"):
+    """Return unpacker for a fixed length string"""
+
+    def unpack(buffer, offset):
+        value = buffer[offset : offset + num_bytes].decode("utf-8")
+        return value.rstrip(strip) if strip else value
+
+    return unpack
+
+
+class ModbusClient(AsyncModbusTcpClient):
+    """TCP client that closes when the connection is lost.
+
+    pymodbus starts its own reconnect task when the connection drops
+    or a request times out. With a zero reconnect delay that retries
+    without waiting. ModbusConnection reconnects with a backoff and
+    reruns access() instead.
+    """
+
+    def connection_lost(self, reason):
+        """Close instead of reconnecting"""
+
+        if not self.transport or self.is_closing:
+            return
+
+        self.transport_close()
+        self.callback_disconnected(reason)
+
+
+class ModbusConnection:
+    """Persistent connection to a modbus host"""
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self, host, access, *, max_idle=60, backoff_min=1, backoff_max=60, **kwargs
+    ):
+        self.host = host
+        self.access = access
+        self.max_idle = max_idle
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.kwargs = kwargs
+
+        self.client = None
+        self.loop = None
+        self.lock = None
+        self.last_used = 0
+        self.backoff = 0
+        self.retry_time = 0
+
+    def is_idle(self):
+        """Connection has not been used within max_idle secs"""
+
+        return time.monotonic() - self.last_used >= self.max_idle
+
+    def close(self):
+        """Close the current client"""
+
+        if self.client:
+            self.client.close()
+            self.client = None
+
+    def close_idle(self):
+        """Close the client if it is idle and not in use"""
+
+        if self.client and self.is_idle() and not self.lock.locked():
+            self.close()
+
+    async def connect(self):
+        """Return a connected client, reusing the current one if possible"""
+
+        if self.client and self.client.connected and not self.is_idle():
+            return self.client
+
+        self.close()
+
+        now = time.monotonic()
+
+        if now < self.retry_time:
+            raise IOError(
+                f"Failed to connect to {self.host}, "
+                f"retry in {self.retry_time - now:.0f}s"
+            )
+
+        client = ModbusClient(self.host, **self.kwargs)
+
+        try:
+            await client.connect()
+            if not client.connected:
+                raise IOError(f"Failed to connect to {self.host}")
+            await self.access(client)
+        except (OSError, ModbusException):
+            client.close()
+            self.backoff = min(max(self.backoff * 2, self.backoff_min), self.backoff_max)
+            self.retry_time = now + self.backoff
+            raise
+
+        self.backoff = 0
+        self.retry_time = 0
+        self.client = client
+
+        return client
+
+    @asynccontextmanager
+    async def session(self):
+        """Serialized access to the connected client"""
+
+        loop = asyncio.get_running_loop()
+
+        # Clients and locks are bound to the loop they were first used in
+
+        if loop is not self.loop:
+            self.client = None
+            self.lock = asyncio.Lock()
+            self.loop = loop
+
+        async with self.lock:
+            client = await self.connect()
+
+            try:
+                yield client
+            except (OSError, ModbusException):
+                self.close()
+                raise
+            except asyncio.CancelledError:
+                # Don't leave a half finished request on the client
+                self.close()
+
+                if asyncio.current_task().cancelling():
+                    raise
+
+                # pymodbus cancels the response future when a request
+                # times out and then raises CancelledError on the retry
+
+                raise ModbusIOException(f"No response from {self.host}") from None
+            finally:
+                self.last_used = time.monotonic()
 
 
 class ModbusMeter:
     """Read Genset Status"""
 
-    def __init__(self, registers, host, unit=1, byteorder=">", **kwargs):
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self,
+        registers,
+        host,
+        *,
+        unit=1,
+        byteorder=">",
+        max_idle=60,
+        backoff_min=1,
+        backoff_max=60,
+        max_gap=0,
+        **kwargs,
+    ):
         self.registers = registers
         self.unit = unit
         self.byteorder = byteorder
         self.host = host
         self.kwargs = kwargs
         self.controls = {}
+        self.unpackers = {}
+        self.registers.set_max_gap(max_gap)
+        self.connection = ModbusConnection(
+            host,
+            self.access,
+            max_idle=max_idle,
+            backoff_min=backoff_min,
+            backoff_max=backoff_max,
+            **kwargs,
+        )
 
     def add_control(self, name, func, *args, **kwargs):
         """Add a control function"""
@@ -68,23 +263,15 @@ class ModbusMeter:
 
         return self.registers.get_register(path)
 
-    @asynccontextmanager
-    async def modbus_connect(self, *args, **kwargs):
+    def modbus_connect(self):
         """Managed connection"""
 
-        client = AsyncModbusTcpClient(*args, **kwargs)
-
-        await client.connect()
+        return self.connection.session()
 
-        if not client.connected:
-            raise IOError("Failed to connect")
+    def close(self):
+        """Close the connection"""
 
-        await self.access(client)
-
-        try:
-            yield client
-        finally:
-            client.close()
+        self.connection.close()
 
     async def access(self, _client):
         """Handle access code on devices that need it"""
@@ -95,40 +282,29 @@ class ModbusMeter:
     async def read_register_paths(self, paths):
         """Read multiple register paths"""
 
-        results = []
+        plan = self.registers.get_read_plan(paths=paths)
 
-        async with self.modbus_connect(self.host, **self.kwargs) as client:
-            for path in paths:
-                block = self.registers.get_register_block(path)
-                data = await self.read_block(client, block)
-                results.extend(data)
-
-        return results
+        async with self.modbus_connect() as client:
+            return await self._read_plan(client, plan)
 
     async def read_register_path(self, path):
         """Read a register at path"""
 
-        async with self.modbus_connect(self.host, **self.kwargs) as client:
-            block = self.registers.get_register_block(path)
-            data = await self.read_block(client, block)
+        data = await self.read_register_paths([path])
 
         return data[0].value
 
     async def read_register_addr(self, addr, num_words):
         """Read registers at addr"""
 
-        async with self.modbus_connect(self.host, **self.kwargs) as client:
+        async with self.modbus_connect() as client:
             data = await client.read_holding_registers(
                 addr, count=num_words, slave=self.unit
             )
             if data.isError():
                 raise OSError(f"Exception: {data}")
 
-        decoder = BinaryPayloadDecoder.fromRegisters(
-            data.registers, byteorder=self.byteorder
-        )
-
-        return [decoder.decode_16bit_uint() for _ in range(num_words)]
+        return list(data.registers[:num_words])
 
     async def write_register_path(self, path, *values):
         """Write to single register"""
@@ -140,7 +316,7 @@ class ModbusMeter:
     async def write_register_addr(self, addr, *values):
         """Write to single register"""
 
-        async with self.modbus_connect(self.host, **self.kwargs) as client:
+        async with self.modbus_connect() as client:
             await self.authenticate(client)
             if len(values) > 1:
                 await client.write_registers(addr, values, slave=self.unit)
@@ -152,62 +328,74 @@ class ModbusMeter:
     async def read_group(self, group_name):
         """Read status for a group"""
 
-        async with self.modbus_connect(self.host, **self.kwargs) as client:
-            data = []
-            for block in self.registers.get_register_blocks(group_name):
-                values = await self.read_block(client, block)
-                data.extend(values)
+        plan = self.registers.get_read_plan(group_names=[group_name])
 
-        return data
+        async with self.modbus_connect() as client:
+            return await self._read_plan(client, plan)
 
     async def read_groups(self, group_names):
         """Read multiple groups"""
 
-        async with self.modbus_connect(self.host, **self.kwargs) as client:
-            results = {}
+        plan = self.registers.get_read_plan(group_names=group_names)
 
-            for group_name in group_names:
-                data = []
-                for block in self.registers.get_register_blocks(group_name):
-                    values = await self.read_block(client, block)
-                    data.extend(values)
-                results.update({reg.path: reg for reg in data})
+        async with self.modbus_connect() as client:
+            data = await self._read_plan(client, plan)
 
-        return results
+        return {reg.path: reg for reg in data}
 
     async def read_virtual(self, _state):
         """Compute virtual register values from existing data"""
 
         return None
 
-    def decode(self, _decoder, _reg):
-        """Decoder"""
-        return 0
+    def make_unpacker(self, _reg):
+        """Return function(buffer, offset) to decode a register.
 
-    async def read_block(self, client, block):
-        """Read holding registers in a block"""
+        Filled in by child classes. Use unpack_struct() and
+        unpack_string() to build them.
+        """
 
-        addr = block[0].address
-        num_words = sum(reg.words for reg in block)
+        return lambda _buffer, _offset: 0
 
-        data = await client.read_holding_registers(addr, num_words, slave=self.unit)
+    def _get_unpacker(self, reg):
+        """Return the cached unpacker for a register type"""
 
-        if data.isError():
-            raise OSError(f"Exception: {data}")
+        key = (reg.type, reg.words)
 
-        decoder = BinaryPayloadDecoder.fromRegisters(
-            data.registers, byteorder=self.byteorder
-        )
+        if key not in self.unpackers:
+            self.unpackers[key] = self.make_unpacker(reg)
+
+        return self.unpackers[key]
+
+    async def _read_plan(self, client, plan):
+        """Read all of the blocks in a read plan"""
 
         results = []
 
-        for reg in block:
-            value = self.decode(decoder, reg)
-            reg.set(value)
-            results.append(reg)
+        for block in plan:
+            values = await self._read_block(client, block)
+            results.extend(values)
 
         return results
 
+    async def _read_block(self, client, block):
+        """Read holding registers in a block"""
+
+        data = await client.read_holding_registers(
+            block.address, block.words, slave=self.unit
+        )
+
+        if data.isError():
+            raise OSError(f"Exception: {data}")
+
+        buffer = struct.pack(f">{len(data.registers)}H", *data.registers)
+
+        for offset, reg in block.offsets():
+            value = self._get_unpacker(reg)(buffer, offset)
+            reg.set(value)
+
+        return block.registers
+
     async def control(self, cmd):
         """Run control command"""
 
@@ -8,8 +8,14 @@
 #   2023-08-07  Todd Valentic
 #               Initial implementation. Generalized from system group.
 #
+#   2026-10-16  Todd Valentic
+#               Step when the next monitor has a sample or schedule
+#                   change due. steprate is only used if there are no
+#                   monitors or a monitor fails to report its wait.
+#
 ##########################################################################
 
+import datetime
 import importlib
 import sys
 
@@ -42,6 +48,28 @@ class DataMonitorShell(ProcessClient):
 
         return factory(name, config, parent, **kw)
 
+    def get_step_wait(self):
+        """Time to wait until the next monitor step"""
+
+        if self.steprate.at_start:
+            self.steprate.at_start = False
+            return datetime.timedelta(0)
+
+        now = self.now()
+        waits = []
+
+        for monitor in self.monitors.values():
+            try:
+                waits.append(monitor.get_step_wait())
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.log.exception("Failed to get step time for %s", monitor.name)
+                waits.append(self.steprate.nexttime(now))
+
+        if not waits:
+            return self.steprate.nexttime(now)
+
+        return min(waits)
+
     def main(self):
         """Main application"""
 
@@ -51,7 +79,7 @@ class DataMonitorShell(ProcessClient):
         steppers = [monitor.step() for monitor in self.monitors.values()]
         rate = Rate(60, True, 0, True)
 
-        while self.wait(self.steprate):
+        while self.wait(self.get_step_wait()):
             for stepper in steppers:
                 try:
                     next(stepper)
@@ -23,65 +23,50 @@
 #   2023-07-05  Todd Valentic
 #               Updated for transport3 / python3
 #
+#   2026-10-16  Todd Valentic
+#               Wait until the next schedule event (get_step_wait)
+#               Use DataMonitorBase main()
+#               Use the SolarMixin location lookup and solar tables
+#                   for the solar angle and setting time instead of
+#                   ephem
+#               Wake at the next setting or rising (next_state_change)
+#
 ##########################################################################
 
 import sys
-import pytz
-
-import ephem
 
 from datatransport import ProcessClient
 from datatransport import ConfigComponent
 
 from datamonitor import DataMonitorBase
+from solar_mixin import SolarMixin
 
 
-class NightDataMonitorBase(DataMonitorBase):
+class NightDataMonitorBase(SolarMixin, DataMonitorBase):
     """Night Data Monitor Base Class"""
 
     def __init__(self):
         DataMonitorBase.__init__(self)
-
-        self.report_missing_location = True
-        self.location = self.directory.connect("location")
+        SolarMixin.__init__(self)
 
     def check_window(self):
         """check if in window"""
-        # pylint: disable=too-many-return-statements
 
         schedule = self.cur_schedule
-        location = self.location.best()
 
-        if not location:
-            # Report missing data once so we don't spam the log
-            if self.report_missing_location:
-                self.report_missing_location = False
-                self.log.info("No location data.")
+        if not self.update_location():
             return False
 
-        # We have a good position, reset flag
-        self.report_missing_location = True
-
         if schedule.min_solar_angle is None:
             # Nothing to do
             return False
 
+        now = self.now()
         offset_time = schedule.get_timedelta("start.offset")
 
-        sun = ephem.Sun()
-
-        station = ephem.Observer()
-        station.lat = str(location["latitude"])
-        station.lon = str(location["longitude"])
-        station.date = ephem.now()
-        station.horizon = str(schedule.min_solar_angle)
-
-        self.log.debug("Station: %s", station)
-
         # If the sun is already set, then turn on
 
-        sun.compute(station)
-        solar_angle = float(sun.alt) * 180 / ephem.pi
+        solar_angle = self.solar.altitude(now)
 
         self.log.debug("Checking solar angle: %s", solar_angle)
 
@@ -89,24 +74,21 @@ class NightDataMonitorBase(DataMonitorBase):
             self.log.debug("  - sun is below min elevation. Turn on")
             return True
 
-        # If we are approaching sunset, check the offset time
+        # If we are approaching sunset, check the offset time. The sun
+        # is above min elevation, so the next crossing is the setting.
 
         if offset_time is not None:
             self.log.debug("Checking sunset time with offset %s", offset_time)
 
-            try:
-                next_setting = station.next_setting(sun, use_center=True)
-                self.log.debug("  next setting at %s", next_setting)
-            except ephem.AlwaysUpError:
+            next_setting = self.solar.next_crossing(now, schedule.min_solar_angle)
+
+            if next_setting is None:
                 self.log.debug("  sun is always up. Turn off.")
                 return False
-            except ephem.NeverUpError:
-                self.log.debug("  sun is never up. Turn on.")
-                return True
 
-            next_setting = next_setting.datetime().replace(tzinfo=pytz.utc)
+            self.log.debug("  next setting at %s", next_setting)
 
-            if self.currentTime() >= (next_setting - offset_time):
+            if now >= next_setting - offset_time:
                 self.log.debug("  in pre-sunset time window. Turn on")
                 return True
 
@@ -114,6 +96,29 @@ class NightDataMonitorBase(DataMonitorBase):
 
         return False
 
+    def next_state_change(self, now):
+        """Next time that check_window() may change (or None)"""
+
+        schedule = self.cur_schedule
+
+        if not schedule or schedule.min_solar_angle is None:
+            return None
+
+        if not self.solar.has_location():
+            return None
+
+        crossing = self.solar.next_crossing(now, schedule.min_solar_angle)
+
+        if crossing is None:
+            return None
+
+        offset_time = schedule.get_timedelta("start.offset")
+
+        if offset_time is not None and crossing - offset_time > now:
+            return crossing - offset_time
+
+        return crossing
+
 
 class NightDataMonitorComponent(NightDataMonitorBase, ConfigComponent):
     """Night Data Monitor Component"""
@@ -130,13 +135,6 @@ class NightDataMonitor(NightDataMonitorBase, ProcessClient):
         ProcessClient.__init__(self, argv)
         NightDataMonitorBase.__init__(self)
 
-    def main(self):
-        """Main application loop"""
-
-        for _step in self.step():
-            if not self.wait(self.schedule_rate):
-                break
-
 
 if __name__ == "__main__":
     NightDataMonitor(sys.argv).run()
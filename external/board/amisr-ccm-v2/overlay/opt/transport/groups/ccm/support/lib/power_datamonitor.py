@@ -16,6 +16,12 @@
 #   2023-07-017 Todd Valentic
 #               Updated for transport3 / python3
 #
+#   2026-10-16  Todd Valentic
+#               Wait until the next schedule event (get_step_wait)
+#               Fix get_cache call for sunsaver data
+#               Use DataMonitorBase main()
+#               Always poll at schedule.rate for power changes
+#
 ##########################################################################
 
 import sys
@@ -34,7 +40,6 @@ class PowerDataMonitorBase(DataMonitorBase):
     def __init__(self):
         DataMonitorBase.__init__(self)
 
-        self.report_missing_location = True
         self.report_state = None
 
     def when_on(self):
@@ -68,10 +73,15 @@ class PowerDataMonitorBase(DataMonitorBase):
 
         DataMonitorBase.when_on(self)
 
+    def needs_poll(self):
+        """Power level changes can only be seen by polling"""
+
+        return True
+
     def get_power_watts(self):
         """Get output power (W)"""
 
-        rawdata = self.get_cache.get("sunsaver")
+        rawdata = self.get_cache("sunsaver")
 
         if rawdata is None:
             return 0
@@ -112,13 +122,6 @@ class PowerDataMonitor(PowerDataMonitorBase, ProcessClient):
         ProcessClient.__init__(self, argv)
         PowerDataMonitorBase.__init__(self)
 
-    def main(self):
-        """Main application loop"""
-
-        for _step in self.step():
-            if not self.wait(self.schedule_rate):
-                break
-
 
 if __name__ == "__main__":
     PowerDataMonitor(sys.argv).run()
@@ -38,8 +38,17 @@
 #               Updates for transport3 / python3
 #               Replace ExtendedConfigParser with sapphire.Parser
 #
+#   2026-10-16  Todd Valentic
+#               Parse time.start/time.stop once per year (get_span).
+#               Match schedules (time.stop or time.span) that wrap past
+#                   the end of the year.
+#               Compile schedules into a ScheduleTimeline so match()
+#                   is a lookup and next_transition() can be found.
+#               Add next_window_change() and is_repeat_day()
+#
 ##########################################################################
 
+import bisect
 import configparser
 import datetime
 import glob
@@ -83,23 +92,27 @@ class Schedule:
         self.window_rate = self.get_rate("window")
         self.window_span = self.get_timedelta("window.span", 60)
 
-    def match(self, target_time):
-        """Schedule is active for target_time"""
+        self.spans = {}
 
-        now = datetime.datetime.now()
-        this_year = datetime.datetime(now.year, 1, 1)
+    def parse_time(self, value, year):
+        """Parse a time.start/time.stop value, default to year"""
 
         try:
-            start_time = dateparser.parse(self.start_time, default=this_year)
-            start_time = start_time.replace(tzinfo=utc)
+            timestamp = dateparser.parse(value, default=datetime.datetime(year, 1, 1))
         except (dateparser.ParserError, TypeError):
-            start_time = None
+            return None
 
-        try:
-            stop_time = dateparser.parse(self.stop_time, default=this_year)
-            stop_time = stop_time.replace(tzinfo=utc)
-        except (dateparser.ParserError, TypeError):
-            stop_time = None
+        return timestamp.replace(tzinfo=utc)
+
+    def get_span(self, year):
+        """Return (start, stop, wrapped) for the schedule in year"""
+
+        if year in self.spans:
+            return self.spans[year]
+
+        start_time = self.parse_time(self.start_time, year)
+        stop_time = self.parse_time(self.stop_time, year)
+        wrapped = False
 
         if start_time and not stop_time and self.timespan:
             stop_time = start_time + self.timespan
@@ -107,22 +120,68 @@ class Schedule:
         if start_time and stop_time:
             if stop_time < start_time:
                 stop_time += relativedelta(years=1)
+            wrapped = stop_time.year > year
+
+        self.spans[year] = (start_time, stop_time, wrapped)
 
-        if start_time and target_time < start_time:
-            return False
+        return self.spans[year]
+
+    def match(self, target_time):
+        """Schedule is active for target_time"""
+
+        for year in (target_time.year, target_time.year - 1):
+            start_time, stop_time, wrapped = self.get_span(year)
+
+            if year != target_time.year and not wrapped:
+                continue
+
+            if start_time and target_time < start_time:
+                continue
+
+            if stop_time and target_time >= stop_time:
+                continue
+
+            return True
 
-        if stop_time and target_time >= stop_time:
-            return False
+        return False
 
-        return True
+    def boundaries(self, year):
+        """Start and stop times from spans that can overlap year"""
 
-    def in_window(self):
+        results = []
+
+        for span_year in (year - 1, year):
+            start_time, stop_time, _wrapped = self.get_span(span_year)
+            results.extend(t for t in (start_time, stop_time) if t)
+
+        return results
+
+    def is_repeat_day(self, target_time):
+        """Check if target_time falls on a repeat.days day"""
+
+        if not self.repeat_days:
+            return True
+
+        return target_time.timetuple().tm_yday % self.repeat_days == 0
+
+    def in_window(self, target_time=None):
         """Currently in this schedule's window"""
 
         if not self.window_rate:
             return True
 
-        now = time.time()
+        if target_time is None:
+            now = time.time()
+        else:
+            now = target_time.timestamp()
+
+        start_time, stop_time = self.get_window(now)
+
+        return start_time <= now < stop_time
+
+    def get_window(self, now):
+        """Window (start, stop) unix times for the period holding now"""
+
         period = self.window_rate.period.total_seconds()
         offset = self.window_rate.offset.total_seconds()
         span = self.window_span.total_seconds()
@@ -131,7 +190,85 @@ class Schedule:
         start_time = interval + offset
         stop_time = start_time + span
 
-        return start_time <= now < stop_time
+        return start_time, stop_time
+
+    def next_window_change(self, target_time):
+        """Time of the next window open or close after target_time"""
+
+        if not self.window_rate:
+            return None
+
+        now = target_time.timestamp()
+        start_time, stop_time = self.get_window(now)
+
+        if now < start_time:
+            next_time = start_time
+        elif now < stop_time:
+            next_time = stop_time
+        else:
+            next_time = start_time + self.window_rate.period.total_seconds()
+
+        return datetime.datetime.fromtimestamp(next_time, utc)
+
+
+class ScheduleTimeline:
+    """Active schedule index for one year"""
+
+    def __init__(self, schedules, year):
+        self.year = year
+        self.start_time = datetime.datetime(year, 1, 1, tzinfo=utc)
+        self.stop_time = datetime.datetime(year + 1, 1, 1, tzinfo=utc)
+
+        boundaries = {self.start_time}
+
+        for schedule in schedules:
+            for timestamp in schedule.boundaries(year):
+                if self.start_time < timestamp < self.stop_time:
+                    boundaries.add(timestamp)
+
+        # Segments start at each boundary where the active schedule changes
+
+        self.times = []
+        self.active = []
+
+        for timestamp in sorted(boundaries):
+            schedule = self.find(schedules, timestamp)
+            if self.active and schedule is self.active[-1]:
+                continue
+            self.times.append(timestamp)
+            self.active.append(schedule)
+
+    @staticmethod
+    def find(schedules, target_time):
+        """Find first schedule that is active for target_time"""
+
+        for schedule in schedules:
+            if schedule.match(target_time):
+                return schedule
+
+        return None
+
+    def contains(self, target_time):
+        """Timeline covers target_time"""
+
+        return self.start_time <= target_time < self.stop_time
+
+    def match(self, target_time):
+        """Active schedule at target_time"""
+
+        index = bisect.bisect_right(self.times, target_time) - 1
+
+        return self.active[index]
+
+    def next_transition(self, target_time):
+        """Time the active schedule next changes (or timeline end)"""
+
+        index = bisect.bisect_right(self.times, target_time)
+
+        if index < len(self.times):
+            return self.times[index]
+
+        return self.stop_time
 
 
 class ScheduleManager:
@@ -141,6 +278,7 @@ class ScheduleManager:
         self.log = log
         self.filetimes = {}
         self.schedules = []
+        self.timeline = None
 
     def load(self, filenames):
         """Load schedule files"""
@@ -148,6 +286,7 @@ class ScheduleManager:
         self.log.info("Loading schedules:")
 
         self.schedules = []
+        self.timeline = None
 
         config = sapphire.Parser()
 
@@ -204,11 +343,20 @@ class ScheduleManager:
 
         return reload
 
+    def get_timeline(self, target_time):
+        """Return the compiled timeline covering target_time"""
+
+        if not self.timeline or not self.timeline.contains(target_time):
+            self.timeline = ScheduleTimeline(self.schedules, target_time.year)
+
+        return self.timeline
+
     def match(self, target_time):
         """Find first schedule that is active for target_time"""
 
-        for schedule in self.schedules:
-            if schedule.match(target_time):
-                return schedule
+        return self.get_timeline(target_time).match(target_time)
 
-        return None
+    def next_transition(self, target_time):
+        """Time when the matching schedule may next change"""
+
+        return self.get_timeline(target_time).next_transition(target_time)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Solar geometry cache"""
+
+##########################################################################
+#
+#   Solar geometry cache
+#
+#   Precompute the solar transit times and a sampled solar altitude
+#   table for each UTC day at a location. Altitudes between samples
+#   are linearly interpolated and crossing times for a given altitude
+#   are found from the table, so callers do not need to run ephem on
+#   every check. The cache is cleared when the location moves more
+#   than a threshold distance.
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation
+#
+##########################################################################
+
+import bisect
+import datetime
+import math
+
+import ephem
+
+utc = datetime.timezone.utc
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great circle distance between two points"""
+
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def to_datetime(date):
+    """Convert ephem.Date to UTC datetime"""
+
+    return date.datetime().replace(tzinfo=utc)
+
+
+class SolarDay:
+    """Solar geometry for one location and UTC day"""
+
+    def __init__(self, latitude, longitude, day, step=300):
+        self.day = day
+        self.start_time = datetime.datetime(day.year, day.month, day.day, tzinfo=utc)
+        self.stop_time = self.start_time + datetime.timedelta(days=1)
+        self.crossings = {}
+
+        sun = ephem.Sun()
+
+        station = ephem.Observer()
+        station.lat = str(latitude)
+        station.long = str(longitude)
+
+        # Altitude table, including both ends of the day
+
+        start = self.start_time.timestamp()
+        num_samples = int(86400 / step) + 1
+
+        self.times = [start + k * step for k in range(num_samples)]
+        self.altitudes = []
+
+        for timestamp in self.times:
+            station.date = datetime.datetime.fromtimestamp(timestamp, utc)
+            sun.compute(station)
+            self.altitudes.append(math.degrees(float(sun.alt)))
+
+        # Transits from the one before the day to the one after
+
+        station.date = self.start_time
+        self.transits = [to_datetime(station.previous_transit(sun))]
+
+        while self.transits[-1] < self.stop_time:
+            station.date = ephem.Date(self.transits[-1]) + ephem.minute
+            self.transits.append(to_datetime(station.next_transit(sun)))
+
+    def altitude(self, target_time):
+        """Interpolated solar altitude (deg) at target_time"""
+
+        timestamp = target_time.timestamp()
+        index = bisect.bisect_right(self.times, timestamp) - 1
+        index = min(max(index, 0), len(self.times) - 2)
+
+        t0, t1 = self.times[index], self.times[index + 1]
+        a0, a1 = self.altitudes[index], self.altitudes[index + 1]
+
+        return a0 + (a1 - a0) * (timestamp - t0) / (t1 - t0)
+
+    def previous_transit(self, target_time):
+        """Last transit at or before target_time"""
+
+        index = bisect.bisect_right(self.transits, target_time) - 1
+        return self.transits[max(index, 0)]
+
+    def next_transit(self, target_time):
+        """First transit after target_time"""
+
+        index = bisect.bisect_right(self.transits, target_time)
+        return self.transits[min(index, len(self.transits) - 1)]
+
+    def get_crossings(self, angle):
+        """Times during the day that the sun crosses angle"""
+
+        if angle in self.crossings:
+            return self.crossings[angle]
+
+        results = []
+
+        for index in range(len(self.times) - 1):
+            a0, a1 = self.altitudes[index], self.altitudes[index + 1]
+
+            if (a0 < angle) == (a1 < angle):
+                continue
+
+            t0, t1 = self.times[index], self.times[index + 1]
+            timestamp = t0 + (t1 - t0) * (angle - a0) / (a1 - a0)
+            results.append(datetime.datetime.fromtimestamp(timestamp, utc))
+
+        self.crossings[angle] = results
+
+        return results
+
+
+class SolarCache:
+    """Solar geometry tables keyed by location and UTC day"""
+
+    def __init__(self, threshold=1.0, step=300):
+        self.threshold = threshold
+        self.step = step
+        self.latitude = None
+        self.longitude = None
+        self.days = {}
+
+    def set_location(self, latitude, longitude):
+        """Set current position. Returns True if the tables were reset"""
+
+        if self.latitude is not None:
+            moved = distance_km(self.latitude, self.longitude, latitude, longitude)
+            if moved <= self.threshold:
+                return False
+
+        self.latitude = latitude
+        self.longitude = longitude
+        self.days = {}
+
+        return True
+
+    def has_location(self):
+        """A location has been set"""
+
+        return self.latitude is not None
+
+    def get_day(self, target_time):
+        """Return the SolarDay holding target_time"""
+
+        day = target_time.astimezone(utc).date()
+
+        if day not in self.days:
+            # Keep yesterday for lookups around midnight
+            yesterday = day - datetime.timedelta(days=1)
+            self.days = {k: v for k, v in self.days.items() if k >= yesterday}
+            self.days[day] = SolarDay(self.latitude, self.longitude, day, self.step)
+
+        return self.days[day]
+
+    def altitude(self, target_time):
+        """Solar altitude (deg) at target_time"""
+
+        return self.get_day(target_time).altitude(target_time)
+
+    def transits(self, target_time):
+        """Previous and next transit around target_time"""
+
+        solar_day = self.get_day(target_time)
+
+        return (
+            solar_day.previous_transit(target_time),
+            solar_day.next_transit(target_time),
+        )
+
+    def next_crossing(self, target_time, angle):
+        """Next time after target_time the sun crosses angle (or None)"""
+
+        for days in range(2):
+            when = target_time + datetime.timedelta(days=days)
+            for crossing in self.get_day(when).get_crossings(angle):
+                if crossing > target_time:
+                    return crossing
+
+        return None
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Solar window support for data monitors"""
+
+##########################################################################
+#
+#   Solar window support for data monitors
+#
+#   Mixed into the data monitors that follow the sun (solar, day/night
+#   and night). Looks up the position from the location service every
+#   location.rate and keeps a SolarCache (solar) for it. The solar
+#   tables are rebuilt when the position moves more than
+#   location.threshold (km).
+#
+#   2026-10-16  Todd Valentic
+#               Initial implementation. Split out of DataMonitorBase.
+#
+##########################################################################
+
+import time
+
+from solar_cache import SolarCache
+
+
+class SolarMixin:
+    """Location lookups and solar windows for a DataMonitorBase"""
+
+    def __init__(self):
+        self.location = None
+        self.location_rate = self.config.get_timedelta("location.rate", "5m")
+        self.location_time = None
+        self.last_location = None
+        self.report_missing_location = True
+
+        threshold = self.config.get_float("location.threshold", 1.0)
+        step = self.config.get_timedelta("solar.step", "5m")
+
+        self.solar = SolarCache(threshold, step.total_seconds())
+
+    # Location ###########################################################
+
+    def get_location(self):
+        """Return the position from the location service, refreshed
+        every location.rate. Returns None if no position is available.
+        """
+
+        if self.location is None:
+            self.location = self.directory.connect("location")
+
+        elapsed = time.monotonic() - (self.location_time or 0)
+
+        if self.location_time and elapsed < self.location_rate.total_seconds():
+            return self.last_location
+
+        self.location_time = time.monotonic()
+        self.last_location = self.location.best()
+
+        if not self.last_location:
+            # Report missing data once so we don't spam the log
+            if self.report_missing_location:
+                self.report_missing_location = False
+                self.log.info("No GPS or Iridium position data...")
+            return None
+
+        self.report_missing_location = True
+
+        return self.last_location
+
+    def update_location(self):
+        """Refresh the solar tables location. Returns False if no
+        position is available.
+        """
+
+        location = self.get_location()
+
+        if not location:
+            return False
+
+        if self.solar.set_location(location["latitude"], location["longitude"]):
+            self.log.info(
+                "Solar tables for %s, %s",
+                location["latitude"],
+                location["longitude"],
+            )
+
+        return True
+
+    # Solar window #######################################################
+
+    def in_timespan(self, now, transit, window):
+        """Check if now is in time span"""
+
+        if not self.cur_schedule.is_repeat_day(transit):
+            return False
+
+        return transit - window / 2 <= now < transit + window / 2
+
+    def in_solar_window(self, now):
+        """Check if now is in the schedule's solar window (transit
+        windows and solar angle limits)
+        """
+
+        # pylint: disable=too-many-return-statements
+
+        if not self.update_location():
+            return False
+
+        solar_angle = self.solar.altitude(now)
+        prev_transit, next_transit = self.solar.transits(now)
+
+        self.log.debug("  prev transit: %s", prev_transit)
+        self.log.debug("  next transit: %s", next_transit)
+        self.log.debug("  sun angle: %s", solar_angle)
+
+        schedule = self.cur_schedule
+
+        self.log.debug("  checking if in prev min")
+        if self.in_timespan(now, prev_transit, schedule.window_min):
+            self.log.debug("    yes - turn on")
+            return True
+
+        self.log.debug("  checking if in next min")
+        if self.in_timespan(now, next_transit, schedule.window_min):
+            self.log.debug("    yes - turn on")
+            return True
+
+        if schedule.min_solar_angle is not None:
+            self.log.debug("  checking min solar angle")
+            if solar_angle < schedule.min_solar_angle:
+                self.log.debug("    sun too low - turn off")
+                return False
+
+        if schedule.max_solar_angle is not None:
+            if solar_angle >= schedule.max_solar_angle:
+                self.log.debug("    sun too high - turn off")
+                return False
+
+        if schedule.window_max is None:
+            return True
+
+        self.log.debug("  checking if in prev window")
+        if self.in_timespan(now, prev_transit, schedule.window_max):
+            self.log.debug("    yes - turn on")
+            return True
+
+        self.log.debug("  checking if in next window")
+        if self.in_timespan(now, next_transit, schedule.window_max):
+            self.log.debug("    yes - turn on")
+            return True
+
+        self.log.debug("  failed to match any criteria")
+
+        return False
+
+    def next_solar_change(self, now):
+        """Next time that in_solar_window() may change (or None)"""
+
+        schedule = self.cur_schedule
+
+        if not schedule or not self.solar.has_location():
+            return None
+
+        events = []
+
+        for angle in (schedule.min_solar_angle, schedule.max_solar_angle):
+            if angle is not None:
+                events.append(self.solar.next_crossing(now, angle))
+
+        for transit in self.solar.transits(now):
+            for window in (schedule.window_min, schedule.window_max):
+                if window:
+                    events.append(transit - window / 2)
+                    events.append(transit + window / 2)
+
+        events = [event for event in events if event and event > now]
+
+        return min(events, default=None)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+import datetime
+import pathlib
+import sys
+import xmlrpc.client
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "bench"))
+
+# pylint: disable=wrong-import-position
+
+from fake_services import FakeCache
+from cache_mirror import CacheMirror
+
+utc = datetime.timezone.utc
+
+
+class Clock:
+    """Settable replacement for Server.now()"""
+
+    def __init__(self):
+        self.time = datetime.datetime(2026, 10, 16, tzinfo=utc)
+
+    def __call__(self):
+        return self.time
+
+    def advance(self, secs):
+        """Move the clock forward"""
+
+        self.time += datetime.timedelta(seconds=secs)
+
+
+def make_cache(options=""):
+    """Cache service code with a settable clock"""
+
+    cache = FakeCache(options).cache
+    cache.now = Clock()
+
+    return cache
+
+
+class CountingProxy:
+    """Cache proxy that records get_changes results"""
+
+    def __init__(self, url):
+        self.proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+        self.changes = []
+
+    def get_changes(self, *args):
+        """Forward and record"""
+
+        result = self.proxy.get_changes(*args)
+        self.changes.append(result)
+        return result
+
+
+def test_versions():
+    """Each change gets the next version, get_changes returns newer ones"""
+
+    cache = make_cache()
+    epoch = cache.get_version()["epoch"]
+
+    cache.put_value("a", 1)
+    cache.put_value("b", 2)
+    cache.put_value("a", 3)
+
+    assert cache.get_version() == {"epoch": epoch, "version": 3}
+    assert cache.versions == {"b": 2, "a": 3}
+
+    changes = cache.get_changes(1, epoch)
+
+    assert not changes["full"]
+    assert changes["values"] == {"a": 3, "b": 2}
+
+    assert cache.get_changes(2, epoch)["values"] == {"a": 3}
+    assert cache.get_changes(3, epoch)["values"] == {}
+    assert cache.get_changes(0, epoch, ["b"])["values"] == {"b": 2}
+
+    # Merge stores a new dict
+
+    cache.put_value("c", {"x": {"y": 1}})
+    stored = cache.get_value("c")
+
+    assert cache.merge_value("c", {"x": {"z": 2}})
+    assert cache.get_value("c") == {"x": {"y": 1, "z": 2}}
+    assert stored == {"x": {"y": 1}}
+    assert cache.version == 5
+    assert not cache.merge_value("a", {"x": 1})
+
+    # Another epoch or a version from the future gets everything
+
+    assert cache.get_changes(5, "other")["full"]
+    assert cache.get_changes(99, epoch)["full"]
+
+    # Renumbering starts a new epoch, keeping the update order
+
+    cache.version = 2**31 - 1
+    cache.put_value("b", 4)
+
+    assert cache.epoch != epoch
+    assert cache.versions == {"a": 2, "c": 3, "b": 4}
+    assert cache.get_changes(4, epoch)["full"]
+
+
+def test_removed_keys():
+    """Removed keys are reported until trimmed, then clients resync"""
+
+    cache = make_cache("removed.max: 2")
+    epoch = cache.epoch
+
+    for key in "abcd":
+        cache.put_value(key, key)
+
+    for key in "abc":
+        cache.clear_value(key)
+
+    changes = cache.get_changes(4, epoch)
+
+    assert changes["removed"] == ["c", "b", "a"]
+    assert changes["values"] == {}
+
+    # Only the last removed.max are kept. Older clients can't tell
+    # what they missed and get a full list.
+
+    cache.trim_removed()
+
+    assert list(cache.removed) == ["b", "c"]
+    assert cache.trimmed_version == 5
+    assert cache.get_changes(4, epoch)["full"]
+    assert cache.get_changes(4, epoch)["values"] == {"d": "d"}
+    assert cache.get_changes(5, epoch)["removed"] == ["c", "b"]
+
+    # Putting a removed key back
+
+    cache.put_value("b", 1)
+
+    assert list(cache.removed) == ["c"]
+    assert cache.get_changes(7, epoch)["values"] == {"b": 1}
+
+    # Past removed.retention
+
+    cache.removed_retention = 0
+    cache.trim_removed()
+
+    assert not cache.removed
+
+
+def test_expiry_order():
+    """Entries expire in timeout order, updates push the expiry back"""
+
+    cache = make_cache()
+
+    for key, secs in (("a", 30), ("b", 10), ("c", 20)):
+        cache.put_value(key, key)
+        cache.set_timeout(key, secs)
+
+    cache.put_value("forever", 0)
+
+    cache.now.advance(15)
+    cache.expire()
+
+    assert sorted(cache.cache) == ["a", "c", "forever"]
+
+    cache.put_value("a", "a2")
+
+    cache.now.advance(10)
+    cache.expire()
+
+    assert sorted(cache.cache) == ["a", "forever"]
+
+    # a was updated at 15s, so it lasts until 45s
+
+    cache.now.advance(10)
+    cache.expire()
+
+    assert "a" in cache.cache
+
+    cache.now.advance(11)
+    cache.expire()
+
+    assert list(cache.cache) == ["forever"]
+    assert list(cache.removed) == ["b", "c", "a"]
+    assert not cache.expiry
+    assert not cache.scheduled
+
+    # Cleared timeouts are not expired
+
+    cache.put_value("d", 1)
+    cache.set_timeout("d", 5)
+    cache.clear_timeout("d")
+    cache.now.advance(10)
+    cache.expire()
+
+    assert "d" in cache.cache
+
+
+def test_snapshot_reload(tmp_path):
+    """Entries, versions and timeouts survive a restart"""
+
+    options = f"snapshot.path: {tmp_path / 'cache.snapshot'}"
+
+    cache = make_cache(options)
+    cache.put_value("a", {"x": 1})
+    cache.put_value("b", [1, 2])
+    cache.put_value("c", "c")
+    cache.set_timeout("b", 60)
+    cache.clear_value("c")
+    cache.save_snapshot()
+
+    restarted = make_cache(options)
+
+    assert restarted.cache == {"a": {"x": 1}, "b": [1, 2]}
+    assert restarted.versions == {"a": 1, "b": 2}
+    assert restarted.version == cache.version
+    assert restarted.timeouts == {"b": 60}
+    assert "b" in restarted.scheduled
+
+    # New epoch, so mirrors pick up everything again
+
+    assert restarted.epoch != cache.epoch
+    assert restarted.get_changes(4, cache.epoch)["full"]
+
+    # A bad snapshot leaves an empty cache
+
+    (tmp_path / "cache.snapshot").write_text("garbage", encoding="utf-8")
+
+    assert make_cache(options).cache == {}
+
+
+def test_mirror():
+    """CacheMirror only transfers changed entries"""
+
+    service = FakeCache().start()
+
+    try:
+        cache = xmlrpc.client.ServerProxy(service.url, allow_none=True)
+        proxy = CountingProxy(service.url)
+        mirror = CacheMirror(proxy)
+
+        cache.put_many({"a": 1, "b": 2, "c": 3})
+
+        assert mirror.get_many(["a", "b"]) == {"a": 1, "b": 2}
+        assert proxy.changes[-1]["full"]
+
+        # Nothing changed
+
+        assert mirror.get("a") == 1
+        assert proxy.changes[-1]["values"] == {}
+
+        # Only the changed key is sent
+
+        cache.put("b", 20)
+        cache.put("c", 30)
+
+        assert mirror.get_many(["a", "b"]) == {"a": 1, "b": 20}
+        assert proxy.changes[-1]["values"] == {"b": 20}
+
+        cache.clear("a")
+
+        assert mirror.get("a") is None
+        assert mirror.get_many(["a", "b", "c"]) == {"b": 20, "c": 30}
+
+        # A restarted cache (new epoch) drops the old values
+
+        service.cache.clear_value("b")
+        service.cache.epoch = "restart"
+
+        assert mirror.get_many(["b", "c"]) == {"c": 30}
+        assert mirror.epoch == "restart"
+    finally:
+        service.stop()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import datetime
+import logging
+
+import sapphire_config as sapphire
+
+from datamonitor import DataMonitorBase
+from schedule import ScheduleManager, Schedule
+
+ALLDAY_CONFIG = """
+[AllDay]
+priority:       0
+sample:         10m
+"""
+
+utc = datetime.timezone.utc
+
+
+class StepMonitor(DataMonitorBase):
+    """Only the state used by get_step_wait()"""
+
+    # pylint: disable=super-init-not-called
+
+    def __init__(self, config, now, max_wait=datetime.timedelta(hours=1)):
+        self.schedules = ScheduleManager(logging)
+        self.schedules.schedules = [Schedule(name, config) for name in config.sections()]
+        self.schedules.schedules.sort(reverse=True, key=lambda s: s.priority)
+        self.schedule_rate = sapphire.Rate(60, True)
+        self.schedule_max_wait = max_wait
+        self.schedule_files = []
+        self.window_flag = None
+        self.sample_flag = None
+        self.cur_schedule = self.schedules.match(now)
+        self.next_sample_time = None
+        self.on = False
+        self._now = now
+
+    def now(self):
+        return self._now
+
+
+def make_config(text):
+    """Parse schedule config text"""
+
+    config = sapphire.Parser()
+    config.read_string(text)
+
+    return config
+
+
+def test_allday_wait():
+    """An all-day schedule waits longer than schedule.rate"""
+
+    now = datetime.datetime(2026, 6, 1, 12, 0, 30, tzinfo=utc)
+    monitor = StepMonitor(make_config(ALLDAY_CONFIG), now)
+    rate = monitor.schedule_rate.nexttime(now)
+
+    # Off: only the safety cap is left
+
+    assert monitor.get_step_wait() == datetime.timedelta(hours=1)
+    assert monitor.get_step_wait() > rate
+
+    # On: wake for the next sample
+
+    monitor.on = True
+    monitor.next_sample_time = monitor.compute_next_sample_time(now)
+
+    assert monitor.get_step_wait() == datetime.timedelta(minutes=10)
+    assert monitor.get_step_wait() > rate
+
+
+def test_transition_wait():
+    """The wait ends at the next schedule transition"""
+
+    config = make_config(ALLDAY_CONFIG + """
+[Noon]
+priority:       10
+time.start:     Jun 1 12:15
+time.stop:      Jun 1 13:00
+""")
+
+    now = datetime.datetime(2026, 6, 1, 12, 0, 30, tzinfo=utc)
+    monitor = StepMonitor(config, now)
+
+    assert monitor.get_step_wait() == datetime.timedelta(minutes=14, seconds=30)
+
+
+def test_poll_wait():
+    """Force flags and schedule files are polled every schedule.rate"""
+
+    now = datetime.datetime(2026, 6, 1, 12, 0, 30, tzinfo=utc)
+    rate = datetime.timedelta(seconds=30)
+
+    monitor = StepMonitor(make_config(ALLDAY_CONFIG), now)
+    monitor.window_flag = "/tmp/flags/monitor"
+
+    assert monitor.get_step_wait() == rate
+
+    monitor.window_flag = None
+    monitor.schedule_files = ["schedules/monitor*.conf"]
+
+    assert monitor.get_step_wait() == rate
+
+    # Outside state
+
+    class PollMonitor(StepMonitor):
+        """Monitor that depends on outside state"""
+
+        def needs_poll(self):
+            return True
+
+    monitor = PollMonitor(make_config(ALLDAY_CONFIG), now)
+
+    assert monitor.get_step_wait() == rate
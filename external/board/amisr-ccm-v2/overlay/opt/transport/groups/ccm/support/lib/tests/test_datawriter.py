@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import bz2
+import gzip
+import logging
+import lzma
+
+import pytest
+
+from datawriter import OutputCompressor, CODECS
+
+log = logging.getLogger("test_datawriter")
+
+READERS = {
+    "bz2": bz2.open,
+    "xz": lzma.open,
+    "gzip": gzip.open,
+}
+
+
+@pytest.mark.parametrize("codec", [*CODECS, "zlib"])
+def test_codecs(tmp_path, codec):
+    """Each codec writes a file its standard reader can open"""
+
+    data = b"x" * 100000 + bytes(range(256))
+
+    filename = tmp_path / "20261016.dat"
+    filename.write_bytes(data)
+
+    output_dir = tmp_path / "output"
+    compressor = OutputCompressor(log, output_dir, codec=codec)
+    compressor.add(filename)
+    compressor.stop()
+
+    (outputname,) = output_dir.iterdir()
+
+    if codec == "zlib":
+        codec = "gzip"
+
+    assert outputname.name == "20261016.dat" + CODECS[codec][0]
+
+    with READERS[codec](outputname) as output:
+        assert output.read() == data
+
+
+def test_unknown_codec(tmp_path):
+    """Unknown codecs are rejected up front"""
+
+    with pytest.raises(ValueError):
+        OutputCompressor(log, tmp_path, codec="zip")
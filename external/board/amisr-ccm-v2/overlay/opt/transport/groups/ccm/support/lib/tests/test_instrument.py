@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import threading
+import xmlrpc.client
+
+import sapphire_config as sapphire
+
+from instrument import InstrumentedServer
+
+
+class Parent:
+    """Minimal XMLRPCServer parent"""
+
+    def __init__(self, text=""):
+        config = sapphire.Parser()
+        config.read_string("[DEFAULT]\n" + text)
+
+        self.config = config["DEFAULT"]
+        self.log = logging.getLogger("test_instrument")
+
+
+def call(server, method, *args):
+    """Make one RPC call to server"""
+
+    thread = threading.Thread(target=server.handle_request)
+    thread.start()
+
+    port = server.server_address[1]
+
+    with xmlrpc.client.ServerProxy(f"http://localhost:{port}") as proxy:
+        try:
+            return getattr(proxy, method)(*args)
+        finally:
+            thread.join()
+
+
+def test_registered_functions_are_timed():
+    """Calls are counted under their RPC name, errors included"""
+
+    def add(a, b):
+        """Add two numbers"""
+        return a + b
+
+    def fail():
+        raise ValueError("fail")
+
+    server = InstrumentedServer(Parent(), port=0)
+
+    try:
+        assert server.register_function(add, "sum") is add
+        server.register_function(fail)
+
+        assert call(server, "sum", 1, 2) == 3
+        assert call(server, "system.methodHelp", "sum") == "Add two numbers"
+
+        try:
+            call(server, "fail")
+        except xmlrpc.client.Fault:
+            pass
+
+        timers = call(server, "get_stats")["timers"]
+    finally:
+        server.server_close()
+
+    assert timers["sum"]["count"] == 1
+    assert timers["sum"]["errors"] == 0
+    assert timers["fail"]["errors"] == 1
+
+
+def test_callback_chain(tmp_path):
+    """The caller's callback runs and the stats are written"""
+
+    stats_path = tmp_path / "stats.json"
+    calls = []
+
+    parent = Parent(f"stats.path: {stats_path}\nstats.rate: 0")
+    server = InstrumentedServer(parent, port=0, callback=lambda: calls.append(1))
+
+    try:
+        server.callback()
+    finally:
+        server.server_close()
+
+    assert calls == [1]
+    assert "timers" in json.loads(stats_path.read_text())
+
+
+def test_no_writer():
+    """Without stats.path the callback is passed through unchanged"""
+
+    def idle():
+        pass
+
+    server = InstrumentedServer(Parent(), port=0, callback=idle)
+    server.server_close()
+
+    assert server.callback is idle
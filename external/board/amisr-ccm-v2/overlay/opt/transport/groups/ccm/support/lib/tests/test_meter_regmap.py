@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+
+import math
+import pathlib
+import random
+import struct
+import sys
+
+from pymodbus.payload import BinaryPayloadDecoder
+
+from meter_regmap import Register, RegisterMap, ReadPlanner, MAX_BLOCK_WORDS
+
+SERVICEDIR = pathlib.Path(__file__).resolve().parents[3] / "service"
+
+sys.path[:0] = [str(SERVICEDIR / name) for name in ("genset", "powermeter", "victron")]
+
+# pylint: disable=wrong-import-position
+
+from genset_meter import GensetMeter
+from acuvimii_meter import AcuvimII
+from victron_meter import Victron
+
+
+class FakeRegister(Register):
+    """Register from (address, words)"""
+
+    def parse(self, line):
+        self.address, self.words = line
+        self.group = "test"
+        self.path = f"/test/{self.address}"
+
+
+class FakeRegisterMap(RegisterMap):
+    """Register map from a list of (address, words)"""
+
+    def load(self, filename):
+        for entry in filename:
+            self.groups.add(FakeRegister(entry))
+
+
+def make_registers(*entries):
+    """Registers for (address, words) entries"""
+
+    return [FakeRegister(entry) for entry in entries]
+
+
+def spans(blocks):
+    """(address, words) for each block"""
+
+    return [(block.address, block.words) for block in blocks]
+
+
+# Read planner ###########################################################
+
+
+def test_gap_bridging():
+    """Gaps up to max_gap are read through, larger ones are not"""
+
+    registers = make_registers((0, 2), (4, 1), (8, 2))
+
+    # Gap of 2 (2-3) is bridged, gap of 3 (5-7) is not
+
+    assert spans(ReadPlanner(max_gap=2).plan(registers)) == [(0, 5), (8, 2)]
+
+    # Gap of 3 is bridged at max_gap 3
+
+    assert spans(ReadPlanner(max_gap=3).plan(registers)) == [(0, 10)]
+
+    # Contiguous only
+
+    assert spans(ReadPlanner(max_gap=0).plan(registers)) == [(0, 2), (4, 1), (8, 2)]
+
+
+def test_block_limit():
+    """Blocks are split at MAX_BLOCK_WORDS"""
+
+    registers = make_registers(*[(address, 1) for address in range(130)])
+    blocks = ReadPlanner().plan(registers)
+
+    assert spans(blocks) == [(0, MAX_BLOCK_WORDS), (MAX_BLOCK_WORDS, 5)]
+
+    # A two word register that would end past the limit starts a new block
+
+    registers = make_registers(*[(address, 1) for address in range(124)])
+    registers += make_registers((124, 2))
+
+    assert spans(ReadPlanner().plan(registers)) == [(0, 124), (124, 2)]
+
+    # Bridged gaps count towards the limit
+
+    registers = make_registers((0, 1), (MAX_BLOCK_WORDS, 1))
+
+    assert len(ReadPlanner(max_gap=200).plan(registers)) == 2
+
+
+def test_overlapping_registers():
+    """Duplicates are read once, overlaps share a block"""
+
+    first, second, inner = make_registers((10, 2), (12, 1), (11, 1))
+
+    blocks = ReadPlanner().plan([first, second, first, inner])
+
+    assert spans(blocks) == [(10, 3)]
+    assert blocks[0].registers == [first, inner, second]
+    assert blocks[0].offsets() == [(0, first), (2, inner), (4, second)]
+
+
+def test_plan_cache():
+    """Plans are cached per key and least recently used are dropped"""
+
+    planner = ReadPlanner(max_plans=2)
+    registers = make_registers((0, 1))
+    calls = []
+
+    def find(key):
+        return lambda: calls.append(key) or registers
+
+    first = planner.get_plan("a", find("a"))
+    planner.get_plan("b", find("b"))
+
+    assert planner.get_plan("a", find("a")) is first
+
+    planner.get_plan("c", find("c"))
+
+    assert list(planner.plans) == ["a", "c"]
+    assert calls == ["a", "b", "c"]
+
+    planner.get_plan("b", find("b"))
+
+    assert list(planner.plans) == ["c", "b"]
+    assert calls == ["a", "b", "c", "b"]
+
+    # Changing max_gap drops all plans
+
+    planner.set_max_gap(4)
+
+    assert not planner.plans
+
+
+def test_read_plan_key():
+    """Group and path order does not change the plan"""
+
+    regmap = FakeRegisterMap([(0, 1), (1, 1), (5, 1)])
+
+    plan = regmap.get_read_plan(["test"], ["/test/5", "/test/0"])
+
+    assert regmap.get_read_plan(["test", "test"], ["/test/0", "/test/5"]) is plan
+    assert spans(plan) == [(0, 2), (5, 1)]
+
+
+# Unpackers ##############################################################
+
+# decode() from before make_unpacker(), read with BinaryPayloadDecoder
+
+
+def decode_genset(decoder, reg):
+    """GensetMeter.decode"""
+
+    # pylint: disable=too-many-return-statements
+
+    if reg.type.startswith(("Binary", "Unsigned", "List")) and reg.words == 1:
+        return decoder.decode_16bit_uint()
+    if reg.type.startswith(("Binary", "Unsigned", "List")) and reg.words == 2:
+        return decoder.decode_32bit_uint()
+    if reg.type.startswith("Integer") and reg.words == 1:
+        return decoder.decode_16bit_int()
+    if reg.type.startswith("Integer") and reg.words == 2:
+        return decoder.decode_32bit_int()
+    if reg.type.startswith("String"):
+        return decoder.decode_string(reg.words * 2).decode("utf-8").rstrip("\x00")
+    if reg.type.startswith("Timer"):
+        return decoder.decode_64bit_int()
+    if reg.type.startswith("Char"):
+        return decoder.decode_string(1).decode("utf-8")[0].rstrip("\x00")
+    if reg.type in ("Date", "Time"):
+        return decoder.decode_32bit_uint()
+
+    raise ValueError(f"Unknown type: {reg.type}")
+
+
+def decode_acuvimii(decoder, reg):
+    """AcuvimII.decode"""
+
+    return {
+        "word": decoder.decode_16bit_uint,
+        "int": decoder.decode_16bit_int,
+        "dword": decoder.decode_32bit_uint,
+        "float": decoder.decode_32bit_float,
+    }[reg.type]()
+
+
+def decode_victron(decoder, reg):
+    """Victron.decode"""
+
+    if reg.type.startswith("string"):
+        return str(decoder.decode_string(reg.words * 2), "utf-8")
+
+    return {
+        "uint16": decoder.decode_16bit_uint,
+        "int16": decoder.decode_16bit_int,
+        "uint32": decoder.decode_32bit_uint,
+        "int32": decoder.decode_32bit_int,
+    }[reg.type]()
+
+
+METERS = [
+    (GensetMeter, SERVICEDIR / "genset" / "20231019_G1.TXT", decode_genset),
+    (AcuvimII, SERVICEDIR / "powermeter" / "rmap.json", decode_acuvimii),
+    (Victron, SERVICEDIR / "victron" / "Field_list-Table_1.csv", decode_victron),
+]
+
+
+def make_words(rng, reg):
+    """Random register contents, printable text for strings"""
+
+    if reg.type.lower().startswith(("string", "char")):
+        chars = [rng.randint(0x20, 0x7E) for _ in range(reg.words * 2)]
+        return [chars[k] << 8 | chars[k + 1] for k in range(0, len(chars), 2)]
+
+    return [rng.randint(0, 0xFFFF) for _ in range(reg.words)]
+
+
+def same(value, expected):
+    """Equal, treating NaN as equal to NaN"""
+
+    if isinstance(value, float) and math.isnan(value):
+        return math.isnan(expected)
+
+    return value == expected
+
+
+def test_unpackers_match_decoder():
+    """make_unpacker() gives the same values as BinaryPayloadDecoder"""
+
+    rng = random.Random(1)
+
+    for factory, filename, decode in METERS:
+        meter = factory(filename, "localhost")
+        registers = [
+            reg
+            for group in meter.registers.groups.groups.values()
+            for reg in group.registers
+        ]
+
+        assert registers
+
+        for reg in registers:
+            for _ in range(5):
+                words = make_words(rng, reg)
+
+                # Unpack at an offset, as it would be inside a block
+
+                buffer = struct.pack(f">{len(words) + 1}H", 0, *words)
+                value = meter.make_unpacker(reg)(buffer, 2)
+
+                decoder = BinaryPayloadDecoder.fromRegisters(words, byteorder=">")
+                expected = decode(decoder, reg)
+
+                assert same(value, expected), (factory.__name__, reg.path, reg.type)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+import asyncio
+import pathlib
+import sys
+import threading
+import time
+
+import pytest
+
+from pymodbus.exceptions import ModbusException
+
+from meter_server import MeterService
+from modbus_meter import ModbusConnection
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "bench"))
+
+# pylint: disable=wrong-import-position
+
+from modbus_sim import ModbusSimulator
+
+
+async def no_access(_client):
+    """No access code needed"""
+
+
+def make_connection(port, **kw):
+    """Connection to the simulator on port"""
+
+    return ModbusConnection("127.0.0.1", no_access, port=port, **kw)
+
+
+async def read(connection):
+    """Read two registers through a session"""
+
+    async with connection.session() as client:
+        response = await client.read_holding_registers(0, 2, slave=1)
+
+    return response.registers
+
+
+def test_reuse():
+    """Reads share one client, requests are serialized"""
+
+    async def run():
+        sim = ModbusSimulator()
+        sim.registers[0:2] = [1, 2]
+        port = await sim.start()
+
+        connection = make_connection(port)
+
+        try:
+            assert await read(connection) == [1, 2]
+
+            client = connection.client
+
+            results = await asyncio.gather(*[read(connection) for _ in range(5)])
+
+            assert results == [[1, 2]] * 5
+            assert connection.client is client
+            assert len(sim.clients) == 1
+            assert sim.requests == 6
+        finally:
+            connection.close()
+            await sim.stop()
+
+    asyncio.run(run())
+
+
+def test_reconnect_backoff():
+    """A lost server is retried after a growing backoff, not in a loop"""
+
+    async def run():
+        sim = ModbusSimulator()
+        port = await sim.start()
+
+        connection = make_connection(port, backoff_min=0.2, backoff_max=0.4)
+
+        await read(connection)
+
+        client = connection.client
+
+        await sim.stop()
+        await asyncio.sleep(0.1)
+
+        # The client closes itself instead of reconnecting
+
+        assert not client.connected
+        assert client.reconnect_task is None
+
+        with pytest.raises((OSError, ModbusException)):
+            await read(connection)
+
+        assert connection.client is None
+        assert connection.backoff == 0.2
+
+        # No connect attempt until the backoff has passed
+
+        with pytest.raises(OSError, match="retry in"):
+            await read(connection)
+
+        await asyncio.sleep(0.25)
+
+        with pytest.raises(OSError):
+            await read(connection)
+
+        assert connection.backoff == 0.4
+
+        await asyncio.sleep(0.45)
+
+        with pytest.raises(OSError):
+            await read(connection)
+
+        assert connection.backoff == 0.4
+
+        # Server is back
+
+        sim = ModbusSimulator()
+        await sim.start(port=port)
+        await asyncio.sleep(0.45)
+
+        try:
+            assert await read(connection) == [0, 0]
+            assert connection.backoff == 0
+        finally:
+            connection.close()
+            await sim.stop()
+
+    asyncio.run(run())
+
+
+def test_idle_close():
+    """Clients idle for max_idle are closed, unless in use"""
+
+    async def run():
+        sim = ModbusSimulator()
+        port = await sim.start()
+
+        connection = make_connection(port, max_idle=0.1)
+
+        try:
+            await read(connection)
+            connection.close_idle()
+
+            assert connection.client
+
+            await asyncio.sleep(0.15)
+            connection.close_idle()
+
+            assert connection.client is None
+
+            # In use
+
+            async with connection.session():
+                await asyncio.sleep(0.15)
+                connection.close_idle()
+
+                assert connection.client
+
+            # Idle clients are replaced on the next read
+
+            client = connection.client
+            await asyncio.sleep(0.15)
+            await read(connection)
+
+            assert connection.client is not client
+            assert not client.connected
+        finally:
+            connection.close()
+            await sim.stop()
+
+    asyncio.run(run())
+
+
+def test_request_timeout():
+    """A request timeout closes the client and raises a modbus error"""
+
+    async def run():
+        sim = ModbusSimulator(latency=0.5)
+        port = await sim.start()
+
+        connection = make_connection(port, timeout=0.1, retries=2)
+
+        try:
+            with pytest.raises(ModbusException):
+                await read(connection)
+
+            assert connection.client is None
+        finally:
+            await sim.stop()
+
+    asyncio.run(run())
+
+
+def test_call_timeout():
+    """run_async() cancels calls that take longer than call.timeout"""
+
+    service = MeterService.__new__(MeterService)
+    service.loop = asyncio.new_event_loop()
+    service.call_timeout = None
+
+    thread = threading.Thread(target=service.loop.run_forever, daemon=True)
+    thread.start()
+
+    sim = ModbusSimulator(latency=1)
+    port = service.run_async(sim.start())
+    connection = make_connection(port, timeout=5)
+
+    try:
+        service.call_timeout = 0.2
+
+        start = time.monotonic()
+
+        with pytest.raises(TimeoutError):
+            service.run_async(read(connection))
+
+        assert time.monotonic() - start < 0.5
+
+        # The cancelled session dropped its client
+
+        time.sleep(0.05)
+
+        assert connection.client is None
+        assert not connection.lock.locked()
+    finally:
+        service.call_timeout = None
+        service.run_async(sim.stop())
+        service.loop.call_soon_threadsafe(service.loop.stop)
+        thread.join()
@@ -2,17 +2,52 @@
 
 import datetime
 import logging
+import pathlib
 import time
 
-from schedule import ScheduleManager
+import sapphire_config as sapphire
 
-def test():
+from schedule import ScheduleManager, ScheduleTimeline, Schedule
+
+SPAN_CONFIG = """
+[Background]
+priority:       0
+
+[NewYear]
+priority:       10
+time.start:     Dec 31 20:00
+time.span:      1d
+"""
+
+def test_span_wraps_year():
+    """A time.span running past Dec 31 matches in the next year"""
+
+    config = sapphire.Parser()
+    config.read_string(SPAN_CONFIG)
+
+    schedules = [Schedule(name, config) for name in config.sections()]
+    schedules.sort(reverse=True, key=lambda s: s.priority)
+
+    utc = datetime.timezone.utc
+    inside = datetime.datetime(2027, 1, 1, 10, tzinfo=utc)
+    after = datetime.datetime(2027, 1, 1, 20, tzinfo=utc)
+    before = datetime.datetime(2026, 12, 31, 19, tzinfo=utc)
+
+    assert ScheduleTimeline(schedules, 2027).match(inside).name == "NewYear"
+    assert ScheduleTimeline(schedules, 2027).match(after).name == "Background"
+    assert ScheduleTimeline(schedules, 2026).match(before).name == "Background"
+    assert ScheduleTimeline(schedules, 2027).next_transition(inside) == after
+
+
+def main():
+    """Print the current schedule as demo.conf and year.conf change"""
 
     logging.basicConfig(level=logging.INFO)
 
     scheduler = ScheduleManager(logging)
 
-    filespec = ["demo.conf", "year.conf"]
+    path = pathlib.Path(__file__).parent
+    filespec = [str(path / "demo.conf"), str(path / "year.conf")]
 
     while True:
         time.sleep(1)
@@ -34,6 +69,8 @@ def test():
                 print(f"{key:20s}: {attr}")
 
         print(f"  special: pump={schedule.get_int('pump')}")
+        print(f"  next transition: {scheduler.next_transition(now)}")
+
 
 if __name__ == '__main__':
-    test()
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import datetime
+import math
+
+import ephem
+
+from solar_cache import SolarCache
+
+utc = datetime.timezone.utc
+
+# Boulder, CO and a high arctic site
+
+LATITUDE, LONGITUDE = 40.0, -105.25
+ARCTIC = 80.0, 15.0
+
+
+def make_cache(latitude=LATITUDE, longitude=LONGITUDE):
+    """SolarCache with a location set"""
+
+    cache = SolarCache()
+    cache.set_location(latitude, longitude)
+
+    return cache
+
+
+def make_station(target_time, horizon=0):
+    """ephem.Observer at the test location"""
+
+    station = ephem.Observer()
+    station.lat = str(LATITUDE)
+    station.long = str(LONGITUDE)
+    station.date = target_time
+    station.horizon = str(horizon)
+
+    return station
+
+
+def ephem_altitude(target_time):
+    """Solar altitude (deg) computed directly"""
+
+    sun = ephem.Sun()
+    sun.compute(make_station(target_time))
+
+    return math.degrees(float(sun.alt))
+
+
+def test_altitude_interpolation():
+    """Interpolated altitudes are close to ephem"""
+
+    cache = make_cache()
+    start = datetime.datetime(2026, 6, 1, tzinfo=utc)
+
+    for minutes in range(0, 24 * 60, 7):
+        when = start + datetime.timedelta(minutes=minutes, seconds=13)
+        altitude = ephem_altitude(when)
+        error = abs(cache.altitude(when) - altitude)
+
+        # ephem's refraction correction bends the curve near the horizon
+
+        assert error < (0.25 if abs(altitude) < 5 else 0.05)
+
+
+def test_transits():
+    """Transits match ephem and bracket the target time"""
+
+    cache = make_cache()
+    when = datetime.datetime(2026, 3, 20, 23, 30, tzinfo=utc)
+
+    prev_transit, next_transit = cache.transits(when)
+
+    station = make_station(when)
+    expected = station.next_transit(ephem.Sun()).datetime().replace(tzinfo=utc)
+
+    assert prev_transit <= when < next_transit
+    assert abs((next_transit - expected).total_seconds()) < 1
+
+
+def test_crossings():
+    """Crossings for min/max angles match ephem rising and setting"""
+
+    cache = make_cache()
+    when = datetime.datetime(2026, 9, 1, 12, tzinfo=utc)
+
+    for angle in (-6, 30):
+        sun = ephem.Sun()
+        station = make_station(when, angle)
+
+        expected = [
+            station.next_rising(sun, use_center=True),
+            station.next_setting(sun, use_center=True),
+        ]
+        expected = sorted(t.datetime().replace(tzinfo=utc) for t in expected)
+
+        first = cache.next_crossing(when, angle)
+        second = cache.next_crossing(first, angle)
+
+        for crossing, target in zip((first, second), expected):
+            assert abs((crossing - target).total_seconds()) < 30
+            assert abs(cache.altitude(crossing) - angle) < 1e-6
+
+
+def test_always_up_never_up():
+    """No crossings when the sun stays above or below the angle"""
+
+    cache = make_cache(*ARCTIC)
+
+    summer = datetime.datetime(2026, 6, 21, tzinfo=utc)
+    winter = datetime.datetime(2026, 12, 21, tzinfo=utc)
+
+    # Always up
+
+    assert cache.next_crossing(summer, -6) is None
+    assert cache.get_day(summer).get_crossings(-6) == []
+    assert min(cache.get_day(summer).altitudes) > -6
+
+    # Never up
+
+    assert cache.next_crossing(winter, 0) is None
+    assert max(cache.get_day(winter).altitudes) < 0
+
+    # Old days are dropped
+
+    assert summer.date() not in cache.days
+
+
+def test_location_threshold():
+    """Tables are only rebuilt when the location moves past the threshold"""
+
+    cache = SolarCache(threshold=1.0)
+    when = datetime.datetime(2026, 6, 1, 18, tzinfo=utc)
+
+    assert not cache.has_location()
+    assert cache.set_location(LATITUDE, LONGITUDE)
+
+    solar_day = cache.get_day(when)
+
+    # About 110 m
+
+    assert not cache.set_location(LATITUDE + 0.001, LONGITUDE)
+    assert cache.get_day(when) is solar_day
+    assert (cache.latitude, cache.longitude) == (LATITUDE, LONGITUDE)
+
+    # About 5.5 km
+
+    assert cache.set_location(LATITUDE + 0.05, LONGITUDE)
+    assert cache.days == {}
+    assert cache.get_day(when) is not solar_day
+    assert cache.latitude == LATITUDE + 0.05